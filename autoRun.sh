@@ -44,4 +44,17 @@ echo "--- [Paso 5/5] Iniciando servidor de desarrollo... ---"
 echo "La aplicación estará disponible en: http://127.0.0.1:8000/"
 echo "El panel de administración estará en: http://127.0.0.1:8000/admin/"
 echo "Puedes detener el servidor en cualquier momento con CTRL+C."
+# Los correos se encolan en la base de datos; este proceso los envía en segundo plano.
+python manage.py procesar_correos --informe-cada 300 &
+WORKER_CORREOS_PID=$!
+# Los documentos subidos por fragmentos se procesan (hash, tamaño, miniatura) en otro proceso.
+python manage.py procesar_subidas &
+WORKER_SUBIDAS_PID=$!
+# Cada hora se borran de la base de datos las sesiones caducadas.
+(while true; do python manage.py clearsessions; sleep 3600; done) &
+LIMPIEZA_SESIONES_PID=$!
+# Cada día se desplaza el horizonte de los huecos de los horarios recurrentes.
+(while true; do python manage.py regenerar_huecos > /dev/null; sleep 86400; done) &
+HORIZONTE_HUECOS_PID=$!
+trap "kill $WORKER_CORREOS_PID $WORKER_SUBIDAS_PID $LIMPIEZA_SESIONES_PID $HORIZONTE_HUECOS_PID 2>/dev/null" EXIT
 python manage.py runserver
\ No newline at end of file
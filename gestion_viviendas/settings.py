@@ -20,6 +20,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Carga las variables de entorno desde el archivo .env que debe estar en la raíz del proyecto.
@@ -55,6 +56,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Histogramas de duración, consultas y plantillas por vista (ver propiedades/metricas.py).
+    "propiedades.metricas.MetricasMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -68,7 +71,8 @@ ROOT_URLCONF = "gestion_viviendas.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # El backend de Django, midiendo el tiempo de renderizado para las métricas por vista.
+        "BACKEND": "propiedades.metricas.DjangoTemplatesMedidas",
         "DIRS": [],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -86,14 +90,126 @@ WSGI_APPLICATION = "gestion_viviendas.wsgi.application"
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# DB_MOTOR=postgresql para producción con varios procesos de servidor (requiere
+# pip install "psycopg[binary,pool]"); por defecto, SQLite ajustada para un solo servidor.
+
+DB_MOTOR = os.environ.get('DB_MOTOR', 'sqlite')
+
+if DB_MOTOR == 'postgresql':
+    DB_POOL_MAXIMO = int(os.environ.get('DB_POOL_MAXIMO', 0))
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get('DB_NOMBRE', 'gestion_viviendas'),
+            "USER": os.environ.get('DB_USUARIO', ''),
+            "PASSWORD": os.environ.get('DB_CONTRASENA', ''),
+            "HOST": os.environ.get('DB_HOST', ''),
+            "PORT": os.environ.get('DB_PUERTO', ''),
+            # Conexiones persistentes: cada proceso reutiliza su conexión durante estos
+            # segundos en lugar de abrir una por petición, y comprueba que sigue viva
+            # antes de reutilizarla (por si la base de datos se ha reiniciado).
+            "CONN_MAX_AGE": int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {},
+        }
+    }
+    if DB_POOL_MAXIMO:
+        # Pool de conexiones de psycopg 3 compartido por los hilos de cada proceso. Es
+        # incompatible con las conexiones persistentes, que se desactivan.
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": int(os.environ.get('DB_POOL_MINIMO', 2)),
+            "max_size": DB_POOL_MAXIMO,
+            "timeout": int(os.environ.get('DB_POOL_ESPERA_SEGUNDOS', 10)),
+        }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get('DB_NOMBRE', BASE_DIR / "db.sqlite3"),
+            "OPTIONS": {
+                # Segundos que una escritura espera a que termine otra antes de fallar
+                # con "database is locked" (busy_timeout).
+                "timeout": int(os.environ.get('SQLITE_ESPERA_SEGUNDOS', 20)),
+                # Las transacciones toman el bloqueo de escritura al empezar: así esperan
+                # con el timeout anterior en lugar de fallar al pasar de leer a escribir.
+                "transaction_mode": "IMMEDIATE",
+                # WAL: las lecturas no bloquean a la escritura ni al revés. Con WAL,
+                # synchronous=NORMAL es seguro ante caídas de la aplicación y evita un
+                # fsync por transacción.
+                "init_command": "PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;",
+            },
+        }
+    }
+
+
+# Caché
+# Por defecto, caché en memoria del proceso. Con varios procesos de servidor conviene una
+# caché compartida, por ejemplo CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+# y CACHE_LOCATION=/var/tmp/gestion_viviendas_cache.
 
-DATABASES = {
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "BACKEND": os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        "LOCATION": os.environ.get('CACHE_LOCATION', 'gestion-viviendas'),
     }
 }
 
+# Sesiones
+# SESSION_MODO elige dónde se guardan:
+# - 'cached_db' (por defecto): en la base de datos, pero se leen desde la caché.
+# - 'cache': solo en la caché; ninguna escritura en la base de datos, pero con varios
+#   procesos necesita una caché compartida (Memcached o Redis) y se pierden al reiniciarla.
+# - 'cookies': firmadas en la propia cookie; ni base de datos ni caché.
+# - 'db': siempre en la base de datos (el comportamiento por defecto de Django).
+# Las sesiones caducadas de la base de datos se borran con `python manage.py clearsessions`.
+SESSION_MODO = os.environ.get('SESSION_MODO', 'cached_db')
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'cookies': 'django.contrib.sessions.backends.signed_cookies',
+}[SESSION_MODO]
+
+# Segundos que se guarda en caché la lista de viviendas autorizadas de un teléfono.
+# Las señales la invalidan al modificar las autorizaciones, así que puede ser larga.
+AUTORIZACIONES_CACHE_SEGUNDOS = int(os.environ.get('AUTORIZACIONES_CACHE_SEGUNDOS', 3600))
+# Las respuestas "sin acceso" se guardan mucho menos: si la caché no es compartida, los
+# cambios hechos desde otro proceso (como `importar_datos`) no las invalidan, y un teléfono
+# recién autorizado seguiría rechazado durante todo ese tiempo.
+AUTORIZACIONES_CACHE_VACIAS_SEGUNDOS = int(os.environ.get('AUTORIZACIONES_CACHE_VACIAS_SEGUNDOS', 60))
+
+
+# Días hacia delante para los que se generan los huecos de los horarios recurrentes.
+# `python manage.py regenerar_huecos` debe ejecutarse a diario para desplazar este horizonte.
+HUECOS_HORIZONTE_DIAS = int(os.environ.get('HUECOS_HORIZONTE_DIAS', 60))
+
+# API JSON de huecos libres (/vivienda/<id>/huecos.json, ver propiedades/disponibilidad.py).
+# La lista se recalcula como mucho una vez por intervalo y cambio de huecos; solo incluye
+# los huecos que empiezan después del siguiente corte del intervalo.
+HUECOS_API_INTERVALO_MINUTOS = int(os.environ.get('HUECOS_API_INTERVALO_MINUTOS', 5))
+# max-age de Cache-Control. Con 0, navegadores y proxies revalidan siempre con el ETag.
+HUECOS_API_MAX_AGE = int(os.environ.get('HUECOS_API_MAX_AGE', 0))
+
+# Búsqueda de los primeros huecos libres entre las viviendas de un teléfono (ver
+# propiedades/busqueda.py): cuántos se muestran y cuántos días hacia delante se buscan.
+HUECOS_BUSQUEDA_RESULTADOS = int(os.environ.get('HUECOS_BUSQUEDA_RESULTADOS', 5))
+HUECOS_BUSQUEDA_DIAS = int(os.environ.get('HUECOS_BUSQUEDA_DIAS', 14))
+
+# Límite de intentos del acceso por teléfono (ver propiedades/limites.py). Se permite una
+# ráfaga de ACCESO_RAFAGA intentos que se recupera a ACCESO_FICHAS_POR_MINUTO por minuto, y
+# como mucho ACCESO_LIMITE_HORA_IP intentos por hora desde una IP y
+# ACCESO_LIMITE_HORA_TELEFONO con un mismo teléfono. Los contadores van en la caché, así que
+# con varios procesos de servidor debe ser una caché compartida con incr atómico
+# (Memcached o Redis).
+ACCESO_RAFAGA = int(os.environ.get('ACCESO_RAFAGA', 5))
+ACCESO_FICHAS_POR_MINUTO = int(os.environ.get('ACCESO_FICHAS_POR_MINUTO', 6))
+ACCESO_LIMITE_HORA_IP = int(os.environ.get('ACCESO_LIMITE_HORA_IP', 60))
+ACCESO_LIMITE_HORA_TELEFONO = int(os.environ.get('ACCESO_LIMITE_HORA_TELEFONO', 10))
+# Cabecera con la IP real del cliente si hay un proxy delante (ej. HTTP_X_FORWARDED_FOR).
+# Vacío: se usa REMOTE_ADDR.
+LIMITES_CABECERA_IP = os.environ.get('LIMITES_CABECERA_IP', '')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -142,6 +258,41 @@ MEDIA_URL = '/media/'
 # Ruta en el sistema de ficheros donde se guardarán los ficheros.
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Los documentos de los inquilinos se guardan una sola vez por contenido (SHA-256): los
+# duplicados son enlaces al mismo fichero y no ocupan disco. Ver propiedades/almacenamiento.py.
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "documentos": {"BACKEND": "propiedades.almacenamiento.AlmacenamientoDeduplicado"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+# --- DESCARGA PROTEGIDA DE DOCUMENTOS ---
+# Los documentos de inquilinos (media/documentacion/) solo se sirven a través de la vista
+# /documentos/, que comprueba los permisos. Si delante hay un servidor web, la vista le
+# delega el envío del fichero: 'nginx' (X-Accel-Redirect) o 'apache' (X-Sendfile).
+# Vacío: lo envía Django.
+MEDIA_ENVIO_SERVIDOR = os.environ.get('MEDIA_ENVIO_SERVIDOR', '')
+# Ubicación 'internal' de nginx que apunta a MEDIA_ROOT.
+MEDIA_ACCEL_PREFIJO = os.environ.get('MEDIA_ACCEL_PREFIJO', '/media-protegido/')
+
+# --- SUBIDA DE DOCUMENTOS POR FRAGMENTOS ---
+# Tamaño máximo de cada documento y de cada fragmento que envía el navegador.
+DOCUMENTO_MAX_BYTES = int(os.environ.get('DOCUMENTO_MAX_BYTES', 20 * 1024 * 1024))
+DOCUMENTO_TAMANO_FRAGMENTO = int(os.environ.get('DOCUMENTO_TAMANO_FRAGMENTO', 1024 * 1024))
+# Horas tras las que se borran las subidas que nunca se finalizaron.
+SUBIDA_CADUCIDAD_HORAS = int(os.environ.get('SUBIDA_CADUCIDAD_HORAS', 24))
+# Tiempo tras el cual una subida reclamada por un worker que no respondió vuelve a procesarse.
+SUBIDA_BLOQUEO_MAX_SEGUNDOS = int(os.environ.get('SUBIDA_BLOQUEO_MAX_SEGUNDOS', 600))
+# Número máximo de intentos de procesar una subida antes de rechazarla.
+SUBIDA_MAX_INTENTOS = int(os.environ.get('SUBIDA_MAX_INTENTOS', 3))
+# Las fotos de documentos se reducen a este lado máximo (en píxeles), se les quitan los
+# metadatos EXIF y se guardan como JPEG con esta calidad.
+IMAGEN_MAX_LADO = int(os.environ.get('IMAGEN_MAX_LADO', 2000))
+IMAGEN_CALIDAD_JPEG = int(os.environ.get('IMAGEN_CALIDAD_JPEG', 85))
+IMAGEN_LADO_MINIATURA = int(os.environ.get('IMAGEN_LADO_MINIATURA', 320))
+# Guardar también la foto original sin comprimir (ocupa más disco).
+IMAGEN_CONSERVAR_ORIGINAL = os.environ.get('IMAGEN_CONSERVAR_ORIGINAL', 'False').lower() in ('true', '1', 't')
+
 
 # --- CONFIGURACIÓN DE EMAIL ---
 # Si EMAIL_HOST no está configurado en el .env, se usará el backend de consola.
@@ -159,3 +310,33 @@ else:
     # Durante el desarrollo, si no hay .env, los correos se mostrarán en la consola.
     EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
     DEFAULT_FROM_EMAIL = "Gestión de Viviendas App <noreply@gestionviviendas.com>"
+
+# --- COLA DE CORREOS SALIENTES ---
+# Las vistas solo encolan los correos; el comando `python manage.py procesar_correos` los envía.
+# Número máximo de intentos antes de mover un correo a "Fallido".
+CORREO_MAX_INTENTOS = int(os.environ.get('CORREO_MAX_INTENTOS', 5))
+# Espera exponencial entre reintentos: base, 2·base, 4·base... hasta el máximo indicado.
+CORREO_REINTENTO_BASE_SEGUNDOS = int(os.environ.get('CORREO_REINTENTO_BASE_SEGUNDOS', 30))
+CORREO_REINTENTO_MAX_SEGUNDOS = int(os.environ.get('CORREO_REINTENTO_MAX_SEGUNDOS', 3600))
+# Tiempo tras el cual un correo reclamado por un worker que no respondió vuelve a la cola.
+CORREO_BLOQUEO_MAX_SEGUNDOS = int(os.environ.get('CORREO_BLOQUEO_MAX_SEGUNDOS', 600))
+# Mensajes enviados por cada conexión SMTP antes de renovarla (muchos proveedores limitan los mensajes por sesión).
+CORREO_MAX_MENSAJES_POR_CONEXION = int(os.environ.get('CORREO_MAX_MENSAJES_POR_CONEXION', 50))
+
+
+# --- LISTADOS DEL PANEL DE ADMINISTRACIÓN ---
+# Los listados grandes no cuentan todas sus filas con COUNT(*): sin filtros, PostgreSQL usa
+# la estimación de sus estadísticas y, con filtros, se cuenta como mucho hasta este número.
+ADMIN_CONTEO_MAXIMO = int(os.environ.get('ADMIN_CONTEO_MAXIMO', 10000))
+
+
+# --- MÉTRICAS DE RENDIMIENTO ---
+# Cada proceso del servidor vuelca sus histogramas por vista en este directorio cada
+# METRICAS_VOLCADO_SEGUNDOS; /estado/metricas/ y `python manage.py rutas_lentas` los suman.
+METRICAS_DIRECTORIO = os.environ.get('METRICAS_DIRECTORIO', os.path.join(tempfile.gettempdir(), 'gestion_viviendas_metricas'))
+METRICAS_VOLCADO_SEGUNDOS = int(os.environ.get('METRICAS_VOLCADO_SEGUNDOS', 30))
+# `manage.py test` desactiva el volcado (METRICAS_DIRECTORIO = None) durante las pruebas.
+TEST_RUNNER = 'propiedades.tests.ejecutor.EjecutorPruebas'
+# Token para que Prometheus lea /estado/metricas/ con la cabecera "Authorization: Bearer <token>".
+# Sin token, solo puede consultarlas el personal con sesión iniciada.
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN', '')
@@ -15,10 +15,14 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+import posixpath
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.http import Http404
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+from django.views.static import serve
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -26,6 +30,20 @@ urlpatterns = [
     path("", include("propiedades.urls", namespace="propiedades")),
 ]
 
-# Servir ficheros media en modo DEBUG
+# Servir ficheros media en modo DEBUG, salvo la documentación de los inquilinos y el
+# almacén de contenidos: esos solo se descargan por la vista protegida.
+MEDIA_PROTEGIDA = ('documentacion', '.contenido')
+
+
+def servir_media(request, path):
+    # La ruta se normaliza antes de comprobarla para que `contratos/../documentacion/...`
+    # no esquive la exclusión.
+    if posixpath.normpath(path).lstrip('/').split('/')[0] in MEDIA_PROTEGIDA:
+        raise Http404
+    return serve(request, path, document_root=settings.MEDIA_ROOT)
+
+
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), servir_media),
+    ]
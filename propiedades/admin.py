@@ -1,5 +1,14 @@
 from django.contrib import admin
-from .models import Administrador, Vivienda, HorarioVisita, ArrendatarioAutorizado, Visita, SolicitudDeDocumentacion
+from django.core.exceptions import PermissionDenied
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.urls import path, reverse
+from django.utils.html import format_html
+from django.utils.http import content_disposition_header
+from django.utils import timezone
+from .listados import FiltroVivienda, ListadoOptimizadoAdmin
+from .models import Administrador, Vivienda, HorarioVisita, ReglaHorarioVisita, ArrendatarioAutorizado, Visita, SolicitudDeDocumentacion, SubidaDocumento, CorreoPendiente
 
 class HorarioVisitaInline(admin.TabularInline):
     """
@@ -9,6 +18,14 @@ class HorarioVisitaInline(admin.TabularInline):
     extra = 1 # Muestra un formulario extra para añadir un nuevo horario.
     ordering = ('fecha', 'hora_inicio')
 
+class ReglaHorarioVisitaInline(admin.TabularInline):
+    """
+    Permite definir horarios recurrentes (ej. martes y jueves de 17:00 a 19:00) en la vista de la vivienda.
+    """
+    model = ReglaHorarioVisita
+    extra = 0
+    ordering = ('fecha_inicio', 'hora_inicio')
+
 class ArrendatarioAutorizadoInline(admin.TabularInline):
     """
     Permite editar los arrendatarios autorizados directamente en la vista de la vivienda.
@@ -26,6 +43,7 @@ class ViviendaAdmin(admin.ModelAdmin):
     filter_horizontal = ('administradores',)
     inlines = [
         ArrendatarioAutorizadoInline,
+        ReglaHorarioVisitaInline,
         HorarioVisitaInline,
     ]
 
@@ -39,27 +57,38 @@ class AdministradorAdmin(admin.ModelAdmin):
 
 # Registramos los otros modelos para que también se puedan gestionar de forma independiente.
 @admin.register(HorarioVisita)
-class HorarioVisitaAdmin(admin.ModelAdmin):
+class HorarioVisitaAdmin(ListadoOptimizadoAdmin):
     list_display = ('vivienda', 'fecha', 'hora_inicio', 'hora_fin')
-    list_filter = ('vivienda', 'fecha')
+    list_filter = (('vivienda', FiltroVivienda), 'fecha')
+    list_select_related = ('vivienda',)
+    campos_diferidos = ('vivienda__direccion_completa',)
+
+@admin.register(ReglaHorarioVisita)
+class ReglaHorarioVisitaAdmin(admin.ModelAdmin):
+    list_display = ('vivienda', 'dias_semana', 'hora_inicio', 'hora_fin', 'fecha_inicio', 'fecha_fin')
+    list_filter = (('vivienda', FiltroVivienda),)
+    list_select_related = ('vivienda',)
 
 @admin.register(ArrendatarioAutorizado)
 class ArrendatarioAutorizadoAdmin(admin.ModelAdmin):
     list_display = ('vivienda', 'telefono')
-    list_filter = ('vivienda',)
+    list_filter = (('vivienda', FiltroVivienda),)
+    list_select_related = ('vivienda',)
     search_fields = ('telefono',)
 
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
-from django.conf import settings
+from .cancelaciones import cancelar_visitas
+from .solicitudes import crear_solicitudes, notificar_solicitudes
+from .exportacion import nombre_paquete, paquete_solicitudes
 
 @admin.register(Visita)
-class VisitaAdmin(admin.ModelAdmin):
+class VisitaAdmin(ListadoOptimizadoAdmin):
     """
     Personalización del panel de administración para el modelo Visita.
     """
     list_display = ('vivienda', 'nombre', 'apellidos', 'fecha_hora', 'estado', 'veces_cancelada')
-    list_filter = ('estado', 'vivienda', 'fecha_hora')
+    list_filter = ('estado', ('vivienda', FiltroVivienda), 'fecha_hora')
+    list_select_related = ('vivienda',)
+    campos_diferidos = ('puesto_trabajo', 'observaciones', 'vivienda__direccion_completa')
     search_fields = ('nombre', 'apellidos', 'email', 'telefono', 'vivienda__nombre')
     list_per_page = 25
     actions = ['cancelar_por_alquiler', 'cancelar_por_otro_motivo', 'crear_solicitud_documentacion']
@@ -80,28 +109,10 @@ class VisitaAdmin(admin.ModelAdmin):
         """
         Lógica interna para cancelar visitas y enviar notificaciones.
         """
-        for visita in queryset:
-            if visita.estado == 'CONFIRMADA':
-                visita.estado = 'CANCELADA'
-                visita.motivo_cancelacion = motivo
-                visita.veces_cancelada += 1
-                visita.save()
-
-                # Enviar notificación por email
-                asunto = f"Cancelación de tu visita para {visita.vivienda.nombre}"
-                contexto_email = {'visita': visita}
-                cuerpo_mensaje = render_to_string('propiedades/emails/cancelacion_por_admin.txt', contexto_email)
-                html_cuerpo_mensaje = render_to_string('propiedades/emails/cancelacion_por_admin.html', contexto_email)
-
-                try:
-                    msg = EmailMultiAlternatives(asunto, cuerpo_mensaje, settings.DEFAULT_FROM_EMAIL, [visita.email])
-                    msg.attach_alternative(html_cuerpo_mensaje, "text/html")
-                    msg.send()
-                    print(f"Notificación de cancelación (motivo: {motivo}) enviada a {visita.email}.")
-                except Exception as e:
-                    print(f"ERROR al enviar notificación de cancelación: {e}")
-
-        self.message_user(request, f"{queryset.count()} visitas han sido canceladas exitosamente.")
+        canceladas = cancelar_visitas(queryset, motivo)
+        print(f"{len(canceladas)} notificaciones de cancelación (motivo: {motivo}) encoladas.")
+
+        self.message_user(request, f"{len(canceladas)} visitas han sido canceladas exitosamente.")
 
     @admin.action(description="Cancelar seleccionadas (Vivienda ya alquilada)")
     def cancelar_por_alquiler(self, request, queryset):
@@ -113,22 +124,114 @@ class VisitaAdmin(admin.ModelAdmin):
 
     @admin.action(description="Crear solicitud de documentación")
     def crear_solicitud_documentacion(self, request, queryset):
-        creadas_count = 0
-        for visita in queryset:
-            if not hasattr(visita, 'solicitud_de_documentacion'):
-                SolicitudDeDocumentacion.objects.create(visita=visita)
-                creadas_count += 1
+        # Una inserción para todas; los correos se encolan al confirmar la transacción.
+        creadas_count = len(crear_solicitudes(queryset))
 
         if creadas_count > 0:
-            self.message_user(request, f"Se han creado y enviado {creadas_count} solicitudes de documentación.")
+            self.message_user(request, f"Se han creado y encolado {creadas_count} solicitudes de documentación.")
         else:
             self.message_user(request, "No se creó ninguna solicitud nueva (puede que ya existieran).", level='warning')
 
+class SubidaDocumentoInline(admin.TabularInline):
+    """
+    Documentos subidos para la solicitud, con una vista previa de las imágenes.
+    """
+    model = SubidaDocumento
+    fields = ('vista_previa', 'campo', 'nombre_original', 'estado', 'tamano', 'tamano_final', 'error')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    show_change_link = True
+    ordering = ('creado_en',)
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description="Vista previa")
+    def vista_previa(self, obj):
+        if not obj.fichero:
+            return "-"
+        # Los documentos se sirven por la vista protegida, no directamente desde /media/.
+        enlace = reverse('propiedades:documento_protegido', args=[obj.fichero.name])
+        if obj.miniatura:
+            # Solo se descarga la miniatura; el documento completo se abre al hacer clic.
+            miniatura = reverse('propiedades:documento_protegido', args=[obj.miniatura.name])
+            return format_html('<a href="{}" target="_blank"><img src="{}" style="max-height: 120px;" loading="lazy"></a>', enlace, miniatura)
+        return format_html('<a href="{}" target="_blank">Abrir documento</a>', enlace)
+
 @admin.register(SolicitudDeDocumentacion)
-class SolicitudDeDocumentacionAdmin(admin.ModelAdmin):
+class SolicitudDeDocumentacionAdmin(ListadoOptimizadoAdmin):
     """
     Personalización del panel de administración para SolicitudDeDocumentacion.
     """
-    list_display = ('visita', 'estado', 'fecha_creacion')
+    list_display = ('visita', 'estado', 'fecha_creacion', 'enlace_paquete')
     list_filter = ('estado', 'fecha_creacion')
+    # El texto de la visita incluye el nombre de su vivienda.
+    list_select_related = ('visita__vivienda',)
+    campos_diferidos = ('visita__puesto_trabajo', 'visita__observaciones', 'visita__vivienda__direccion_completa')
     readonly_fields = ('token_acceso',)
+    inlines = [SubidaDocumentoInline]
+    actions = ['descargar_paquetes']
+
+    def get_urls(self):
+        urls = [
+            path('<int:pk>/paquete/', self.admin_site.admin_view(self.paquete_view), name='propiedades_solicituddedocumentacion_paquete'),
+        ]
+        return urls + super().get_urls()
+
+    @admin.display(description="Paquete")
+    def enlace_paquete(self, obj):
+        return format_html('<a href="{}">Descargar ZIP</a>', reverse('admin:propiedades_solicituddedocumentacion_paquete', args=[obj.pk]))
+
+    def _respuesta_zip(self, solicitudes, nombre):
+        # El ZIP se va generando mientras se descarga: ni en memoria ni en disco.
+        respuesta = StreamingHttpResponse(paquete_solicitudes(solicitudes), content_type='application/zip')
+        respuesta['Content-Disposition'] = content_disposition_header(as_attachment=True, filename=nombre)
+        respuesta['Cache-Control'] = 'private, no-store'
+        return respuesta
+
+    def paquete_view(self, request, pk):
+        solicitud = get_object_or_404(SolicitudDeDocumentacion.objects.select_related('visita__vivienda'), pk=pk)
+        if not self.has_view_permission(request, solicitud):
+            raise PermissionDenied
+        return self._respuesta_zip([solicitud], nombre_paquete(solicitud))
+
+    @admin.action(description="Descargar la documentación en ZIP (para la aseguradora)")
+    def descargar_paquetes(self, request, queryset):
+        solicitudes = list(queryset.select_related('visita__vivienda').order_by('pk'))
+        nombre = nombre_paquete(solicitudes[0]) if len(solicitudes) == 1 else f"documentacion_{len(solicitudes)}_solicitudes.zip"
+        return self._respuesta_zip(solicitudes, nombre)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change:
+            # El modelo ya no envía correos al guardarse: avisamos al candidato al confirmar.
+            transaction.on_commit(lambda: notificar_solicitudes([obj]))
+
+@admin.register(SubidaDocumento)
+class SubidaDocumentoAdmin(admin.ModelAdmin):
+    """
+    Permite seguir el estado de las subidas por fragmentos y ver por qué se rechazó alguna.
+    """
+    list_display = ('nombre_original', 'campo', 'solicitud', 'estado', 'tamano', 'recibidos', 'actualizado_en')
+    list_filter = ('estado', 'campo')
+    list_select_related = ('solicitud__visita',)
+    readonly_fields = ('solicitud', 'inquilino', 'tamano', 'recibidos', 'fichero', 'sha256', 'miniatura', 'original', 'tamano_final', 'error', 'intentos', 'bloqueado_en', 'creado_en', 'actualizado_en')
+
+@admin.register(CorreoPendiente)
+class CorreoPendienteAdmin(admin.ModelAdmin):
+    """
+    Permite consultar la cola de salida de correos y reenviar los fallidos.
+    """
+    list_display = ('asunto', 'estado', 'intentos', 'proximo_intento', 'creado_en', 'enviado_en')
+    list_filter = ('estado',)
+    search_fields = ('asunto', 'destinatarios')
+    readonly_fields = ('lote', 'bloqueado_en', 'ultimo_error', 'creado_en', 'enviado_en')
+    actions = ['reintentar_correos']
+
+    @admin.action(description="Volver a poner en cola los correos seleccionados")
+    def reintentar_correos(self, request, queryset):
+        actualizados = queryset.exclude(estado='ENVIADO').update(
+            estado='PENDIENTE', intentos=0, proximo_intento=timezone.now(), lote=None, bloqueado_en=None
+        )
+        self.message_user(request, f"{actualizados} correos han vuelto a la cola de envío.")
@@ -0,0 +1,122 @@
+"""
+Almacenamiento de ficheros direccionado por contenido y sin duplicados.
+
+Se usa para la documentación de los inquilinos (`STORAGES['documentos']`), donde se
+repiten nóminas, DNI y contratos entre solicitudes. Cada contenido distinto se guarda
+una sola vez en `MEDIA_ROOT/.contenido/ab/cd/<sha256>`. El nombre que guarda el
+FileField (por ejemplo `documentacion/nominas/nomina.pdf`) es un enlace duro a ese
+fichero, así que las descargas y el resto del código siguen funcionando igual. El
+número de enlaces del sistema de ficheros hace de contador de referencias: un contenido
+con un solo enlace ya no lo usa ningún nombre y `limpiar_contenidos_huerfanos` lo borra.
+
+Subir por segunda vez un fichero que ya existe solo lo lee para calcular el hash: no
+escribe datos ni ocupa más disco.
+"""
+import hashlib
+import os
+import tempfile
+import time
+
+from django.core.files.storage import FileSystemStorage, storages
+
+DIRECTORIO_CONTENIDO = '.contenido'
+TAMANO_BLOQUE = 1024 * 1024
+# Un contenido recién escrito tiene un solo enlace hasta que se enlaza su nombre: la
+# limpieza no toca los que han cambiado hace menos de este tiempo.
+ANTIGUEDAD_MINIMA_HUERFANOS = 3600
+
+
+def almacenamiento_documentos():
+    """
+    Almacenamiento de los documentos de los inquilinos, para el `storage` de sus
+    FileField. Al ser una función, cambiarlo en STORAGES no necesita migraciones.
+    """
+    return storages['documentos']
+
+
+def sha256_de_fichero(ruta):
+    resumen = hashlib.sha256()
+    with open(ruta, 'rb') as fichero:
+        for bloque in iter(lambda: fichero.read(TAMANO_BLOQUE), b''):
+            resumen.update(bloque)
+    return resumen.hexdigest()
+
+
+class AlmacenamientoDeduplicado(FileSystemStorage):
+    """
+    FileSystemStorage que guarda cada contenido una única vez (por su SHA-256) y
+    enlaza a él cada nombre de fichero.
+    """
+
+    def ruta_contenido(self, resumen):
+        return os.path.join(self.location, DIRECTORIO_CONTENIDO, resumen[:2], resumen[2:4], resumen)
+
+    def _save(self, name, content):
+        # Primera lectura: solo el hash. Si el contenido ya existe no se escribe nada.
+        resumen = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for bloque in content.chunks():
+            resumen.update(bloque)
+        ruta_contenido = self.ruta_contenido(resumen.hexdigest())
+        if not os.path.exists(ruta_contenido):
+            content.seek(0)
+            self._escribir_contenido(ruta_contenido, content)
+
+        while True:
+            ruta = self.path(name)
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            try:
+                os.link(ruta_contenido, ruta)
+            except FileExistsError:
+                # Otro proceso ha usado el mismo nombre entretanto: buscamos otro.
+                name = self.get_available_name(name)
+                continue
+            except OSError:
+                # Sistema de ficheros sin enlaces duros (o el contenido acaba de borrarse
+                # como huérfano): guardamos una copia normal.
+                content.seek(0)
+                return super()._save(name, content)
+            break
+
+        return str(name).replace('\\', '/')
+
+    def _escribir_contenido(self, ruta_contenido, content):
+        directorio = os.path.dirname(ruta_contenido)
+        os.makedirs(directorio, exist_ok=True)
+        descriptor, temporal = tempfile.mkstemp(dir=directorio)
+        try:
+            with os.fdopen(descriptor, 'wb') as destino:
+                for bloque in content.chunks():
+                    destino.write(bloque)
+            if self.file_permissions_mode is not None:
+                os.chmod(temporal, self.file_permissions_mode)
+            # Renombrado atómico: dos subidas simultáneas del mismo contenido no se pisan.
+            os.replace(temporal, ruta_contenido)
+        except BaseException:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+
+    def limpiar_contenidos_huerfanos(self, simular=False):
+        """
+        Borra los contenidos que ya no enlaza ningún nombre. `delete()` solo borra el
+        nombre, sin leer el fichero para saber cuál es su contenido; este recorrido solo
+        mira el número de enlaces de cada contenido. Devuelve (contenidos, bytes).
+        """
+        borrados = bytes_borrados = 0
+        limite = time.time() - ANTIGUEDAD_MINIMA_HUERFANOS
+        for directorio, _, ficheros in os.walk(os.path.join(self.location, DIRECTORIO_CONTENIDO)):
+            for nombre in ficheros:
+                ruta = os.path.join(directorio, nombre)
+                try:
+                    info = os.stat(ruta)
+                except FileNotFoundError:
+                    continue  # Temporal de una escritura que acaba de terminar.
+                # st_ctime cambia al crear o borrar un enlace.
+                if info.st_nlink == 1 and info.st_ctime < limite:
+                    borrados += 1
+                    bytes_borrados += info.st_size
+                    if not simular:
+                        os.remove(ruta)
+        return borrados, bytes_borrados
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class PropiedadesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "propiedades"
+
+    def ready(self):
+        # Registra las señales que mantienen el índice de huecos de visita.
+        from . import signals  # noqa: F401
+        # Compila las plantillas de correo una sola vez al arrancar el proceso (salvo en DEBUG).
+        from . import correos
+        correos.precargar()
@@ -0,0 +1,86 @@
+"""
+Consulta cacheada de las viviendas a las que tiene acceso un teléfono.
+
+`viviendas_autorizadas` lee primero de la caché de Django y solo consulta
+ArrendatarioAutorizado en caso de fallo. Las señales de `signals.py` invalidan la
+entrada de un teléfono cuando se crea, modifica o borra una autorización suya; con una
+caché que no es compartida, solo en el proceso donde se hace el cambio.
+"""
+import re
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+from .models import ArrendatarioAutorizado
+
+CLAVE_ACIERTOS = 'autorizaciones:aciertos'
+CLAVE_FALLOS = 'autorizaciones:fallos'
+
+
+def normalizar_telefono(telefono):
+    """
+    Elimina todo lo que no sea un dígito o el signo '+' (espacios, guiones, paréntesis...).
+    """
+    return re.sub(r'[^\d+]', '', telefono or '')
+
+
+def _clave(telefono):
+    return f'autorizaciones:telefono:{telefono}'
+
+
+def _contar(clave):
+    try:
+        cache.incr(clave)
+    except ValueError:
+        # La clave no existe todavía (o la caché la ha expulsado).
+        cache.add(clave, 0, timeout=None)
+        cache.incr(clave)
+
+
+def viviendas_autorizadas(telefono):
+    """
+    IDs de las viviendas para las que está autorizado un teléfono ya normalizado.
+    También se cachean las respuestas vacías, para que probar números no autorizados
+    no llegue a la base de datos, pero solo AUTORIZACIONES_CACHE_VACIAS_SEGUNDOS.
+    """
+    clave = _clave(telefono)
+    viviendas_ids = cache.get(clave)
+    if viviendas_ids is not None:
+        _contar(CLAVE_ACIERTOS)
+        return viviendas_ids
+    _contar(CLAVE_FALLOS)
+    viviendas_ids = list(ArrendatarioAutorizado.objects.filter(telefono=telefono).values_list('vivienda_id', flat=True))
+    duracion = settings.AUTORIZACIONES_CACHE_SEGUNDOS if viviendas_ids else settings.AUTORIZACIONES_CACHE_VACIAS_SEGUNDOS
+    cache.set(clave, viviendas_ids, timeout=duracion)
+    return viviendas_ids
+
+
+def invalidar(*telefonos):
+    """
+    Borra de la caché las autorizaciones de los teléfonos indicados, una vez confirmada
+    la transacción en curso (así nadie vuelve a cachear los datos antiguos entretanto).
+    """
+    claves = [_clave(telefono) for telefono in telefonos if telefono]
+    if claves:
+        transaction.on_commit(lambda: cache.delete_many(claves))
+
+
+def cache_compartida():
+    """
+    False si la caché es propia de cada proceso (LocMemCache): entonces `invalidar` solo
+    borra las entradas del proceso que la llama.
+    """
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def estadisticas_cache():
+    aciertos = cache.get(CLAVE_ACIERTOS, 0)
+    fallos = cache.get(CLAVE_FALLOS, 0)
+    total = aciertos + fallos
+    return {
+        'aciertos': aciertos,
+        'fallos': fallos,
+        'ratio_aciertos': round(aciertos / total, 4) if total else None,
+    }
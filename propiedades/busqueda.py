@@ -0,0 +1,99 @@
+"""
+Búsqueda de los primeros huecos libres entre varias viviendas.
+
+`primeros_huecos` responde a "los N primeros huecos libres entre estas viviendas, entre
+estas fechas" con dos consultas sobre la tabla de huecos precalculados (HuecoVisita),
+cuyo coste depende de N y del número de viviendas, no de cuántos huecos tengan:
+
+1. El próximo hueco libre de cada vivienda: una subconsulta por vivienda que solo lee la
+   primera entrada del índice (vivienda, ocupado, fecha_hora).
+2. Los N primeros huecos de cada vivienda hasta un límite: el N-ésimo de esos próximos
+   huecos, porque hay N huecos (uno de cada una de esas viviendas) que no son posteriores.
+   Las viviendas cuyo próximo hueco es posterior al límite no se consultan.
+
+Los huecos de cada vivienda se mezclan después en orden con `heapq.merge` y se toman los
+N primeros.
+"""
+import heapq
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import F, OuterRef, Subquery, Window
+from django.db.models.functions import DenseRank
+from django.utils import timezone
+
+from .models import HuecoVisita, Vivienda
+
+
+def rango(desde=None, hasta=None):
+    """
+    Instantes de inicio y fin de la búsqueda para las fechas locales `desde` y `hasta`.
+    Por defecto, desde ahora hasta dentro de HUECOS_BUSQUEDA_DIAS días; nunca antes de ahora.
+    """
+    zona = timezone.get_current_timezone()
+    ahora = timezone.now()
+    inicio = max(ahora, datetime.combine(desde, time.min, tzinfo=zona)) if desde else ahora
+    hasta = hasta or timezone.localdate() + timedelta(days=settings.HUECOS_BUSQUEDA_DIAS)
+    return inicio, datetime.combine(hasta, time.max, tzinfo=zona)
+
+
+def consulta_proximos(vivienda_ids, inicio, fin):
+    """
+    (vivienda_id, fecha y hora de su próximo hueco libre o None) de cada vivienda.
+    """
+    primero = HuecoVisita.objects.filter(
+        vivienda_id=OuterRef('pk'), ocupado=False, fecha_hora__gte=inicio, fecha_hora__lte=fin,
+    ).order_by('fecha_hora').values('fecha_hora')[:1]
+    return Vivienda.objects.filter(pk__in=vivienda_ids).annotate(proximo=Subquery(primero)).order_by().values_list('pk', 'proximo')
+
+
+def consulta_candidatos(vivienda_ids, inicio, limite, n):
+    """
+    (vivienda_id, fecha_hora) de los `n` primeros huecos libres de cada vivienda hasta
+    `limite`, ordenados por vivienda y hora. Con DenseRank, un mismo instante repetido
+    (de un horario y una regla a la vez) ocupa un solo puesto.
+    """
+    puesto = Window(DenseRank(), partition_by=F('vivienda_id'), order_by=F('fecha_hora').asc())
+    return (
+        HuecoVisita.objects.filter(vivienda_id__in=vivienda_ids, ocupado=False, fecha_hora__gte=inicio, fecha_hora__lte=limite)
+        .annotate(puesto=puesto)
+        .filter(puesto__lte=n)
+        .order_by('vivienda_id', 'fecha_hora')
+        .values_list('vivienda_id', 'fecha_hora')
+    )
+
+
+def _huecos_de(vivienda_id, fechas):
+    anterior = None
+    for fecha_hora in fechas:
+        if fecha_hora != anterior:
+            yield fecha_hora, vivienda_id
+        anterior = fecha_hora
+
+
+def primeros_huecos(vivienda_ids, n=None, desde=None, hasta=None):
+    """
+    Devuelve (primeros, proximos):
+
+    - `primeros`: los `n` (por defecto HUECOS_BUSQUEDA_RESULTADOS) primeros huecos libres
+      entre todas las viviendas, como tuplas (fecha_hora, vivienda_id) en orden.
+    - `proximos`: {vivienda_id: fecha_hora} con el próximo hueco libre de cada vivienda que
+      tenga alguno en el rango.
+    """
+    n = n or settings.HUECOS_BUSQUEDA_RESULTADOS
+    vivienda_ids = list(vivienda_ids)
+    if not vivienda_ids:
+        return [], {}
+    inicio, fin = rango(desde, hasta)
+    proximos = {vivienda_id: proximo for vivienda_id, proximo in consulta_proximos(vivienda_ids, inicio, fin) if proximo is not None}
+    if not proximos:
+        return [], {}
+
+    ordenados = sorted(proximos.values())
+    limite = ordenados[n - 1] if len(ordenados) >= n else fin
+    por_vivienda = {}
+    for vivienda_id, fecha_hora in consulta_candidatos([v for v, proximo in proximos.items() if proximo <= limite], inicio, limite, n):
+        por_vivienda.setdefault(vivienda_id, []).append(fecha_hora)
+    generadores = [_huecos_de(vivienda_id, fechas) for vivienda_id, fechas in por_vivienda.items()]
+    return list(islice(heapq.merge(*generadores), n)), proximos
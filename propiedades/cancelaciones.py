@@ -0,0 +1,58 @@
+"""
+Cancelación masiva de visitas desde el panel de administración.
+
+Las visitas se cancelan con un único UPDATE condicionado a `estado='CONFIRMADA'`, así
+que una visita cancelada a la vez por el propio arrendatario no se cuenta dos veces ni
+recibe dos correos. Como `update()` no envía señales, los huecos liberados se marcan
+libres explícitamente con `huecos.liberar_huecos`. Los correos se preparan al confirmar
+la transacción con las plantillas ya compiladas de `correos` y se encolan con una sola
+inserción.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from . import correos, huecos
+from .models import Visita
+from .notificaciones import encolar_correos
+
+PLANTILLA = 'cancelacion_por_admin'
+
+
+def notificar_cancelaciones(visitas):
+    """
+    Encola el aviso de cancelación de cada visita. Las visitas deben traer cargada su vivienda.
+    """
+    plantilla = correos.plantilla(PLANTILLA)
+    mensajes = []
+    for visita in visitas:
+        cuerpo, cuerpo_html = plantilla.renderizar({'visita': visita})
+        mensajes.append({
+            'asunto': f"Cancelación de tu visita para {visita.vivienda.nombre}",
+            'cuerpo': cuerpo,
+            'cuerpo_html': cuerpo_html,
+            'destinatarios': [visita.email],
+        })
+    encolar_correos(mensajes)
+    return len(mensajes)
+
+
+def cancelar_visitas(visitas, motivo):
+    """
+    Cancela las visitas confirmadas de `visitas` (un queryset) y programa sus avisos para
+    cuando se confirme la transacción. Devuelve los IDs de las visitas canceladas.
+    """
+    with transaction.atomic():
+        # Se bloquean por clave primaria: el queryset del admin puede traer JOIN o DISTINCT.
+        ids = list(
+            Visita.objects.filter(pk__in=visitas.values('pk'), estado='CONFIRMADA')
+            .select_for_update().values_list('pk', flat=True)
+        )
+        if not ids:
+            return []
+        Visita.objects.filter(pk__in=ids, estado='CONFIRMADA').update(
+            estado='CANCELADA', motivo_cancelacion=motivo, veces_cancelada=F('veces_cancelada') + 1,
+        )
+        canceladas = list(Visita.objects.filter(pk__in=ids).select_related('vivienda'))
+        huecos.liberar_huecos((visita.vivienda_id, visita.fecha_hora) for visita in canceladas)
+        transaction.on_commit(lambda: notificar_cancelaciones(canceladas))
+    return ids
@@ -0,0 +1,119 @@
+"""
+Renderizado de las plantillas de correo de `templates/propiedades/emails/`.
+
+Cada correo tiene dos variantes, `<nombre>.txt` y `<nombre>.html`. `plantilla(nombre)`
+las compila una sola vez por proceso (`precargar()` las compila todas al arrancar) y
+`PlantillaCorreo.renderizar` genera las dos con el mismo contexto. La variante de texto
+se renderiza sin escapar HTML: un "&" en un nombre llega como "&" y no como "&amp;".
+Con DEBUG activo no se guardan: cada envío vuelve a pedirlas a `get_template`, que
+recoge los cambios en los ficheros como el resto de plantillas.
+
+Para los envíos masivos, `PlantillaCorreo.molde` renderiza la plantilla una vez por
+vivienda dejando marcadores en las variables de cada destinatario; después cada correo
+solo sustituye esos marcadores. Las variables del destinatario deben imprimirse tal cual
+(`{{ enlace_subida }}`), no usarse en etiquetas (`{% if %}`) ni con filtros.
+"""
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.template import Context
+from django.template.loader import get_template
+from django.utils.html import escape
+
+from .metricas import medir
+
+DIRECTORIO = 'propiedades/emails/'
+_plantillas = {}
+# Caracteres de uso privado de Unicode: no aparecen en los textos ni los escapa el HTML.
+_MARCADOR = re.compile(r'\ue000(\w+)\ue001')
+
+
+def marcador(variable):
+    """
+    Texto que ocupa el lugar de una variable del destinatario al crear un molde.
+    """
+    return f'\ue000{variable}\ue001'
+
+
+class PlantillaCorreo:
+    """
+    Las dos variantes compiladas de un correo.
+    """
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.texto = get_template(f'{DIRECTORIO}{nombre}.txt').template
+        self.html = get_template(f'{DIRECTORIO}{nombre}.html').template
+
+    def renderizar(self, contexto):
+        """
+        Devuelve (texto, html). Las dos variantes comparten el mismo objeto Context.
+        """
+        with medir('correo'):
+            contexto = Context(contexto, autoescape=False)
+            texto = self.texto.render(contexto)
+            contexto.autoescape = True
+            return texto, self.html.render(contexto)
+
+    def molde(self, contexto, variables):
+        """
+        Renderiza la plantilla con `contexto`, en el que las `variables` del destinatario
+        son marcadores (ver `marcador`), y devuelve un `MoldeCorreo` para rellenarlas.
+        """
+        return MoldeCorreo(self.renderizar(contexto), variables)
+
+
+class MoldeCorreo:
+    """
+    Correo ya renderizado salvo las variables de cada destinatario.
+    """
+
+    def __init__(self, variantes, variables):
+        texto, html = (_MARCADOR.split(variante) for variante in variantes)
+        usadas = set(texto[1::2]) | set(html[1::2])
+        if usadas != set(variables):
+            raise ValueError(f"La plantilla no imprime directamente las variables {sorted(set(variables) - usadas)}.")
+        self._texto = texto
+        self._html = html
+
+    def renderizar(self, valores):
+        """
+        Devuelve (texto, html) con los `valores` de un destinatario.
+        """
+        with medir('correo'):
+            texto = list(self._texto)
+            texto[1::2] = [str(valores[variable]) for variable in texto[1::2]]
+            html = list(self._html)
+            html[1::2] = [escape(valores[variable]) for variable in html[1::2]]
+            return ''.join(texto), ''.join(html)
+
+
+def plantilla(nombre):
+    """
+    La plantilla de correo `nombre`, compilada la primera vez que se pide (en DEBUG,
+    cada vez).
+    """
+    if settings.DEBUG:
+        return PlantillaCorreo(nombre)
+    if nombre not in _plantillas:
+        _plantillas[nombre] = PlantillaCorreo(nombre)
+    return _plantillas[nombre]
+
+
+def renderizar(nombre, contexto):
+    return plantilla(nombre).renderizar(contexto)
+
+
+def precargar():
+    """
+    Compila todas las plantillas de correo, para que el primer envío no pague ese coste.
+    En DEBUG no hace nada: las plantillas no se guardan.
+    """
+    if settings.DEBUG:
+        return 0
+    directorio = Path(__file__).resolve().parent / 'templates' / DIRECTORIO
+    for fichero in sorted(directorio.glob('*.txt')):
+        if fichero.with_suffix('.html').exists():
+            plantilla(fichero.stem)
+    return len(_plantillas)
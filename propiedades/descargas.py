@@ -0,0 +1,134 @@
+"""
+Descarga protegida de documentos de MEDIA_ROOT.
+
+La vista comprueba los permisos y después delega el envío de los bytes:
+
+- `MEDIA_ENVIO_SERVIDOR = 'nginx'`: cabecera X-Accel-Redirect hacia una ubicación
+  `internal` de nginx (`MEDIA_ACCEL_PREFIJO`).
+- `MEDIA_ENVIO_SERVIDOR = 'apache'`: cabecera X-Sendfile con la ruta del fichero
+  (mod_xsendfile, lighttpd).
+- Sin servidor delante: FileResponse, que los servidores WSGI envían con
+  `wsgi.file_wrapper` (os.sendfile en gunicorn o uWSGI). Las peticiones Range se
+  atienden leyendo solo el trozo pedido.
+
+Todas las respuestas llevan ETag y Last-Modified, así que volver a abrir un documento
+que no ha cambiado cuesta una respuesta 304 sin cuerpo.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import Q
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+from .almacenamiento import almacenamiento_documentos
+from .models import InquilinoDocumentacion, SubidaDocumento
+
+TAMANO_BLOQUE = 64 * 1024
+_RANGO = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def documento_de_solicitud(nombre, token):
+    """
+    Indica si el fichero `nombre` es uno de los documentos de la solicitud con ese token.
+    """
+    campos = [campo for campo, _ in SubidaDocumento.CAMPO_CHOICES]
+    filtro_inquilino = Q()
+    for campo in campos:
+        filtro_inquilino |= Q(**{campo: nombre})
+    if InquilinoDocumentacion.objects.filter(filtro_inquilino, solicitud__token_acceso=token).exists():
+        return True
+    return SubidaDocumento.objects.filter(
+        Q(fichero=nombre) | Q(miniatura=nombre) | Q(original=nombre), solicitud__token_acceso=token,
+    ).exists()
+
+
+def _rango_pedido(request, tamano, etag, modificado):
+    """
+    Devuelve (inicio, fin) del rango pedido, None para enviar el fichero completo o
+    False si el rango no se puede satisfacer.
+    """
+    cabecera = request.META.get('HTTP_RANGE', '')
+    if not cabecera or request.method not in ('GET', 'HEAD'):
+        return None
+    si_rango = request.META.get('HTTP_IF_RANGE')
+    if si_rango and si_rango != etag and parse_http_date_safe(si_rango) != int(modificado):
+        # El fichero ha cambiado desde que el cliente descargó el primer trozo.
+        return None
+    coincidencia = _RANGO.match(cabecera.strip())
+    if not coincidencia:
+        return None  # Varios rangos o una sintaxis que no soportamos: se envía entero.
+    inicio, fin = coincidencia.groups()
+    if not inicio:
+        if not fin:
+            return None
+        # "bytes=-500": los últimos 500 bytes.
+        inicio, fin = max(tamano - int(fin), 0), tamano - 1
+    else:
+        inicio, fin = int(inicio), min(int(fin), tamano - 1) if fin else tamano - 1
+    if inicio >= tamano or inicio > fin:
+        return False
+    return inicio, fin
+
+
+def _leer_rango(ruta, inicio, fin):
+    with open(ruta, 'rb') as fichero:
+        fichero.seek(inicio)
+        pendiente = fin - inicio + 1
+        while pendiente > 0:
+            bloque = fichero.read(min(TAMANO_BLOQUE, pendiente))
+            if not bloque:
+                break
+            pendiente -= len(bloque)
+            yield bloque
+
+
+def respuesta_fichero(request, nombre):
+    """
+    Respuesta que envía el fichero `nombre` del almacenamiento de documentos. No comprueba
+    permisos: eso lo hace la vista que la llama.
+    """
+    try:
+        ruta = almacenamiento_documentos().path(nombre)
+        info = os.stat(ruta)
+    except (SuspiciousFileOperation, FileNotFoundError, NotADirectoryError):
+        raise Http404("El documento no existe.")
+
+    etag = f'"{info.st_ino:x}-{info.st_mtime_ns:x}-{info.st_size:x}"'
+    respuesta = get_conditional_response(request, etag=etag, last_modified=int(info.st_mtime))
+    if respuesta is None:
+        tipo = mimetypes.guess_type(nombre)[0] or 'application/octet-stream'
+        modo = settings.MEDIA_ENVIO_SERVIDOR
+        if modo == 'nginx':
+            # nginx envía el fichero (y atiende los Range) sin pasar por Python.
+            respuesta = HttpResponse(content_type=tipo)
+            respuesta['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIJO + quote(nombre)
+        elif modo == 'apache':
+            respuesta = HttpResponse(content_type=tipo)
+            respuesta['X-Sendfile'] = ruta
+        else:
+            rango = _rango_pedido(request, info.st_size, etag, info.st_mtime)
+            if rango is False:
+                respuesta = HttpResponse(status=416)
+                respuesta['Content-Range'] = f'bytes */{info.st_size}'
+            elif rango is None:
+                respuesta = FileResponse(open(ruta, 'rb'), content_type=tipo)
+            else:
+                inicio, fin = rango
+                respuesta = StreamingHttpResponse(_leer_rango(ruta, inicio, fin), status=206, content_type=tipo)
+                respuesta['Content-Range'] = f'bytes {inicio}-{fin}/{info.st_size}'
+                respuesta['Content-Length'] = str(fin - inicio + 1)
+        respuesta['Accept-Ranges'] = 'bytes'
+        respuesta['Content-Disposition'] = f"inline; filename*=UTF-8''{quote(os.path.basename(nombre))}"
+        respuesta['X-Content-Type-Options'] = 'nosniff'
+
+    respuesta['ETag'] = etag
+    respuesta['Last-Modified'] = http_date(info.st_mtime)
+    # Documentos personales: solo la caché del navegador, y siempre revalidando con el ETag.
+    respuesta['Cache-Control'] = 'private, no-cache'
+    return respuesta
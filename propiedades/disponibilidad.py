@@ -0,0 +1,130 @@
+"""
+API JSON de los huecos libres de una vivienda, con caché HTTP.
+
+La respuesta lleva un ETag fuerte formado por la versión de los huecos de la vivienda
+(ver `huecos.version_huecos`), el rango de fechas pedido y el corte de tiempo actual. Los
+huecos solo cambian cuando cambia la versión o cuando empieza un nuevo corte de
+`HUECOS_API_INTERVALO_MINUTOS` (la lista solo incluye los huecos que empiezan después del
+siguiente corte, así que sigue siendo válida durante todo el intervalo). Con ello:
+
+- Si el cliente ya tiene esa versión (If-None-Match), se responde 304 sin consultar la
+  base de datos.
+- Si otro cliente ya la ha pedido, el cuerpo se sirve desde la caché de Django.
+- Solo en otro caso se consultan los huecos.
+"""
+import json
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .huecos import version_huecos
+from .models import HuecoVisita, Vivienda
+from .motor_huecos import datetime_desde_minuto
+
+CLAVE_NO_MODIFICADAS = 'disponibilidad:no_modificadas'
+CLAVE_CACHEADAS = 'disponibilidad:cacheadas'
+CLAVE_CALCULADAS = 'disponibilidad:calculadas'
+
+
+def _contar(clave):
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.add(clave, 0, timeout=None)
+        cache.incr(clave)
+
+
+def contar_no_modificada():
+    _contar(CLAVE_NO_MODIFICADAS)
+
+
+def rango_fechas(parametros):
+    """
+    Fechas locales `desde` y `hasta` de los parámetros de la petición (AAAA-MM-DD). Por
+    defecto, desde hoy hasta el horizonte de HUECOS_HORIZONTE_DIAS días. Lanza ValueError
+    si no son válidas.
+    """
+    hoy = timezone.localdate()
+    try:
+        desde = date.fromisoformat(parametros['desde']) if parametros.get('desde') else hoy
+        hasta = date.fromisoformat(parametros['hasta']) if parametros.get('hasta') else hoy + timedelta(days=settings.HUECOS_HORIZONTE_DIAS)
+    except ValueError:
+        raise ValueError("Las fechas deben tener el formato AAAA-MM-DD.")
+    desde = max(desde, hoy)
+    if hasta < desde:
+        raise ValueError("La fecha 'hasta' es anterior a 'desde' (o a hoy).")
+    if (hasta - desde).days > settings.HUECOS_HORIZONTE_DIAS:
+        raise ValueError(f"El rango no puede superar {settings.HUECOS_HORIZONTE_DIAS} días.")
+    return desde, hasta
+
+
+def _siguiente_corte():
+    """
+    Minuto de época en el que empieza el siguiente intervalo de HUECOS_API_INTERVALO_MINUTOS.
+    """
+    intervalo = settings.HUECOS_API_INTERVALO_MINUTOS
+    return (int(timezone.now().timestamp()) // 60 // intervalo + 1) * intervalo
+
+
+def validadores(vivienda_id, desde, hasta):
+    """
+    ETag y momento de la última modificación (timestamp) de la respuesta, sin consultar
+    la base de datos.
+    """
+    version, modificado = version_huecos(vivienda_id)
+    corte = _siguiente_corte()
+    etag = f'"{vivienda_id}-{version}-{desde:%Y%m%d}-{hasta:%Y%m%d}-{corte}"'
+    # El contenido cambia con la versión y al empezar el intervalo actual.
+    return etag, max(modificado or 0, (corte - settings.HUECOS_API_INTERVALO_MINUTOS) * 60)
+
+
+def cuerpo_respuesta(vivienda_id, desde, hasta, etag):
+    """
+    JSON (en bytes) de los huecos libres, leído de la caché para ese ETag si otro cliente
+    ya lo ha pedido. Lanza Vivienda.DoesNotExist si la vivienda no existe.
+    """
+    clave = f'disponibilidad:respuesta:{etag}'
+    cuerpo = cache.get(clave)
+    if cuerpo is not None:
+        _contar(CLAVE_CACHEADAS)
+        return cuerpo
+    _contar(CLAVE_CALCULADAS)
+    duracion = Vivienda.objects.values_list('duracion_visita_minutos', flat=True).get(pk=vivienda_id)
+    zona = timezone.get_current_timezone()
+    corte = datetime_desde_minuto(_siguiente_corte())
+    fechas = (
+        HuecoVisita.objects.filter(
+            vivienda_id=vivienda_id, ocupado=False,
+            fecha_hora__gte=max(corte, datetime.combine(desde, time.min, tzinfo=zona)),
+            fecha_hora__lte=datetime.combine(hasta, time.max, tzinfo=zona),
+        )
+        .order_by('fecha_hora')
+        .values_list('fecha_hora', flat=True)
+        .distinct()
+    )
+    cuerpo = json.dumps({
+        'vivienda': vivienda_id,
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'duracion_minutos': duracion,
+        'huecos': [timezone.localtime(fecha_hora, zona).isoformat() for fecha_hora in fechas],
+    }, separators=(',', ':')).encode()
+    # Como mucho hasta el siguiente corte: después el ETag ya es otro.
+    cache.set(clave, cuerpo, timeout=settings.HUECOS_API_INTERVALO_MINUTOS * 60)
+    return cuerpo
+
+
+def estadisticas_disponibilidad():
+    valores = cache.get_many([CLAVE_NO_MODIFICADAS, CLAVE_CACHEADAS, CLAVE_CALCULADAS])
+    no_modificadas = valores.get(CLAVE_NO_MODIFICADAS, 0)
+    cacheadas = valores.get(CLAVE_CACHEADAS, 0)
+    calculadas = valores.get(CLAVE_CALCULADAS, 0)
+    total = no_modificadas + cacheadas + calculadas
+    return {
+        'no_modificadas': no_modificadas,
+        'cacheadas': cacheadas,
+        'calculadas': calculadas,
+        'ratio_aciertos': round((no_modificadas + cacheadas) / total, 4) if total else None,
+    }
@@ -0,0 +1,124 @@
+"""
+Exportación en ZIP de la documentación de una o varias solicitudes.
+
+El ZIP se genera al vuelo mientras se envía: `zip_en_streaming` escribe cada fichero
+en trozos sobre un búfer que se vacía tras cada trozo, así que la memoria usada no
+depende del tamaño del paquete y nunca se escribe nada en disco. Como la salida no
+admite `seek`, zipfile escribe los tamaños en un descriptor detrás de cada fichero y
+usa ZIP64 cuando hace falta, por lo que los paquetes de varios GB son válidos.
+"""
+import os
+import zipfile
+
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .models import SubidaDocumento
+
+TAMANO_BLOQUE = 256 * 1024
+ETIQUETAS_DOCUMENTO = dict(SubidaDocumento.CAMPO_CHOICES)
+
+
+class _SalidaEnStreaming:
+    """
+    Fichero de solo escritura y sin `seek`/`tell` que acumula lo escrito hasta que el
+    generador lo recoge con `vaciar()`.
+    """
+
+    def __init__(self):
+        self._trozos = []
+
+    def write(self, datos):
+        self._trozos.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self._trozos)
+        self._trozos = []
+        return datos
+
+
+def zip_en_streaming(entradas):
+    """
+    Genera los bytes de un ZIP con las `entradas`, que son tuplas
+    (nombre en el ZIP, función que abre el fichero en binario o bytes, tamaño, comprimir).
+    """
+    salida = _SalidaEnStreaming()
+    fecha = timezone.localtime().timetuple()[:6]
+    with zipfile.ZipFile(salida, 'w', allowZip64=True) as archivo:
+        for nombre, origen, tamano, comprimir in entradas:
+            info = zipfile.ZipInfo(nombre, date_time=fecha)
+            # Los PDF y las fotos ya están comprimidos: se guardan tal cual, sin gastar CPU.
+            info.compress_type = zipfile.ZIP_DEFLATED if comprimir else zipfile.ZIP_STORED
+            info.external_attr = 0o644 << 16
+            with archivo.open(info, 'w', force_zip64=tamano >= zipfile.ZIP64_LIMIT) as destino:
+                if isinstance(origen, bytes):
+                    destino.write(origen)
+                else:
+                    with origen() as fichero:
+                        for bloque in iter(lambda: fichero.read(TAMANO_BLOQUE), b''):
+                            destino.write(bloque)
+                            yield salida.vaciar()
+            yield salida.vaciar()
+    # Al cerrar se escribe el directorio central.
+    yield salida.vaciar()
+
+
+def _abrir(fichero):
+    return lambda: fichero.storage.open(fichero.name, 'rb')
+
+
+def entradas_solicitud(solicitud, carpeta=''):
+    """
+    Entradas del ZIP de una solicitud: un resumen de la visita y, por cada inquilino,
+    una carpeta con sus documentos. Espera la solicitud con `visita__vivienda` cargada.
+    """
+    inquilinos = []
+    documentos = []
+    for numero, inquilino in enumerate(solicitud.inquilino_documentacion.order_by('pk'), start=1):
+        carpeta_inquilino = f"{carpeta}{numero:02d}_{get_valid_filename(inquilino.nombre_completo) or 'inquilino'}/"
+        inquilino.documentos = []
+        for campo, etiqueta in SubidaDocumento.CAMPO_CHOICES:
+            fichero = getattr(inquilino, campo)
+            if not fichero:
+                continue
+            try:
+                tamano = fichero.storage.size(fichero.name)
+            except OSError:
+                # Fichero que ya no existe en disco: no va en el ZIP, pero se indica en el resumen.
+                inquilino.documentos.append({'etiqueta': etiqueta, 'falta': True})
+                continue
+            ruta_zip = carpeta_inquilino + campo + os.path.splitext(fichero.name)[1].lower()
+            inquilino.documentos.append({'etiqueta': etiqueta, 'ruta_zip': ruta_zip, 'tamano': tamano})
+            documentos.append((ruta_zip, _abrir(fichero), tamano, False))
+        inquilinos.append(inquilino)
+
+    resumen = render_to_string('propiedades/exportacion/resumen_solicitud.txt', {
+        'solicitud': solicitud, 'visita': solicitud.visita, 'inquilinos': inquilinos, 'generado': timezone.now(),
+    }).encode('utf-8')
+    yield (f"{carpeta}resumen.txt", resumen, len(resumen), True)
+    yield from documentos
+
+
+def nombre_paquete(solicitud):
+    visita = solicitud.visita
+    return get_valid_filename(f"documentacion_{visita.nombre}_{visita.apellidos}_{visita.vivienda.nombre}") + ".zip"
+
+
+def paquete_solicitudes(solicitudes):
+    """
+    Generador del ZIP de varias solicitudes, cada una en su carpeta. Con una sola
+    solicitud los ficheros van en la raíz.
+    """
+    solicitudes = list(solicitudes)
+
+    def entradas():
+        for solicitud in solicitudes:
+            carpeta = '' if len(solicitudes) == 1 else nombre_paquete(solicitud)[:-4] + '/'
+            yield from entradas_solicitud(solicitud, carpeta)
+
+    return zip_en_streaming(entradas())
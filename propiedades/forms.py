@@ -1,7 +1,8 @@
 from django import forms
 from django.forms import modelformset_factory
-from .models import Visita, ArrendatarioAutorizado, InquilinoDocumentacion
-import re
+from django.conf import settings
+from .models import Visita, ArrendatarioAutorizado, InquilinoDocumentacion, SubidaDocumento
+from .autorizaciones import normalizar_telefono
 
 class AccesoArrendatarioForm(forms.Form):
     """
@@ -21,7 +22,7 @@ class AccesoArrendatarioForm(forms.Form):
         telefono = self.cleaned_data.get('telefono')
         if telefono:
             # Elimina todo lo que no sea un dígito o el signo '+' inicial.
-            telefono_limpio = re.sub(r'[^\d+]', '', telefono)
+            telefono_limpio = normalizar_telefono(telefono)
             if not telefono_limpio.startswith('+'):
                 raise forms.ValidationError("El número de teléfono debe incluir el prefijo internacional (ej. +34).")
             return telefono_limpio
@@ -77,6 +78,50 @@ class InquilinoDocumentacionForm(forms.ModelForm):
             'renta_anual': 'Última declaración de la renta (solo autónomos)',
         }
 
+    def __init__(self, *args, solicitud=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.solicitud = solicitud
+        self.subidas = {}
+        # Cada documento puede llegar ya subido por fragmentos: entonces el formulario
+        # solo trae el ID de la subida en un campo oculto y el fichero deja de ser obligatorio.
+        for campo, _ in SubidaDocumento.CAMPO_CHOICES:
+            nombre = f'subida_{campo}'
+            self.fields[nombre] = forms.UUIDField(required=False, widget=forms.HiddenInput)
+            if self.data.get(self.add_prefix(nombre)):
+                self.fields[campo].required = False
+
+    def clean(self):
+        cleaned_data = super().clean()
+        ids = {campo: cleaned_data.get(f'subida_{campo}') for campo, _ in SubidaDocumento.CAMPO_CHOICES}
+        ids = {campo: subida_id for campo, subida_id in ids.items() if subida_id}
+        if not ids:
+            return cleaned_data
+        subidas = SubidaDocumento.objects.filter(
+            pk__in=ids.values(), solicitud=self.solicitud, estado__in=['RECIBIDA', 'PROCESANDO', 'PROCESADA']
+        ).in_bulk()
+        for campo, subida_id in ids.items():
+            subida = subidas.get(subida_id)
+            if subida is None or subida.campo != campo:
+                self.add_error(campo, "El documento no se ha terminado de subir. Por favor, vuelve a seleccionarlo.")
+            else:
+                self.subidas[campo] = subida
+        return cleaned_data
+
+
+class SubidaDocumentoForm(forms.Form):
+    """
+    Datos con los que el navegador inicia la subida por fragmentos de un documento.
+    """
+    campo = forms.ChoiceField(choices=SubidaDocumento.CAMPO_CHOICES)
+    nombre = forms.CharField(max_length=255)
+    tamano = forms.IntegerField(min_value=1)
+
+    def clean_tamano(self):
+        tamano = self.cleaned_data['tamano']
+        if tamano > settings.DOCUMENTO_MAX_BYTES:
+            raise forms.ValidationError(f"El documento supera el tamaño máximo de {settings.DOCUMENTO_MAX_BYTES // (1024 * 1024)} MB.")
+        return tamano
+
 # Usamos un formset para permitir la subida de documentos para múltiples inquilinos.
 InquilinoDocumentacionFormSet = modelformset_factory(
     InquilinoDocumentacion,
@@ -0,0 +1,212 @@
+"""
+Índice materializado de huecos de visita.
+
+Cada HorarioVisita se expande una sola vez en filas de HuecoVisita (una por visita
+posible); las reglas recurrentes (ReglaHorarioVisita) solo se expanden hasta el
+horizonte configurado. Las señales de `propiedades/signals.py` mantienen la tabla al
+día cuando cambian los horarios, las reglas, el estado de las visitas o la duración de
+visita de la vivienda.
+
+Cada vivienda tiene además en la caché un número de versión de sus huecos que cambia,
+al confirmarse la transacción, cada vez que este módulo los modifica. La API de
+disponibilidad (`disponibilidad.py`) lo usa como ETag.
+"""
+import time
+from datetime import timedelta
+from itertools import chain
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import HorarioVisita, HuecoVisita, Visita, Vivienda
+from .motor_huecos import ConversorMinutos, datetime_desde_minuto, expandir_franjas
+
+
+def horizonte():
+    """
+    Periodo para el que se materializan los huecos de las reglas recurrentes: desde hoy
+    hasta HUECOS_HORIZONTE_DIAS días después. `regenerar_huecos` lo desplaza cada día.
+    """
+    hoy = timezone.localdate()
+    return hoy, hoy + timedelta(days=settings.HUECOS_HORIZONTE_DIAS)
+
+
+def _clave_version(vivienda_id):
+    return f'huecos:version:{vivienda_id}'
+
+
+def version_huecos(vivienda_id):
+    """
+    Versión actual de los huecos de la vivienda y momento (timestamp) en que cambió.
+    """
+    clave = _clave_version(vivienda_id)
+    valores = cache.get_many([clave, f'{clave}:modificado'])
+    if clave not in valores:
+        # Sin versión en la caché (primera vez o expulsada): se empieza por el instante
+        # actual en milisegundos, que es mayor que cualquier versión anterior.
+        ahora = time.time()
+        cache.add(clave, int(ahora * 1000), timeout=None)
+        cache.add(f'{clave}:modificado', ahora, timeout=None)
+        valores = cache.get_many([clave, f'{clave}:modificado'])
+    return valores.get(clave), valores.get(f'{clave}:modificado')
+
+
+def _cambiar_version(vivienda_ids):
+    for vivienda_id in vivienda_ids:
+        clave = _clave_version(vivienda_id)
+        try:
+            cache.incr(clave)
+        except ValueError:
+            # Sin versión todavía: la próxima lectura la crea.
+            continue
+        cache.set(f'{clave}:modificado', time.time(), timeout=None)
+
+
+def huecos_modificados(*vivienda_ids):
+    """
+    Cambia la versión de los huecos de las viviendas cuando se confirme la transacción
+    en curso (antes, alguien podría guardar los datos antiguos con la versión nueva).
+    """
+    vivienda_ids = set(vivienda_ids)
+    if vivienda_ids:
+        transaction.on_commit(lambda: _cambiar_version(vivienda_ids))
+
+
+def _franjas_horarios(horarios):
+    for horario in horarios:
+        yield horario, horario.fecha, horario.hora_inicio, horario.hora_fin
+
+
+def _franjas_reglas(reglas, desde, hasta):
+    for regla in reglas:
+        for fecha, hora_inicio, hora_fin in regla.franjas(desde, hasta):
+            yield regla, fecha, hora_inicio, hora_fin
+
+
+def _bloquear_vivienda(vivienda_id):
+    # Dos regeneraciones de la misma vivienda (una señal y `regenerar_huecos`, por
+    # ejemplo) se esperan en lugar de mezclar sus borrados e inserciones.
+    list(Vivienda.objects.select_for_update().filter(pk=vivienda_id).values_list('pk', flat=True))
+
+
+def _crear_huecos(franjas, vivienda_id, duracion_minutos):
+    """
+    Inserta los huecos de varias franjas `(origen, fecha, hora_inicio, hora_fin)` de una
+    misma vivienda con una sola inserción y marca después los ocupados con una sola
+    actualización. El origen es el HorarioVisita o la ReglaHorarioVisita de la que sale
+    la franja. La expansión se hace en minutos enteros con el motor de `motor_huecos.py`.
+    Debe llamarse dentro de la transacción que ha borrado los huecos anteriores.
+    """
+    convertir = ConversorMinutos()
+    por_origen = []
+    for origen, fecha, hora_inicio, hora_fin in franjas:
+        minutos = expandir_franjas([(convertir(fecha, hora_inicio), convertir(fecha, hora_fin))], duracion_minutos)
+        if minutos:
+            por_origen.append((origen, minutos))
+    if not por_origen:
+        return []
+
+    huecos = []
+    for origen, minutos in por_origen:
+        campo = 'horario' if isinstance(origen, HorarioVisita) else 'regla'
+        for minuto in minutos:
+            huecos.append(HuecoVisita(vivienda_id=vivienda_id, fecha_hora=datetime_desde_minuto(minuto), **{campo: origen}))
+    creados = HuecoVisita.objects.bulk_create(huecos, ignore_conflicts=True)
+
+    # La ocupación se comprueba después de insertar y no antes: una visita confirmada
+    # entre la lectura y la inserción dejaría libre un hueco que ya tiene visita.
+    desde = min(minutos[0] for _, minutos in por_origen)
+    hasta = max(minutos[-1] for _, minutos in por_origen)
+    confirmada = Visita.objects.filter(vivienda_id=vivienda_id, fecha_hora=OuterRef('fecha_hora'), estado='CONFIRMADA')
+    HuecoVisita.objects.filter(
+        vivienda_id=vivienda_id, ocupado=False,
+        fecha_hora__gte=datetime_desde_minuto(desde), fecha_hora__lte=datetime_desde_minuto(hasta),
+    ).filter(Exists(confirmada)).update(ocupado=True)
+    return creados
+
+
+def regenerar_huecos_horario(horario):
+    """
+    Vuelve a calcular los huecos de un único horario (tras crearlo o modificarlo).
+    """
+    with transaction.atomic():
+        _bloquear_vivienda(horario.vivienda_id)
+        HuecoVisita.objects.filter(horario=horario).delete()
+        huecos_modificados(horario.vivienda_id)
+        return _crear_huecos(_franjas_horarios([horario]), horario.vivienda_id, horario.vivienda.duracion_visita_minutos)
+
+
+def regenerar_huecos_regla(regla):
+    """
+    Vuelve a calcular los huecos de una regla recurrente dentro del horizonte.
+    """
+    desde, hasta = horizonte()
+    with transaction.atomic():
+        _bloquear_vivienda(regla.vivienda_id)
+        HuecoVisita.objects.filter(regla=regla).delete()
+        huecos_modificados(regla.vivienda_id)
+        return _crear_huecos(_franjas_reglas([regla], desde, hasta), regla.vivienda_id, regla.vivienda.duracion_visita_minutos)
+
+
+def regenerar_huecos_vivienda(vivienda):
+    """
+    Vuelve a calcular todos los huecos futuros de una vivienda, por ejemplo cuando
+    cambia su duración de visita o para desplazar el horizonte de las reglas recurrentes.
+    """
+    desde, hasta = horizonte()
+    with transaction.atomic():
+        _bloquear_vivienda(vivienda.id)
+        horarios = list(HorarioVisita.objects.filter(vivienda=vivienda, fecha__gte=desde))
+        reglas = list(vivienda.reglas_horario.all())
+        HuecoVisita.objects.filter(vivienda=vivienda).filter(Q(horario__fecha__gte=desde) | Q(regla__isnull=False)).delete()
+        huecos_modificados(vivienda.id)
+        franjas = chain(_franjas_horarios(horarios), _franjas_reglas(reglas, desde, hasta))
+        return _crear_huecos(franjas, vivienda.id, vivienda.duracion_visita_minutos)
+
+
+def actualizar_ocupacion(vivienda_id, fecha_hora):
+    """
+    Marca como ocupado o libre el hueco que empieza en `fecha_hora`, según exista o no
+    una visita confirmada a esa hora.
+    """
+    ocupado = Visita.objects.filter(vivienda_id=vivienda_id, fecha_hora=fecha_hora, estado='CONFIRMADA').exists()
+    if HuecoVisita.objects.filter(vivienda_id=vivienda_id, fecha_hora=fecha_hora).exclude(ocupado=ocupado).update(ocupado=ocupado):
+        huecos_modificados(vivienda_id)
+
+
+def liberar_huecos(pares):
+    """
+    Versión por lotes de `actualizar_ocupacion` para después de un `update()` masivo,
+    que no envía señales: libera en una sola consulta los huecos de los pares
+    (vivienda_id, fecha_hora) que ya no tengan ninguna visita confirmada.
+    """
+    por_vivienda = {}
+    for vivienda_id, fecha_hora in pares:
+        por_vivienda.setdefault(vivienda_id, set()).add(fecha_hora)
+    if not por_vivienda:
+        return 0
+    filtro = Q()
+    for vivienda_id, fechas in por_vivienda.items():
+        filtro |= Q(vivienda_id=vivienda_id, fecha_hora__in=fechas)
+    confirmada = Visita.objects.filter(
+        vivienda_id=OuterRef('vivienda_id'), fecha_hora=OuterRef('fecha_hora'), estado='CONFIRMADA',
+    )
+    liberados = HuecoVisita.objects.filter(filtro, ocupado=True).exclude(Exists(confirmada)).update(ocupado=False)
+    if liberados:
+        huecos_modificados(*por_vivienda)
+    return liberados
+
+
+def huecos_disponibles(vivienda):
+    """
+    Fechas de los huecos libres de una vivienda a partir de ahora, en orden cronológico.
+    """
+    return (
+        HuecoVisita.objects.filter(vivienda=vivienda, ocupado=False, fecha_hora__gte=timezone.now())
+        .order_by('fecha_hora')
+        .values_list('fecha_hora', flat=True)
+        .distinct()
+    )
@@ -0,0 +1,96 @@
+"""
+Análisis y compresión de los documentos subidos por los inquilinos.
+
+`analizar_documento` calcula el SHA-256 del fichero y, si es una imagen, la reduce a
+una resolución máxima, la rota según su orientación EXIF, elimina todos los metadatos
+(EXIF, GPS...) y genera una miniatura para el panel de administración. Los PDF y el
+resto de ficheros se dejan tal cual.
+
+Este módulo no usa la base de datos ni el ORM: sus funciones reciben rutas y
+parámetros y devuelven bytes, así que pueden ejecutarse en un ProcessPoolExecutor y
+aprovechar todos los núcleos.
+"""
+import hashlib
+import io
+import os
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+try:
+    # Fotos HEIC de iPhone, solo si está instalado pillow-heif.
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+except ImportError:
+    pass
+
+TAMANO_BLOQUE = 1024 * 1024
+
+
+class DocumentoNoValido(Exception):
+    pass
+
+
+def _jpeg(imagen, calidad):
+    salida = io.BytesIO()
+    # Sin el parámetro `exif`, Pillow no copia ningún metadato al nuevo fichero.
+    imagen.save(salida, 'JPEG', quality=calidad, optimize=True, progressive=True)
+    return salida.getvalue()
+
+
+def analizar_documento(ruta, max_lado, lado_miniatura, calidad):
+    """
+    Devuelve un diccionario con:
+      - 'sha256': hash del fichero original.
+      - 'imagen': bytes JPEG de la imagen reducida y sin metadatos, o None si no es una imagen.
+      - 'miniatura': bytes JPEG de la miniatura, o None.
+      - 'dimensiones': (ancho, alto) originales, o None.
+    Lanza DocumentoNoValido si la imagen es tan grande que podría agotar la memoria o si
+    está dañada o incompleta.
+    """
+    resumen = hashlib.sha256()
+    with open(ruta, 'rb') as fichero:
+        for bloque in iter(lambda: fichero.read(TAMANO_BLOQUE), b''):
+            resumen.update(bloque)
+    resultado = {'sha256': resumen.hexdigest(), 'imagen': None, 'miniatura': None, 'dimensiones': None}
+    try:
+        imagen = Image.open(ruta)
+    except UnidentifiedImageError:
+        return resultado  # PDF u otro formato que no es una imagen.
+    except Image.DecompressionBombError as e:
+        raise DocumentoNoValido(f"La imagen tiene demasiados píxeles: {e}")
+    except (OSError, ValueError, SyntaxError) as e:
+        raise DocumentoNoValido(f"La imagen está dañada o incompleta: {e}")
+
+    try:
+        with imagen:
+            resultado['dimensiones'] = imagen.size
+            resultado['imagen'], resultado['miniatura'] = _reducir(imagen, max_lado, lado_miniatura, calidad)
+    except (OSError, ValueError, SyntaxError) as e:
+        # Pillow solo decodifica los píxeles al reducirla: un fichero truncado o corrupto
+        # falla aquí ("image file is truncated"...), no al abrirlo.
+        raise DocumentoNoValido(f"La imagen está dañada o incompleta: {e}")
+    return resultado
+
+
+def _reducir(imagen, max_lado, lado_miniatura, calidad):
+    """
+    Bytes JPEG de la imagen reducida y de su miniatura.
+    """
+    # En JPEG, draft() decodifica directamente a una escala reducida (1/2, 1/4, 1/8):
+    # mucho más rápido y con menos memoria que cargar la foto entera y reducirla.
+    imagen.draft('RGB', (max_lado, max_lado))
+    # La orientación se aplica antes de descartar el EXIF para que la foto no salga girada.
+    reducida = ImageOps.exif_transpose(imagen)
+    if reducida.mode not in ('RGB', 'L'):
+        reducida = reducida.convert('RGB')
+    reducida.thumbnail((max_lado, max_lado), Image.LANCZOS)
+    miniatura = reducida.copy()
+    miniatura.thumbnail((lado_miniatura, lado_miniatura), Image.LANCZOS)
+    return _jpeg(reducida, calidad), _jpeg(miniatura, 75)
+
+
+def nombre_jpeg(nombre):
+    """
+    Nombre del fichero tras convertirlo a JPEG: 'dni.HEIC' -> 'dni.jpg'.
+    """
+    return os.path.splitext(nombre)[0] + '.jpg'
@@ -0,0 +1,144 @@
+"""
+Límite de intentos del acceso por teléfono, guardado en la caché de Django.
+
+Cada intento se comprueba por IP y por teléfono normalizado con dos límites:
+
+- Un cubo de fichas (`ACCESO_RAFAGA` fichas, que se reponen a `ACCESO_FICHAS_POR_MINUTO`)
+  que permite una ráfaga corta, por ejemplo al equivocarse al escribir el número.
+- Una ventana deslizante de una hora (`ACCESO_LIMITE_HORA_IP` y
+  `ACCESO_LIMITE_HORA_TELEFONO`) que frena a quien va probando números sin parar.
+
+Los contadores usan `cache.add`, `cache.incr` y `cache.decr`, que son atómicos en las
+cachés en memoria, Memcached y Redis (no en FileBasedCache), así que varios procesos
+comparten los contadores sin bloqueos. Un
+intento rechazado recibe un 429 sin llegar a la base de datos ni a la sesión.
+"""
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .autorizaciones import normalizar_telefono
+
+VENTANA_SEGUNDOS = 3600
+CLAVE_PERMITIDOS = 'limites:permitidos'
+CLAVE_RECHAZADOS = 'limites:rechazados:{}'
+
+
+def _incrementar(clave, timeout):
+    """
+    Incrementa el contador `clave` y devuelve su nuevo valor.
+    """
+    cache.add(clave, 0, timeout=timeout)
+    try:
+        return cache.incr(clave)
+    except ValueError:
+        # La caché la ha expulsado entre las dos llamadas.
+        cache.add(clave, 0, timeout=timeout)
+        return cache.incr(clave)
+
+
+def _ventana_deslizante(clave, limite, ahora):
+    """
+    Cuenta el intento y devuelve si el número de intentos de la última hora supera el límite.
+
+    Se aproxima la ventana deslizante con dos ventanas fijas: el contador de la hora en
+    curso más la parte proporcional del de la hora anterior.
+    """
+    numero = int(ahora // VENTANA_SEGUNDOS)
+    actual = _incrementar(f'{clave}:{numero}', 2 * VENTANA_SEGUNDOS)
+    anterior = cache.get(f'{clave}:{numero - 1}', 0)
+    transcurrido = (ahora % VENTANA_SEGUNDOS) / VENTANA_SEGUNDOS
+    return actual + anterior * (1 - transcurrido) > limite
+
+
+def _cubo_de_fichas(clave, capacidad, por_segundo, ahora):
+    """
+    Gasta una ficha y devuelve si el cubo estaba vacío.
+
+    Se guarda el instante de referencia y las fichas gastadas desde entonces; las
+    disponibles son `capacidad + (ahora - inicio) * por_segundo - gastadas`. Cuando el
+    cubo vuelve a estar lleno se reinicia la referencia. El reinicio no es atómico: con
+    peticiones simultáneas justo en ese momento puede colarse alguna de más, nunca de menos.
+    """
+    llenado = capacidad / por_segundo
+    gastadas = _incrementar(f'{clave}:gastadas', int(llenado) + 1)
+    cache.add(f'{clave}:inicio', ahora, timeout=int(llenado) + 1)
+    inicio = cache.get(f'{clave}:inicio', ahora)
+    repuestas = (ahora - inicio) * por_segundo
+    if repuestas >= gastadas - 1:
+        # Lleno antes de este intento: equivale a empezar de cero.
+        cache.set_many({f'{clave}:inicio': ahora, f'{clave}:gastadas': 1}, timeout=int(llenado) + 1)
+        return False
+    if gastadas > capacidad + repuestas:
+        # Sin fichas: el intento rechazado no gasta ninguna.
+        try:
+            cache.decr(f'{clave}:gastadas')
+        except ValueError:
+            pass  # Ha caducado: el cubo ya está lleno otra vez.
+        return True
+    return False
+
+
+def ip_cliente(request):
+    """
+    IP del cliente. Detrás de un proxy, `LIMITES_CABECERA_IP` indica la cabecera en la que
+    el proxy la añade (por ejemplo HTTP_X_FORWARDED_FOR); se usa el último valor, que es el
+    que ha puesto nuestro proxy y no el cliente.
+    """
+    if settings.LIMITES_CABECERA_IP:
+        valores = request.META.get(settings.LIMITES_CABECERA_IP, '').split(',')
+        if valores[-1].strip():
+            return valores[-1].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def intento_excedido(tipo, valor, limite_hora, ahora=None):
+    """
+    Registra un intento para `valor` (una IP o un teléfono) y devuelve si supera la
+    ráfaga permitida o el límite por hora.
+    """
+    ahora = time.time() if ahora is None else ahora
+    clave = f'limites:{tipo}:{valor}'
+    rafaga = _cubo_de_fichas(f'{clave}:cubo', settings.ACCESO_RAFAGA, settings.ACCESO_FICHAS_POR_MINUTO / 60, ahora)
+    # La ventana cuenta también los intentos frenados por la ráfaga: insistir no sale gratis.
+    hora = _ventana_deslizante(f'{clave}:hora', limite_hora, ahora)
+    return rafaga or hora
+
+
+def limitar_accesos(vista):
+    """
+    Decorador que limita los POST de la vista por IP y por el teléfono enviado.
+    """
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        if request.method == 'POST':
+            rechazo = None
+            if intento_excedido('ip', ip_cliente(request), settings.ACCESO_LIMITE_HORA_IP):
+                rechazo = 'ip'
+            else:
+                telefono = normalizar_telefono(request.POST.get('telefono', ''))[:20]
+                if telefono and intento_excedido('telefono', telefono, settings.ACCESO_LIMITE_HORA_TELEFONO):
+                    rechazo = 'telefono'
+            if rechazo:
+                _incrementar(CLAVE_RECHAZADOS.format(rechazo), None)
+                respuesta = HttpResponse(
+                    "Demasiados intentos. Espera unos minutos antes de volver a intentarlo.",
+                    status=429, content_type='text/plain; charset=utf-8',
+                )
+                respuesta['Retry-After'] = str(int(60 / settings.ACCESO_FICHAS_POR_MINUTO) + 1)
+                return respuesta
+            _incrementar(CLAVE_PERMITIDOS, None)
+        return vista(request, *args, **kwargs)
+    return envoltura
+
+
+def estadisticas_limites():
+    valores = cache.get_many([CLAVE_PERMITIDOS, CLAVE_RECHAZADOS.format('ip'), CLAVE_RECHAZADOS.format('telefono')])
+    return {
+        'permitidos': valores.get(CLAVE_PERMITIDOS, 0),
+        'rechazados_ip': valores.get(CLAVE_RECHAZADOS.format('ip'), 0),
+        'rechazados_telefono': valores.get(CLAVE_RECHAZADOS.format('telefono'), 0),
+    }
@@ -0,0 +1,139 @@
+"""
+Listados del panel de administración para tablas grandes.
+
+`ListadoOptimizadoAdmin` evita las consultas que crecen con el tamaño de la tabla:
+
+- El total no se calcula con un COUNT(*) completo. Sin filtros, en PostgreSQL se usa la
+  estimación de `pg_class.reltuples`; con filtros (o en otras bases de datos) se cuenta
+  como mucho hasta `ADMIN_CONTEO_MAXIMO` filas. Cuando el total es aproximado, se puede
+  seguir avanzando página a página más allá de él hasta llegar a una página vacía.
+- La página se lee con una "unión diferida": primero solo las claves primarias de la
+  página (el OFFSET recorre el índice, no las filas completas) y después esas filas.
+- Los campos de texto largos que el listado no muestra (`campos_diferidos`) no se leen.
+"""
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def contar_estimado(queryset, maximo=None):
+    """
+    Número de filas de `queryset`: exacto si no pasa de `maximo`. Si lo pasa, el resultado
+    (mayor que `maximo`) es solo aproximado.
+    """
+    maximo = maximo or settings.ADMIN_CONTEO_MAXIMO
+    conexion = connections[queryset.db]
+    if conexion.vendor == 'postgresql' and not queryset.query.has_filters():
+        with conexion.cursor() as cursor:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [queryset.model._meta.db_table])
+            fila = cursor.fetchone()
+        # reltuples es -1 (o 0) si la tabla nunca se ha analizado.
+        if fila and fila[0] > maximo:
+            return fila[0]
+    # COUNT(*) sobre una subconsulta con LIMIT: nunca lee más de `maximo` + 1 filas.
+    return queryset.order_by()[:maximo + 1].count()
+
+
+class PaginadorEstimado(Paginator):
+    """
+    Paginador con el total de `contar_estimado` que lee cada página con una unión diferida.
+
+    Si el total es aproximado (`estimado`), admite páginas posteriores a las que salen
+    de él hasta llegar a una vacía, y tras una página completa ofrece siempre la
+    siguiente. Con `conteo_minimo` (el `list_max_show_all` del listado), un total
+    aproximado nunca es tan bajo como para que el administrador muestre todas las filas
+    de una vez o deje de paginar.
+    """
+
+    def __init__(self, *args, conteo_minimo=0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.conteo_minimo = conteo_minimo
+        self._paginas_minimas = 0
+        self._paginas_exactas = None
+
+    @cached_property
+    def conteo_maximo(self):
+        return max(settings.ADMIN_CONTEO_MAXIMO, self.per_page, self.conteo_minimo)
+
+    @cached_property
+    def count(self):
+        return contar_estimado(self.object_list, self.conteo_maximo)
+
+    @property
+    def estimado(self):
+        return self.count > self.conteo_maximo
+
+    @property
+    def num_pages(self):
+        if not self.estimado:
+            return super().num_pages
+        return self._paginas_exactas or max(super().num_pages, self._paginas_minimas)
+
+    def validate_number(self, number):
+        if not self.estimado:
+            return super().validate_number(number)
+        # Las mismas comprobaciones menos la del máximo, que no se conoce: una página
+        # posterior a la última existente se detecta en `page()` al salir vacía.
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        inicio = (number - 1) * self.per_page
+        if self.estimado:
+            # Una clave de más indica si existe la página siguiente.
+            claves = list(dict.fromkeys(self.object_list.values_list('pk', flat=True)[inicio:inicio + self.per_page + 1]))
+            if not claves and number > 1:
+                raise EmptyPage(self.error_messages['no_results'])
+            if len(claves) > self.per_page:
+                claves = claves[:self.per_page]
+                self._paginas_minimas = number + 1
+            else:
+                self._paginas_exactas = number
+        else:
+            claves = list(dict.fromkeys(self.object_list.values_list('pk', flat=True)[inicio:inicio + self.per_page]))
+        filas = {fila.pk: fila for fila in self.object_list.order_by().filter(pk__in=claves)}
+        return self._get_page([filas[clave] for clave in claves if clave in filas], number, self)
+
+
+class ChangeListDiferida(ChangeList):
+    def get_queryset(self, request, exclude_parameters=None):
+        queryset = super().get_queryset(request, exclude_parameters)
+        campos = self.model_admin.campos_diferidos
+        return queryset.defer(*campos) if campos else queryset
+
+
+class ListadoOptimizadoAdmin(admin.ModelAdmin):
+    """
+    Base de los listados de tablas que crecen sin límite (visitas, horarios, solicitudes).
+    """
+    paginator = PaginadorEstimado
+    # Evita el segundo COUNT(*) de la tabla entera para el texto "N de M seleccionados".
+    show_full_result_count = False
+    # Campos (también de relaciones cargadas con list_select_related) que el listado no lee.
+    campos_diferidos = ()
+
+    def get_changelist(self, request, **kwargs):
+        return ChangeListDiferida
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        return self.paginator(queryset, per_page, orphans, allow_empty_first_page, conteo_minimo=self.list_max_show_all)
+
+
+class FiltroVivienda(admin.RelatedFieldListFilter):
+    """
+    Filtro por vivienda que solo lee el ID y el nombre de cada vivienda.
+    """
+
+    def field_choices(self, field, request, model_admin):
+        return list(field.related_model._default_manager.order_by('nombre').values_list('pk', 'nombre'))
@@ -0,0 +1,71 @@
+import heapq
+import statistics
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from propiedades import busqueda, huecos
+from propiedades.tests.carga import base_de_datos_temporal, generar_cartera
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la búsqueda de los N primeros huecos libres entre muchas viviendas (busqueda.primeros_huecos) "
+        "frente a leer los huecos de cada vivienda por separado y mezclarlos. Usa una base de datos temporal de pruebas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--viviendas', type=int, default=300, help="Viviendas de la cartera sintética (por defecto 300).")
+        parser.add_argument('--resultados', type=int, nargs='+', default=[5, 50], help="Valores de N a medir (por defecto 5 y 50).")
+        parser.add_argument('--repeticiones', type=int, default=20, help="Repeticiones de cada medida (por defecto 20).")
+        parser.add_argument('--presupuesto-ms', type=float, default=None, help="Falla si la mediana de primeros_huecos supera estos milisegundos.")
+        parser.add_argument('--semilla', type=int, default=42)
+
+    def handle(self, *args, **options):
+        with base_de_datos_temporal():
+            self._ejecutar(options)
+
+    def _ejecutar(self, options):
+        cartera = generar_cartera(viviendas=options['viviendas'], telefonos=0, visitas_historicas=0, semilla=options['semilla'])
+        ids = [vivienda.id for vivienda in cartera.viviendas]
+        self.stdout.write(f"{len(ids)} viviendas con huecos durante 14 días; {options['repeticiones']} repeticiones por medida.")
+
+        excedidos = []
+        for n in options['resultados']:
+            ingenuo, consultas_ingenuo, esperado = self._medir(lambda: self._ingenuo(cartera.viviendas, n), options['repeticiones'])
+            rapido, consultas_rapido, obtenido = self._medir(lambda: busqueda.primeros_huecos(ids, n=n)[0], options['repeticiones'])
+            if obtenido != esperado:
+                raise CommandError(f"N={n}: primeros_huecos no coincide con la mezcla de los huecos de cada vivienda.")
+            self.stdout.write(f"\nN={n}")
+            self.stdout.write(f"  huecos de cada vivienda + mezcla: {ingenuo * 1000:8.2f} ms, {consultas_ingenuo} consultas")
+            self.stdout.write(f"  primeros_huecos:                  {rapido * 1000:8.2f} ms, {consultas_rapido} consultas ({ingenuo / rapido:.1f}x)")
+            if options['presupuesto_ms'] is not None and rapido * 1000 > options['presupuesto_ms']:
+                excedidos.append(f"N={n}: {rapido * 1000:.2f} ms")
+        if excedidos:
+            raise CommandError(f"primeros_huecos supera el presupuesto de {options['presupuesto_ms']} ms: {', '.join(excedidos)}")
+
+    def _ingenuo(self, viviendas, n):
+        # Lo que haría la vista sin `busqueda`: todos los huecos de cada vivienda, una
+        # consulta por vivienda, mezclados en Python.
+        inicio, fin = busqueda.rango()
+
+        def huecos_de(vivienda):
+            for fecha_hora in huecos.huecos_disponibles(vivienda):
+                if fecha_hora > fin:
+                    return
+                if fecha_hora >= inicio:
+                    yield fecha_hora, vivienda.id
+
+        return list(islice(heapq.merge(*(huecos_de(vivienda) for vivienda in viviendas)), n))
+
+    def _medir(self, funcion, repeticiones):
+        tiempos = []
+        for _ in range(repeticiones):
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = time.perf_counter()
+                resultado = funcion()
+                tiempos.append(time.perf_counter() - inicio)
+        return statistics.median(tiempos), len(consultas), resultado
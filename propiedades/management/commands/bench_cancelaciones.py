@@ -0,0 +1,63 @@
+import time
+from datetime import time as dtime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from propiedades.tests.carga import base_de_datos_temporal
+from propiedades.cancelaciones import cancelar_visitas
+from propiedades.models import CorreoPendiente, HorarioVisita, HuecoVisita, Visita, Vivienda
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la cancelación masiva de visitas del panel de administración: consultas, tiempo de base de "
+        "datos y correos encolados. Usa una base de datos temporal de pruebas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--visitas', type=int, default=5000, help="Visitas confirmadas a cancelar (por defecto 5000).")
+        parser.add_argument('--viviendas', type=int, default=50, help="Viviendas entre las que se reparten (por defecto 50).")
+
+    def handle(self, *args, **options):
+        with base_de_datos_temporal():
+            self._ejecutar(options['visitas'], options['viviendas'])
+
+    def _ejecutar(self, total, numero_viviendas):
+        por_vivienda = -(-total // numero_viviendas)
+        viviendas = Vivienda.objects.bulk_create([
+            Vivienda(nombre=f"Vivienda {i}", direccion_completa="Calle Falsa 123", referencia_catastral=f"BENCH-{i}",
+                     precio_mensualidad=900, duracion_visita_minutos=30)
+            for i in range(numero_viviendas)
+        ])
+        manana = timezone.localdate() + timedelta(days=1)
+        visitas = []
+        for vivienda in viviendas:
+            # Un horario de un día entero por cada 48 visitas: huecos de 30 minutos.
+            for dia in range(-(-por_vivienda // 48)):
+                HorarioVisita.objects.create(vivienda=vivienda, fecha=manana + timedelta(days=dia), hora_inicio=dtime(0), hora_fin=dtime(23, 59))
+            for fecha_hora in HuecoVisita.objects.filter(vivienda=vivienda).order_by('fecha_hora').values_list('fecha_hora', flat=True)[:por_vivienda]:
+                visitas.append(Visita(
+                    vivienda=vivienda, nombre="Prueba", apellidos="Carga", email="prueba@example.com", telefono="+34600000000",
+                    sueldo_mensual=2000, numero_inquilinos=1, numero_menores=0, puesto_trabajo="Pruebas", fecha_hora=fecha_hora,
+                ))
+        Visita.objects.bulk_create(visitas[:total])
+        HuecoVisita.objects.update(ocupado=True)
+
+        with CaptureQueriesContext(connection) as consultas:
+            inicio = time.perf_counter()
+            with transaction.atomic():
+                canceladas = cancelar_visitas(Visita.objects.all(), "Prueba de cancelación masiva.")
+            cancelacion = time.perf_counter() - inicio
+        tiempo_bd = sum(float(consulta['time']) for consulta in consultas.captured_queries)
+
+        correos = CorreoPendiente.objects.count()
+        libres = HuecoVisita.objects.filter(ocupado=False).count()
+        self.stdout.write(f"{len(canceladas)} visitas canceladas en {numero_viviendas} viviendas ({connection.vendor}):")
+        self.stdout.write(f"  {len(consultas)} consultas, {tiempo_bd * 1000:.0f} ms de base de datos, {cancelacion * 1000:.0f} ms en total (con el renderizado de los correos)")
+        self.stdout.write(f"  {correos} correos encolados, {libres} huecos liberados")
+        if len(canceladas) != total or correos != total or libres < total:
+            raise CommandError("Prueba fallida: no coinciden las visitas canceladas, los correos encolados y los huecos liberados.")
+        self.stdout.write(self.style.SUCCESS("Cancelación masiva correcta."))
@@ -0,0 +1,74 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from propiedades import correos
+from propiedades.models import SolicitudDeDocumentacion, Visita, Vivienda
+from propiedades.solicitudes import PLANTILLA, _enlace_subida
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide cuántos correos por segundo se renderizan (texto y HTML) para un envío masivo de "
+        "instrucciones de documentación, sin tocar la base de datos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--destinatarios', type=int, default=10000, help="Correos a renderizar (por defecto 10000).")
+        parser.add_argument('--viviendas', type=int, default=50, help="Viviendas entre las que se reparten (por defecto 50).")
+
+    def handle(self, *args, **options):
+        total = options['destinatarios']
+        viviendas = [
+            Vivienda(id=i, nombre=f"Vivienda {i}", direccion_completa="Calle Falsa 123", nombre_aseguradora_impagos="Aseguradora")
+            for i in range(1, options['viviendas'] + 1)
+        ]
+        manana = timezone.now() + timedelta(days=1)
+        solicitudes = [
+            SolicitudDeDocumentacion(visita=Visita(
+                vivienda=viviendas[i % len(viviendas)], nombre=f"Candidato {i}", apellidos="Prueba",
+                email=f"candidato{i}@example.com", fecha_hora=manana,
+            ))
+            for i in range(total)
+        ]
+        enlaces = [_enlace_subida(solicitud) for solicitud in solicitudes]
+
+        def render_to_string_doble():
+            for solicitud, enlace in zip(solicitudes, enlaces):
+                contexto = {'visita': solicitud.visita, 'enlace_subida': enlace, 'aseguradora': solicitud.visita.vivienda.nombre_aseguradora_impagos}
+                render_to_string(f'{correos.DIRECTORIO}{PLANTILLA}.txt', contexto)
+                render_to_string(f'{correos.DIRECTORIO}{PLANTILLA}.html', contexto)
+
+        def plantilla_compilada():
+            plantilla = correos.plantilla(PLANTILLA)
+            for solicitud, enlace in zip(solicitudes, enlaces):
+                plantilla.renderizar({'visita': solicitud.visita, 'enlace_subida': enlace, 'aseguradora': solicitud.visita.vivienda.nombre_aseguradora_impagos})
+
+        def molde_por_vivienda():
+            plantilla = correos.plantilla(PLANTILLA)
+            moldes = {}
+            for solicitud, enlace in zip(solicitudes, enlaces):
+                vivienda = solicitud.visita.vivienda
+                if vivienda.id not in moldes:
+                    moldes[vivienda.id] = plantilla.molde({
+                        'visita': {'nombre': correos.marcador('nombre'), 'vivienda': vivienda},
+                        'enlace_subida': correos.marcador('enlace_subida'),
+                        'aseguradora': vivienda.nombre_aseguradora_impagos,
+                    }, ['nombre', 'enlace_subida'])
+                moldes[vivienda.id].renderizar({'nombre': solicitud.visita.nombre, 'enlace_subida': enlace})
+
+        self.stdout.write(f"{total} correos de instrucciones (texto y HTML) para {len(viviendas)} viviendas:")
+        base = None
+        for nombre, funcion in (
+            ("render_to_string x2", render_to_string_doble),
+            ("plantilla compilada", plantilla_compilada),
+            ("molde por vivienda", molde_por_vivienda),
+        ):
+            inicio = time.perf_counter()
+            funcion()
+            transcurrido = time.perf_counter() - inicio
+            base = base or transcurrido
+            self.stdout.write(f"  {nombre:<20} {total / transcurrido:9.0f} correos/s ({transcurrido:.2f} s, x{base / transcurrido:.1f})")
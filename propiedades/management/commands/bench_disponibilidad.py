@@ -0,0 +1,83 @@
+import random
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from propiedades.tests.carga import DATOS_VISITA, base_de_datos_temporal, generar_cartera
+from propiedades.models import HuecoVisita, Visita
+
+
+class Command(BaseCommand):
+    help = (
+        "Simula clientes (la web o portales de anuncios) que consultan periódicamente la API JSON de huecos "
+        "libres mientras se reservan visitas, y muestra cuántas respuestas son 304, cuántas salen de la caché "
+        "y cuántas se calculan, con su latencia y consultas. Usa una base de datos temporal de pruebas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', type=int, default=50, help="Clientes consultando la API (por defecto 50).")
+        parser.add_argument('--rondas', type=int, default=20, help="Rondas de consultas (por defecto 20).")
+        parser.add_argument('--viviendas', type=int, default=20, help="Viviendas de la cartera sintética (por defecto 20).")
+        parser.add_argument('--reservas', type=int, default=3, help="Visitas reservadas entre ronda y ronda (por defecto 3).")
+        parser.add_argument('--semilla', type=int, default=42)
+
+    def handle(self, *args, **options):
+        # Claves propias: los contadores y versiones de la prueba no se mezclan con los reales.
+        cache_propia = {'default': {**settings.CACHES['default'], 'KEY_PREFIX': f'bench_disponibilidad_{uuid.uuid4().hex}'}}
+        with override_settings(CACHES=cache_propia, METRICAS_DIRECTORIO=''), base_de_datos_temporal():
+            self._ejecutar(options)
+
+    def _ejecutar(self, options):
+        cartera = generar_cartera(viviendas=options['viviendas'], telefonos=0, visitas_historicas=0, semilla=options['semilla'])
+        aleatorio = random.Random(options['semilla'])
+        rutas = [f'/vivienda/{vivienda.id}/huecos.json' for vivienda in cartera.viviendas]
+        # Cada cliente sigue siempre la misma vivienda y guarda el último ETag, como un navegador.
+        clientes = [(Client(), aleatorio.choice(rutas)) for _ in range(options['clientes'])]
+        etags = {}
+        medidas = {'no_modificada': [], 'cacheada': [], 'calculada': []}
+        errores = Counter()
+
+        for ronda in range(options['rondas']):
+            for numero, (cliente, ruta) in enumerate(clientes):
+                cabeceras = {'HTTP_IF_NONE_MATCH': etags[numero]} if numero in etags else {}
+                with CaptureQueriesContext(connection) as consultas:
+                    inicio = time.perf_counter()
+                    respuesta = cliente.get(ruta, **cabeceras)
+                    transcurrido = time.perf_counter() - inicio
+                if respuesta.status_code == 304:
+                    tipo = 'no_modificada'
+                elif respuesta.status_code == 200:
+                    tipo = 'calculada' if len(consultas) else 'cacheada'
+                    etags[numero] = respuesta['ETag']
+                else:
+                    errores[respuesta.status_code] += 1
+                    continue
+                medidas[tipo].append((transcurrido, len(consultas)))
+            # Entre rondas se reservan algunas visitas: sus viviendas cambian de versión.
+            for _ in range(options['reservas']):
+                hueco = HuecoVisita.objects.filter(ocupado=False).order_by('?').values_list('vivienda_id', 'fecha_hora').first()
+                if hueco:
+                    Visita.objects.create(vivienda_id=hueco[0], fecha_hora=hueco[1], email="api@example.com", telefono="+34600000000", **DATOS_VISITA)
+
+        total = sum(len(lista) for lista in medidas.values())
+        self.stdout.write(
+            f"{options['clientes']} clientes x {options['rondas']} rondas sobre {options['viviendas']} viviendas, "
+            f"{options['reservas']} reservas entre rondas: {total} respuestas."
+        )
+        for tipo, lista in medidas.items():
+            if lista:
+                media = sum(segundos for segundos, _ in lista) / len(lista)
+                consultas = sum(numero for _, numero in lista) / len(lista)
+                self.stdout.write(f"  {tipo:<14} {len(lista):6d} ({100 * len(lista) / total:5.1f} %) | {media * 1000:6.2f} ms de media | {consultas:.1f} consultas")
+            else:
+                self.stdout.write(f"  {tipo:<14} {0:6d}")
+        aciertos = len(medidas['no_modificada']) + len(medidas['cacheada'])
+        self.stdout.write(f"  Ratio de aciertos (304 o desde la caché): {100 * aciertos / total:.1f} %")
+        if errores:
+            raise CommandError(f"Respuestas con error: {dict(errores)}")
@@ -0,0 +1,193 @@
+import json
+import math
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import override_settings
+
+from propiedades.tests.carga import Embudo, base_de_datos_temporal, generar_cartera
+
+REFERENCIA = os.path.join(settings.BASE_DIR, 'referencia_embudo.json')
+
+
+def _percentil(ordenados, fraccion):
+    return ordenados[max(0, math.ceil(fraccion * len(ordenados)) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Prueba de carga del flujo completo del arrendatario (acceso, selección, reserva, gestión o "
+        "cancelación y subida de documentos) con varios hilos sobre una cartera sintética. Informa de "
+        "p50/p95/p99, consultas por petición y peticiones por segundo de cada paso, y los compara con la "
+        "referencia guardada en JSON. Usa una base de datos temporal de pruebas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=4, help="Arrendatarios recorriendo el flujo a la vez (por defecto 4).")
+        parser.add_argument('--recorridos', type=int, default=150, help="Recorridos completos en total (por defecto 150).")
+        parser.add_argument('--viviendas', type=int, default=20, help="Viviendas de la cartera sintética (por defecto 20).")
+        parser.add_argument('--telefonos', type=int, default=500, help="Teléfonos autorizados (por defecto 500).")
+        parser.add_argument('--visitas-historicas', type=int, default=5000, help="Visitas pasadas de la cartera (por defecto 5000).")
+        parser.add_argument('--cancelan', type=float, default=0.3, help="Fracción de recorridos que cancelan la visita (por defecto 0.3).")
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--referencia', default=REFERENCIA, help=f"Fichero JSON de referencia (por defecto {REFERENCIA}).")
+        parser.add_argument('--guardar', action='store_true', help="Guarda el resultado como nueva referencia en lugar de compararlo.")
+        parser.add_argument('--tolerancia', type=float, default=0.5,
+                            help="Empeoramiento admitido del tiempo de CPU por petición (p50) y de las peticiones por segundo respecto a la "
+                                 "referencia (por defecto 0.5: un 50 %% más lento). "
+                                 "Las consultas por petición no admiten empeoramiento.")
+
+    def handle(self, *args, **options):
+        media = tempfile.mkdtemp(prefix='bench_embudo_')
+        ajustes = override_settings(
+            MEDIA_ROOT=media,
+            # Las claves de esta prueba no se mezclan con las de la caché real (autorizaciones,
+            # sesiones, límites de intentos) aunque sea compartida.
+            CACHES={'default': {**settings.CACHES['default'], 'KEY_PREFIX': f'bench_embudo_{uuid.uuid4().hex}'}},
+            # Se miden las vistas, no el límite de intentos: sigue comprobándose pero no frena a nadie.
+            ACCESO_RAFAGA=10 ** 6, ACCESO_LIMITE_HORA_IP=10 ** 6, ACCESO_LIMITE_HORA_TELEFONO=10 ** 6,
+            METRICAS_DIRECTORIO='',
+        )
+        try:
+            with ajustes, base_de_datos_temporal(en_fichero=True):
+                resultado = self._ejecutar(options)
+        finally:
+            shutil.rmtree(media, ignore_errors=True)
+
+        if options['guardar']:
+            with open(options['referencia'], 'w') as fichero:
+                json.dump(resultado, fichero, indent=2, ensure_ascii=False)
+                fichero.write('\n')
+            self.stdout.write(self.style.SUCCESS(f"Referencia guardada en {options['referencia']}."))
+        elif os.path.exists(options['referencia']):
+            with open(options['referencia']) as fichero:
+                self._comparar(resultado, json.load(fichero), options['tolerancia'])
+        else:
+            self.stdout.write(f"No hay referencia en {options['referencia']}: usa --guardar para crearla.")
+
+    def _ejecutar(self, options):
+        inicio = time.perf_counter()
+        cartera = generar_cartera(
+            viviendas=options['viviendas'], telefonos=options['telefonos'],
+            visitas_historicas=options['visitas_historicas'], semilla=options['semilla'],
+        )
+        self.stdout.write(
+            f"Cartera sintética: {options['viviendas']} viviendas, {options['telefonos']} teléfonos, "
+            f"{options['visitas_historicas']} visitas históricas ({time.perf_counter() - inicio:.1f} s)."
+        )
+
+        telefonos = list(cartera.autorizaciones)
+        pendientes = list(range(options['recorridos']))
+        bloqueo = threading.Lock()
+        medidas = []
+        fallos = Counter()
+        huecos_ocupados = 0
+
+        def arrendatario(hilo):
+            nonlocal huecos_ocupados
+            aleatorio = random.Random(options['semilla'] * 1000 + hilo)
+            try:
+                while True:
+                    with bloqueo:
+                        if not pendientes:
+                            return
+                        numero = pendientes.pop()
+                    # Cada recorrido con su IP, como arrendatarios distintos.
+                    embudo = Embudo(cartera, telefonos[numero % len(telefonos)], f"10.1.{numero // 256 % 256}.{numero % 256}", aleatorio, options['cancelan'])
+                    try:
+                        embudo.recorrer(numero)
+                    except RuntimeError as error:
+                        with bloqueo:
+                            fallos[str(error).split(' en ')[0]] += 1
+                    with bloqueo:
+                        medidas.extend(embudo.medidas)
+                        huecos_ocupados += embudo.huecos_ocupados
+            finally:
+                connections.close_all()
+
+        inicio = time.perf_counter()
+        hilos = [threading.Thread(target=arrendatario, args=(i,)) for i in range(options['hilos'])]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        total = time.perf_counter() - inicio
+
+        pasos = {}
+        for paso, segundos, cpu, consultas, _ in medidas:
+            tiempos, tiempos_cpu, numeros = pasos.setdefault(paso, ([], [], []))
+            tiempos.append(segundos)
+            tiempos_cpu.append(cpu)
+            numeros.append(consultas)
+        resultado = {
+            'configuracion': {
+                clave: options[clave] for clave in ('hilos', 'recorridos', 'viviendas', 'telefonos', 'visitas_historicas', 'cancelan', 'semilla')
+            } | {'base_de_datos': connection.vendor},
+            'peticiones_segundo': round(len(medidas) / total, 1),
+            'recorridos_segundo': round(options['recorridos'] / total, 2),
+            'pasos': {},
+        }
+        self.stdout.write(
+            f"\n{options['recorridos']} recorridos con {options['hilos']} hilos en {total:.1f} s: "
+            f"{len(medidas)} peticiones, {resultado['peticiones_segundo']} peticiones/s, "
+            f"{resultado['recorridos_segundo']} recorridos/s ({connection.vendor})."
+        )
+        self.stdout.write(f"  {'paso':<24}{'peticiones':>11}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'CPU ms':>8}{'consultas':>11}{'máx':>5}")
+        for paso, (tiempos, tiempos_cpu, consultas) in pasos.items():
+            tiempos.sort()
+            tiempos_cpu.sort()
+            datos = resultado['pasos'][paso] = {
+                'peticiones': len(tiempos),
+                'p50_ms': round(_percentil(tiempos, 0.50) * 1000, 2),
+                'p95_ms': round(_percentil(tiempos, 0.95) * 1000, 2),
+                'p99_ms': round(_percentil(tiempos, 0.99) * 1000, 2),
+                'cpu_p50_ms': round(_percentil(tiempos_cpu, 0.50) * 1000, 2),
+                'consultas': round(sum(consultas) / len(consultas), 2),
+                'consultas_max': max(consultas),
+            }
+            self.stdout.write(
+                f"  {paso:<24}{datos['peticiones']:>11}{datos['p50_ms']:>9.1f}{datos['p95_ms']:>9.1f}{datos['p99_ms']:>9.1f}{datos['cpu_p50_ms']:>8.1f}"
+                f"{datos['consultas']:>11.1f}{datos['consultas_max']:>5}"
+            )
+        self.stdout.write(f"  Huecos ya ocupados al reservar (se reintenta con otro): {huecos_ocupados}")
+        errores = Counter(estado for *_, estado in medidas if estado >= 500)
+        if fallos or errores:
+            for descripcion, cantidad in sorted(fallos.items()):
+                self.stdout.write(self.style.ERROR(f"  Recorridos fallidos en {descripcion}: {cantidad}"))
+            raise CommandError(f"Prueba fallida: {sum(fallos.values())} recorridos fallidos y {sum(errores.values())} errores 5xx.")
+        return resultado
+
+    def _comparar(self, resultado, referencia, tolerancia):
+        if resultado['configuracion'] != referencia.get('configuracion'):
+            self.stdout.write(self.style.WARNING(
+                f"La referencia se midió con otra configuración ({referencia.get('configuracion')}): la comparación es orientativa."
+            ))
+        regresiones = []
+        for paso, datos in resultado['pasos'].items():
+            anterior = referencia['pasos'].get(paso)
+            if anterior is None:
+                continue
+            # Medio punto de margen: los reintentos por huecos ocupados varían entre ejecuciones.
+            if datos['consultas'] > anterior['consultas'] + 0.5:
+                regresiones.append(f"{paso}: {datos['consultas']} consultas por petición (referencia {anterior['consultas']})")
+            # Se compara el tiempo de CPU: con varios hilos, la latencia depende sobre todo de
+            # cómo se reparten el GIL y los bloqueos de la base de datos, y varía mucho entre
+            # ejecuciones. Por debajo de 2 ms de diferencia es ruido de la máquina, no de la vista.
+            if datos['cpu_p50_ms'] > anterior['cpu_p50_ms'] * (1 + tolerancia) and datos['cpu_p50_ms'] - anterior['cpu_p50_ms'] > 2:
+                regresiones.append(f"{paso}: {datos['cpu_p50_ms']} ms de CPU por petición (referencia {anterior['cpu_p50_ms']} ms)")
+        if resultado['peticiones_segundo'] < referencia['peticiones_segundo'] / (1 + tolerancia):
+            regresiones.append(f"{resultado['peticiones_segundo']} peticiones/s (referencia {referencia['peticiones_segundo']})")
+        if regresiones:
+            for regresion in regresiones:
+                self.stdout.write(self.style.ERROR(f"  Regresión: {regresion}"))
+            raise CommandError(f"{len(regresiones)} regresiones respecto a la referencia.")
+        self.stdout.write(self.style.SUCCESS("Sin regresiones respecto a la referencia."))
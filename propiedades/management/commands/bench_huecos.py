@@ -0,0 +1,76 @@
+import time
+from datetime import date, datetime, time as dtime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from propiedades.motor_huecos import ConversorMinutos, datetime_desde_minuto, expandir_franjas, formatear_hueco
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark del motor de huecos: coste por hueco al expandir N franjas horarias sin base de datos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--franjas', type=int, nargs='+', default=[10_000, 1_000_000], help="Número de franjas a expandir (por defecto 10000 y 1000000).")
+        parser.add_argument('--duracion', type=int, default=30, help="Duración de la visita en minutos (por defecto 30).")
+        parser.add_argument('--mostrar', type=int, default=50, help="Huecos que se formatean como texto, como haría la vista (por defecto 50).")
+        parser.add_argument('--comparar', action='store_true', help="Mide también el bucle anterior (un datetime por hueco). Lento con 1M franjas.")
+
+    def handle(self, *args, **options):
+        for n in options['franjas']:
+            self._medir(n, options)
+
+    def _generar_franjas(self, n):
+        # Cuatro franjas de 2 horas por día, en días consecutivos a partir de hoy (con
+        # 1M de franjas el rango abarca siglos, así que incluye muchos cambios de hora).
+        hoy = date.today()
+        horas = (10, 12, 16, 18)
+        return [(hoy + timedelta(days=i // 4), dtime(horas[i % 4]), dtime(horas[i % 4] + 2)) for i in range(n)]
+
+    def _medir(self, n, options):
+        duracion = options['duracion']
+        franjas = self._generar_franjas(n)
+        zona = timezone.get_current_timezone()
+
+        inicio = time.perf_counter()
+        convertir = ConversorMinutos(zona)
+        minutos = [(convertir(f, hi), convertir(f, hf)) for f, hi, hf in franjas]
+        t_conversion = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        huecos = expandir_franjas(minutos, duracion)
+        t_expansion = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        for minuto in huecos[:options['mostrar']]:
+            formatear_hueco(datetime_desde_minuto(minuto), zona)
+        t_formato = time.perf_counter() - inicio
+
+        total = t_conversion + t_expansion + t_formato
+        self.stdout.write(f"\n{n} franjas -> {len(huecos)} huecos")
+        self.stdout.write(f"  conversión de extremos: {t_conversion * 1000:9.1f} ms")
+        self.stdout.write(f"  expansión:              {t_expansion * 1000:9.1f} ms")
+        self.stdout.write(f"  formato ({options['mostrar']} huecos):     {t_formato * 1000:9.1f} ms")
+        self.stdout.write(self.style.SUCCESS(f"  total: {total * 1000:.1f} ms, {total / max(len(huecos), 1) * 1e9:.0f} ns por hueco"))
+
+        if options['comparar']:
+            inicio = time.perf_counter()
+            anteriores = self._bucle_anterior(franjas, duracion)
+            t_anterior = time.perf_counter() - inicio
+            self.stdout.write(
+                f"  bucle anterior: {t_anterior * 1000:.1f} ms, {t_anterior / max(len(huecos), 1) * 1e9:.0f} ns por hueco "
+                f"({len(anteriores)} huecos, x{t_anterior / total:.1f} más lento)"
+            )
+
+    def _bucle_anterior(self, franjas, duracion):
+        # Reproduce el cálculo original de _get_horarios_disponibles, que creaba y
+        # formateaba un datetime por cada hueco candidato.
+        duracion_visita = timedelta(minutes=duracion)
+        disponibles = []
+        for fecha, hora_inicio, hora_fin in franjas:
+            hora_actual = timezone.make_aware(datetime.combine(fecha, hora_inicio))
+            hora_fin_aware = timezone.make_aware(datetime.combine(fecha, hora_fin))
+            while hora_actual + duracion_visita <= hora_fin_aware:
+                disponibles.append((hora_actual.isoformat(), hora_actual.strftime('%d de %B de %Y a las %H:%M')))
+                hora_actual += duracion_visita
+        return disponibles
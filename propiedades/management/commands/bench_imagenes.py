@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from propiedades import imagenes
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el throughput de la compresión de fotos de documentos (reducción, EXIF y miniatura) "
+        "en serie y con un conjunto de procesos, usando fotos sintéticas del tamaño de las de un móvil."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--imagenes', type=int, default=24, help="Fotos sintéticas a procesar (por defecto 24).")
+        parser.add_argument('--ancho', type=int, default=4032, help="Ancho de cada foto (por defecto 4032, 12 Mpx).")
+        parser.add_argument('--alto', type=int, default=3024, help="Alto de cada foto (por defecto 3024).")
+        parser.add_argument('--procesos', type=int, nargs='+', default=None,
+                            help="Tamaños del conjunto de procesos a comparar (por defecto 1 y el número de núcleos).")
+
+    def handle(self, *args, **options):
+        procesos = options['procesos'] or sorted({1, os.cpu_count() or 1})
+        directorio = tempfile.mkdtemp(prefix='bench_imagenes_')
+        try:
+            rutas = self._generar(directorio, options['imagenes'], options['ancho'], options['alto'])
+            bytes_entrada = sum(os.path.getsize(ruta) for ruta in rutas)
+            argumentos = (settings.IMAGEN_MAX_LADO, settings.IMAGEN_LADO_MINIATURA, settings.IMAGEN_CALIDAD_JPEG)
+            self.stdout.write(
+                f"{len(rutas)} fotos de {options['ancho']}x{options['alto']} ({bytes_entrada / len(rutas) / 1e6:.1f} MB de media), "
+                f"lado máximo {settings.IMAGEN_MAX_LADO} px:"
+            )
+
+            base = None
+            for numero in procesos:
+                inicio = time.perf_counter()
+                if numero == 1:
+                    resultados = [imagenes.analizar_documento(ruta, *argumentos) for ruta in rutas]
+                else:
+                    with ProcessPoolExecutor(numero) as ejecutor:
+                        resultados = list(ejecutor.map(imagenes.analizar_documento, rutas, *[[a] * len(rutas) for a in argumentos]))
+                transcurrido = time.perf_counter() - inicio
+                base = base or transcurrido
+                bytes_salida = sum(len(r['imagen']) + len(r['miniatura']) for r in resultados)
+                self.stdout.write(
+                    f"  {numero:>2} procesos: {len(rutas) / transcurrido:6.1f} fotos/s ({transcurrido:.2f} s, x{base / transcurrido:.1f}) | "
+                    f"{bytes_entrada / 1e6:.1f} MB -> {bytes_salida / 1e6:.1f} MB ({100 * (1 - bytes_salida / bytes_entrada):.0f}% menos)"
+                )
+        finally:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    def _generar(self, directorio, cantidad, ancho, alto):
+        """
+        Fotos JPEG con ruido y metadatos EXIF (orientación y GPS), como las de una cámara de móvil.
+        """
+        rutas = []
+        base = Image.effect_noise((ancho, alto), 40).convert('RGB')
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientación: girada 90°.
+        exif[0x8825] = {1: 'N', 2: (40.0, 25.0, 0.0)}  # Coordenadas GPS.
+        for i in range(cantidad):
+            ruta = os.path.join(directorio, f"foto_{i}.jpg")
+            base.save(ruta, 'JPEG', quality=92, exif=exif)
+            rutas.append(ruta)
+        return rutas
@@ -0,0 +1,65 @@
+import gc
+import tempfile
+import time
+from datetime import time as dtime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from propiedades.tests.carga import base_de_datos_temporal
+from propiedades.models import ArrendatarioAutorizado, HorarioVisita, Vivienda
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la sobrecarga de MetricasMiddleware y del backend de plantillas medido comparando las "
+        "mismas peticiones con y sin ellos. Usa una base de datos temporal de pruebas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--peticiones', type=int, default=1000, help="Peticiones por ronda y configuración (por defecto 1000).")
+        parser.add_argument('--rondas', type=int, default=5, help="Rondas alternas (por defecto 5).")
+
+    def handle(self, *args, **options):
+        with base_de_datos_temporal():
+            self._ejecutar(options['peticiones'], options['rondas'])
+
+    def _ejecutar(self, peticiones, rondas):
+        vivienda = Vivienda.objects.create(
+            nombre="Vivienda de prueba", direccion_completa="Calle Falsa 123",
+            referencia_catastral="PRUEBA-METRICAS", precio_mensualidad=900, duracion_visita_minutos=30,
+        )
+        ArrendatarioAutorizado.objects.create(vivienda=vivienda, telefono='+34600000000')
+        HorarioVisita.objects.create(vivienda=vivienda, fecha=timezone.localdate() + timedelta(days=1), hora_inicio=dtime(9), hora_fin=dtime(21))
+        rutas = ['/seleccionar-vivienda/', f'/vivienda/{vivienda.id}/agendar-visita/']
+
+        sin_middleware = [m for m in settings.MIDDLEWARE if m != 'propiedades.metricas.MetricasMiddleware']
+        sin_backend = [{**motor, 'BACKEND': 'django.template.backends.django.DjangoTemplates'} for motor in settings.TEMPLATES]
+        configuraciones = {
+            'sin métricas': override_settings(MIDDLEWARE=sin_middleware, TEMPLATES=sin_backend),
+            'con métricas': override_settings(METRICAS_DIRECTORIO=tempfile.mkdtemp(prefix='bench_metricas_')),
+        }
+        tiempos = {nombre: [] for nombre in configuraciones}
+        # Un solo acceso para todas las rondas: repetirlo chocaría con el límite de intentos.
+        cliente = Client()
+        cliente.post('/acceso-arrendatario/', {'telefono': '+34600000000'})
+        for _ in range(rondas):
+            for nombre, ajustes in configuraciones.items():
+                with ajustes:
+                    for ruta in rutas:
+                        cliente.get(ruta)  # Calentamiento: plantillas compiladas, sesión en caché.
+                    gc.collect()
+                    inicio = time.perf_counter()
+                    for i in range(peticiones):
+                        cliente.get(rutas[i % len(rutas)])
+                    tiempos[nombre].append((time.perf_counter() - inicio) / peticiones)
+
+        # La mejor ronda de cada configuración: la menos afectada por el ruido de la máquina.
+        base = min(tiempos['sin métricas'])
+        medido = min(tiempos['con métricas'])
+        self.stdout.write(f"{peticiones} peticiones x {rondas} rondas a {', '.join(rutas)}:")
+        self.stdout.write(f"  sin métricas: {base * 1000:.3f} ms por petición")
+        self.stdout.write(f"  con métricas: {medido * 1000:.3f} ms por petición")
+        self.stdout.write(f"  sobrecarga:   {(medido - base) * 1e6:.0f} µs por petición ({100 * (medido - base) / base:+.1f}%)")
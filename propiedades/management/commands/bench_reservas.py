@@ -0,0 +1,150 @@
+import threading
+import time
+from collections import Counter
+from datetime import time as dtime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from propiedades.tests.carga import base_de_datos_temporal
+from propiedades.models import ArrendatarioAutorizado, HorarioVisita, HuecoVisita, Visita, Vivienda
+
+
+# Opciones de SQLite que se comparan: las de Django por defecto (diario de reversión,
+# espera de 5 s y transacciones diferidas) y las de settings.py (WAL, busy_timeout,
+# synchronous=NORMAL y transacciones inmediatas).
+OPCIONES_SQLITE = {
+    'sqlite-basico': {},
+    'sqlite-ajustado': {
+        'timeout': 20,
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+    },
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Prueba de carga de reservas concurrentes: N arrendatarios intentan reservar a la vez los mismos "
+        "huecos. Usa una base de datos temporal de pruebas y falla si hay errores 500 o reservas duplicadas. "
+        "Con SQLite compara además el rendimiento con las opciones por defecto y con las ajustadas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrentes', type=int, default=50, help="Arrendatarios reservando a la vez (por defecto 50).")
+        parser.add_argument('--huecos', type=int, default=3, help="Huecos distintos por los que compiten (por defecto 3).")
+        parser.add_argument('--modos', nargs='+', choices=['configurada', *OPCIONES_SQLITE], default=None,
+                            help="Configuraciones a comparar. Por defecto, con SQLite 'sqlite-basico' y 'sqlite-ajustado'; "
+                                 "con otra base de datos, 'configurada' (la de settings.py).")
+
+    def handle(self, *args, **options):
+        modos = options['modos'] or (list(OPCIONES_SQLITE) if connection.vendor == 'sqlite' else ['configurada'])
+        if connection.vendor != 'sqlite' and set(modos) - {'configurada'}:
+            raise CommandError("Los modos de SQLite solo pueden compararse con DB_MOTOR=sqlite.")
+        ajustes = connection.settings_dict
+        opciones_originales = ajustes['OPTIONS']
+        resumenes = {}
+        try:
+            for modo in modos:
+                if modo != 'configurada':
+                    # Todas las conexiones (también las de los hilos) comparten este diccionario.
+                    ajustes['OPTIONS'] = dict(OPCIONES_SQLITE[modo])
+                connection.close()
+                # Un fichero real, no la base de datos en memoria, para medir bloqueos como en producción.
+                # Sin volcados de métricas: se sumarían a las del servidor real.
+                with override_settings(METRICAS_DIRECTORIO=''), base_de_datos_temporal(en_fichero=True):
+                    resumenes[modo] = self._ejecutar(options)
+                ajustes['OPTIONS'] = opciones_originales
+        finally:
+            ajustes['OPTIONS'] = opciones_originales
+            connection.close()
+
+        if len(resumenes) > 1:
+            self.stdout.write("\nComparación:")
+            for modo, resumen in resumenes.items():
+                self.stdout.write(
+                    f"  {modo:<16} {resumen['peticiones_segundo']:6.1f} peticiones/s | p50 {resumen['p50'] * 1000:5.0f} ms | "
+                    f"máx {resumen['maximo'] * 1000:5.0f} ms | {resumen['errores']} errores"
+                )
+
+        # Las opciones por defecto de SQLite pueden dar errores "database is locked"; eso es
+        # lo que se quiere comparar. Reservar dos veces un hueco es siempre un fallo.
+        fallidos = [modo for modo, resumen in resumenes.items() if resumen['duplicadas'] or (resumen['errores'] and modo != 'sqlite-basico')]
+        if fallidos:
+            raise CommandError(f"Prueba fallida en {', '.join(fallidos)}: hay respuestas con error o huecos reservados dos veces.")
+        self.stdout.write(self.style.SUCCESS("Sin errores 500 ni reservas duplicadas."))
+
+    def _ejecutar(self, options):
+        concurrentes = options['concurrentes']
+        vivienda = Vivienda.objects.create(
+            nombre="Vivienda de prueba de carga", direccion_completa="Calle Falsa 123",
+            referencia_catastral="PRUEBA-CARGA", precio_mensualidad=900, duracion_visita_minutos=30,
+        )
+        telefonos = [f"+3460000{i:04d}" for i in range(concurrentes)]
+        ArrendatarioAutorizado.objects.bulk_create([ArrendatarioAutorizado(vivienda=vivienda, telefono=t) for t in telefonos])
+        manana = timezone.localdate() + timedelta(days=1)
+        HorarioVisita.objects.create(vivienda=vivienda, fecha=manana, hora_inicio=dtime(10), hora_fin=dtime(10 + options['huecos'] // 2, 30 * (options['huecos'] % 2)))
+        huecos = [timezone.localtime(h).isoformat() for h in HuecoVisita.objects.filter(vivienda=vivienda).values_list('fecha_hora', flat=True)]
+
+        barrera = threading.Barrier(concurrentes)
+        resultados = Counter()
+        tiempos = []
+        bloqueo = threading.Lock()
+
+        def arrendatario(i):
+            try:
+                # Cada arrendatario con su IP, como en producción, para no chocar con el límite de intentos.
+                cliente = Client(raise_request_exception=False, REMOTE_ADDR=f"10.0.{i // 256}.{i % 256}")
+                cliente.post('/acceso-arrendatario/', {'telefono': telefonos[i]})
+                datos = {
+                    'nombre': f"Prueba {i}", 'apellidos': "Carga", 'email': f"prueba{i}@example.com",
+                    'sueldo_mensual': '2000', 'numero_inquilinos': 1, 'numero_menores': 0,
+                    'puesto_trabajo': "Pruebas", 'horario_disponible': huecos[i % len(huecos)],
+                }
+                barrera.wait()
+                inicio = time.perf_counter()
+                respuesta = cliente.post(f'/vivienda/{vivienda.id}/agendar-visita/', datos)
+                transcurrido = time.perf_counter() - inicio
+                if respuesta.status_code == 302:
+                    resultado = 'reservada'
+                elif respuesta.status_code == 200:
+                    resultado = 'hueco ocupado'
+                else:
+                    resultado = f'HTTP {respuesta.status_code}'
+                with bloqueo:
+                    resultados[resultado] += 1
+                    tiempos.append(transcurrido)
+            finally:
+                connections.close_all()
+
+        inicio = time.perf_counter()
+        hilos = [threading.Thread(target=arrendatario, args=(i,)) for i in range(concurrentes)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        total = time.perf_counter() - inicio
+
+        confirmadas = Counter(Visita.objects.filter(vivienda=vivienda, estado='CONFIRMADA').values_list('fecha_hora', flat=True))
+        tiempos.sort()
+        opciones = ', '.join(f"{clave}={valor}" for clave, valor in connection.settings_dict['OPTIONS'].items()) or "opciones por defecto"
+        self.stdout.write(f"{concurrentes} arrendatarios compitiendo por {len(huecos)} huecos ({connection.vendor}: {opciones}):")
+        for resultado, cantidad in sorted(resultados.items()):
+            self.stdout.write(f"  {resultado}: {cantidad}")
+        if tiempos:
+            self.stdout.write(
+                f"  latencia de la reserva: p50 {tiempos[len(tiempos) // 2] * 1000:.0f} ms, "
+                f"máx {tiempos[-1] * 1000:.0f} ms; {concurrentes / total:.1f} peticiones/s"
+            )
+
+        errores = sum(cantidad for resultado, cantidad in resultados.items() if resultado.startswith('HTTP'))
+        duplicadas = [fecha for fecha, cantidad in confirmadas.items() if cantidad > 1]
+        return {
+            'peticiones_segundo': concurrentes / total,
+            'p50': tiempos[len(tiempos) // 2] if tiempos else 0,
+            'maximo': tiempos[-1] if tiempos else 0,
+            'errores': errores,
+            'duplicadas': len(duplicadas) + (resultados['reservada'] != len(confirmadas)),
+        }
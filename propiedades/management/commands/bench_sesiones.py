@@ -0,0 +1,72 @@
+from datetime import time as dtime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from propiedades.tests.carga import base_de_datos_temporal
+from propiedades.models import ArrendatarioAutorizado, HorarioVisita, HuecoVisita, Vivienda
+
+MOTORES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Cuenta las consultas y escrituras en la base de datos del recorrido completo del arrendatario "
+        "(acceso, reserva y modificación de la visita) con cada modo de sesión. Usa una base de datos "
+        "temporal de pruebas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modos', nargs='+', choices=list(MOTORES), default=list(MOTORES),
+                            help="Modos de sesión a comparar (por defecto, todos).")
+
+    def handle(self, *args, **options):
+        with base_de_datos_temporal():
+            vivienda = Vivienda.objects.create(
+                nombre="Vivienda de prueba", direccion_completa="Calle Falsa 123",
+                referencia_catastral="PRUEBA-SESIONES", precio_mensualidad=900, duracion_visita_minutos=30,
+            )
+            HorarioVisita.objects.create(vivienda=vivienda, fecha=timezone.localdate() + timedelta(days=1), hora_inicio=dtime(9), hora_fin=dtime(21))
+            self.stdout.write("Recorrido: acceso, selección, reserva, confirmación y modificación de la visita.")
+            for numero, modo in enumerate(options['modos']):
+                telefono = f"+3460000{numero:04d}"
+                ArrendatarioAutorizado.objects.create(vivienda=vivienda, telefono=telefono)
+                with override_settings(SESSION_ENGINE=MOTORES[modo], METRICAS_DIRECTORIO=''):
+                    consultas, escrituras, de_sesion, cookie = self._recorrido(vivienda, telefono)
+                self.stdout.write(
+                    f"  {modo:<10} {consultas:3d} consultas | {escrituras:2d} escrituras, {de_sesion:2d} de ellas en django_session | "
+                    f"cookie de sesión de {cookie} bytes"
+                )
+
+    def _recorrido(self, vivienda, telefono):
+        cliente = Client()
+        huecos = [timezone.localtime(h).isoformat() for h in HuecoVisita.objects.filter(vivienda=vivienda, ocupado=False).order_by('fecha_hora').values_list('fecha_hora', flat=True)[:2]]
+        datos = {
+            'nombre': "Prueba", 'apellidos': "Sesiones", 'email': "prueba@example.com", 'sueldo_mensual': '2000',
+            'numero_inquilinos': 1, 'numero_menores': 0, 'puesto_trabajo': "Pruebas",
+        }
+        agendar = f'/vivienda/{vivienda.id}/agendar-visita/'
+        with CaptureQueriesContext(connection) as capturadas:
+            cliente.get('/acceso-arrendatario/')
+            cliente.post('/acceso-arrendatario/', {'telefono': telefono})
+            cliente.get('/seleccionar-vivienda/')
+            cliente.get(agendar)
+            confirmacion = cliente.post(agendar, {**datos, 'horario_disponible': huecos[0]}).url
+            cliente.get(confirmacion)
+            gestionar = confirmacion.replace('/confirmacion/', '/gestionar/')
+            cliente.post(gestionar, {'modificar': '1'})
+            cliente.get(agendar)
+            cliente.post(agendar, {**datos, 'horario_disponible': huecos[1]})
+        sentencias = [consulta['sql'].lstrip().upper() for consulta in capturadas.captured_queries]
+        escrituras = [sql for sql in sentencias if sql.startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        de_sesion = [sql for sql in escrituras if 'DJANGO_SESSION' in sql]
+        cookie = cliente.cookies.get('sessionid')
+        return len(sentencias), len(escrituras), len(de_sesion), len(cookie.value) if cookie else 0
@@ -0,0 +1,55 @@
+import os
+import resource
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from propiedades.exportacion import zip_en_streaming
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la memoria máxima y el throughput de la exportación en ZIP en streaming con un paquete "
+        "sintético de varios GB (ficheros dispersos, que no ocupan disco)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ficheros', type=int, default=40, help="Número de documentos (por defecto 40).")
+        parser.add_argument('--mb', type=int, default=64, help="Tamaño de cada documento en MB (por defecto 64; 40 x 64 MB = 2,5 GB).")
+
+    def handle(self, *args, **options):
+        directorio = tempfile.mkdtemp(prefix='bench_zip_')
+        try:
+            tamano = options['mb'] * 1024 * 1024
+            rutas = []
+            for i in range(options['ficheros']):
+                ruta = os.path.join(directorio, f"documento_{i}.pdf")
+                with open(ruta, 'wb') as fichero:
+                    fichero.truncate(tamano)
+                rutas.append(ruta)
+            entradas = [(f"inquilino/documento_{i}.pdf", (lambda r=ruta: open(r, 'rb')), tamano, False) for i, ruta in enumerate(rutas)]
+            total = tamano * len(rutas)
+
+            rss_inicial = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            tracemalloc.start()
+            inicio = time.perf_counter()
+            enviados = trozos = mayor_trozo = 0
+            for trozo in zip_en_streaming(entradas):
+                enviados += len(trozo)
+                trozos += 1
+                mayor_trozo = max(mayor_trozo, len(trozo))
+            transcurrido = time.perf_counter() - inicio
+            _, pico = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            rss_final = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+            self.stdout.write(f"Paquete de {len(rutas)} documentos, {total / 2**30:.2f} GB de datos -> ZIP de {enviados / 2**30:.2f} GB en {trozos} trozos.")
+            self.stdout.write(f"  Throughput: {enviados / 2**20 / transcurrido:.0f} MB/s ({transcurrido:.1f} s)")
+            self.stdout.write(f"  Pico de memoria Python (tracemalloc): {pico / 2**20:.2f} MB | trozo más grande: {mayor_trozo / 1024:.0f} KB")
+            # ru_maxrss está en KB en Linux: es el máximo del proceso desde que arrancó.
+            self.stdout.write(f"  RSS máximo del proceso: {rss_inicial / 1024:.0f} MB antes, {rss_final / 1024:.0f} MB después")
+        finally:
+            shutil.rmtree(directorio, ignore_errors=True)
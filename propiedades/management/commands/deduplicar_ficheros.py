@@ -0,0 +1,68 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from propiedades.almacenamiento import almacenamiento_documentos, sha256_de_fichero
+
+
+class Command(BaseCommand):
+    help = (
+        "Convierte los documentos de inquilinos ya existentes (MEDIA_ROOT/documentacion) al almacenamiento "
+        "sin duplicados: los ficheros con el mismo contenido pasan a compartir un único fichero en disco. "
+        "También borra los contenidos que ya no usa ningún documento."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simular', action='store_true', help="Solo informa de lo que se ahorraría, sin tocar ningún fichero.")
+
+    def handle(self, *args, **options):
+        almacenamiento = almacenamiento_documentos()
+        raiz = os.path.abspath(settings.MEDIA_ROOT)
+        documentacion = os.path.join(raiz, 'documentacion')
+        # Los fragmentos de subidas en curso no se tocan.
+        excluidos = {os.path.join(documentacion, 'parciales')}
+        simular = options['simular']
+
+        revisados = duplicados = bytes_recuperados = 0
+        vistos = set()  # Contenidos que ya existirían tras una simulación.
+        for directorio, subdirectorios, ficheros in os.walk(documentacion):
+            subdirectorios[:] = [d for d in subdirectorios if os.path.join(directorio, d) not in excluidos]
+            for nombre in ficheros:
+                ruta = os.path.join(directorio, nombre)
+                if os.path.islink(ruta) or not os.path.isfile(ruta):
+                    continue
+                info = os.stat(ruta)
+                if info.st_nlink > 1:
+                    continue  # Ya está enlazado a su contenido.
+                revisados += 1
+                resumen = sha256_de_fichero(ruta)
+                ruta_contenido = almacenamiento.ruta_contenido(resumen)
+                existe = os.path.exists(ruta_contenido) or resumen in vistos
+                if existe:
+                    duplicados += 1
+                    bytes_recuperados += info.st_size
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f"Duplicado: {os.path.relpath(ruta, raiz)}")
+                if simular:
+                    vistos.add(resumen)
+                    continue
+                if existe:
+                    # Sustituimos el fichero por un enlace al contenido, de forma atómica.
+                    temporal = ruta + '.dedup'
+                    os.link(ruta_contenido, temporal)
+                    os.replace(temporal, ruta)
+                else:
+                    # Primer fichero con este contenido: pasa a ser el contenido, sin copiarlo.
+                    os.makedirs(os.path.dirname(ruta_contenido), exist_ok=True)
+                    os.link(ruta, ruta_contenido)
+
+        # Contenidos que ya no usa ningún fichero (documentos borrados).
+        huerfanos, bytes_huerfanos = almacenamiento.limpiar_contenidos_huerfanos(simular=simular)
+        bytes_recuperados += bytes_huerfanos
+
+        prefijo = "[SIMULACIÓN] " if simular else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefijo}Revisados {revisados} ficheros: {duplicados} duplicados enlazados y {huerfanos} contenidos "
+            f"huérfanos borrados. Espacio recuperado: {bytes_recuperados / (1024 * 1024):.2f} MB ({bytes_recuperados} bytes)."
+        ))
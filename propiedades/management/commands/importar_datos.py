@@ -0,0 +1,159 @@
+import csv
+import io
+import json
+import sys
+import time
+from datetime import date, time as dtime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from propiedades import autorizaciones
+from propiedades.huecos import regenerar_huecos_vivienda
+from propiedades.models import ArrendatarioAutorizado, HorarioVisita, Vivienda
+
+
+class FilaInvalida(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa de forma masiva arrendatarios autorizados u horarios de visita desde un fichero CSV "
+        "o JSON Lines, leyéndolo en streaming e insertando por lotes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('tipo', choices=['arrendatarios', 'horarios'], help="Qué se importa.")
+        parser.add_argument('fichero', help="Ruta del fichero, o '-' para leer de la entrada estándar.")
+        parser.add_argument('--formato', choices=['csv', 'jsonl'], help="Formato del fichero (por defecto, según la extensión).")
+        parser.add_argument('--lote', type=int, default=1000, help="Filas por inserción (por defecto 1000).")
+        parser.add_argument('--max-errores', type=int, default=20, help="Errores de fila que se muestran como máximo (por defecto 20).")
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or ('jsonl' if options['fichero'].endswith(('.jsonl', '.ndjson')) else 'csv')
+        modelo = ArrendatarioAutorizado if options['tipo'] == 'arrendatarios' else HorarioVisita
+        convertir = self._arrendatario if options['tipo'] == 'arrendatarios' else self._horario
+
+        # Las viviendas se pueden indicar por ID o por referencia catastral.
+        self._viviendas = dict(Vivienda.objects.values_list('referencia_catastral', 'id'))
+        self._ids_viviendas = set(self._viviendas.values())
+
+        if options['fichero'] == '-':
+            fichero = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+        else:
+            try:
+                fichero = open(options['fichero'], encoding='utf-8', newline='')
+            except OSError as e:
+                raise CommandError(f"No se puede abrir el fichero: {e}")
+
+        total_antes = modelo.objects.count()
+        leidas = errores = 0
+        viviendas_afectadas = set()
+        lote = []
+        inicio = time.monotonic()
+        with fichero:
+            for numero, fila in self._leer(fichero, formato):
+                leidas += 1
+                try:
+                    objeto = convertir(fila)
+                except FilaInvalida as e:
+                    errores += 1
+                    if errores <= options['max_errores']:
+                        self.stderr.write(f"Fila {numero}: {e}")
+                    continue
+                lote.append(objeto)
+                if len(lote) >= options['lote']:
+                    self._insertar(modelo, lote, viviendas_afectadas)
+                    lote = []
+                    self._progreso(leidas, inicio)
+            if lote:
+                self._insertar(modelo, lote, viviendas_afectadas)
+
+        if modelo is HorarioVisita:
+            # bulk_create no envía señales: recalculamos los huecos de las viviendas tocadas.
+            for vivienda in Vivienda.objects.filter(id__in=viviendas_afectadas):
+                regenerar_huecos_vivienda(vivienda)
+
+        transcurrido = max(time.monotonic() - inicio, 1e-9)
+        insertadas = modelo.objects.count() - total_antes
+        self.stdout.write(self.style.SUCCESS(
+            f"Leídas {leidas} filas en {transcurrido:.2f} s ({leidas / transcurrido:.0f} filas/s): "
+            f"{insertadas} insertadas, {leidas - errores - insertadas} ya existían, {errores} con errores."
+        ))
+        if modelo is ArrendatarioAutorizado and insertadas and not autorizaciones.cache_compartida():
+            self.stderr.write(self.style.WARNING(
+                "La caché no es compartida (LocMemCache): este comando no puede invalidar la caché de autorizaciones "
+                "del servidor web. Los teléfonos nuevos tendrán acceso en como mucho "
+                f"{settings.AUTORIZACIONES_CACHE_VACIAS_SEGUNDOS} s, pero los que ya tenían acceso a otra vivienda no verán "
+                f"las nuevas hasta {settings.AUTORIZACIONES_CACHE_SEGUNDOS} s. Reinicia el servidor o configura una caché "
+                "compartida (CACHE_BACKEND)."
+            ))
+
+    def _leer(self, fichero, formato):
+        """
+        Genera (número de fila, diccionario) sin cargar el fichero completo en memoria.
+        """
+        if formato == 'csv':
+            for numero, fila in enumerate(csv.DictReader(fichero), start=2):
+                yield numero, fila
+            return
+        for numero, linea in enumerate(fichero, start=1):
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                yield numero, json.loads(linea)
+            except json.JSONDecodeError as e:
+                yield numero, {'_error': f"JSON no válido: {e}"}
+
+    def _vivienda_id(self, fila):
+        if '_error' in fila:
+            raise FilaInvalida(fila['_error'])
+        referencia = str(fila.get('referencia_catastral') or '').strip()
+        if referencia:
+            if referencia not in self._viviendas:
+                raise FilaInvalida(f"No existe ninguna vivienda con referencia catastral '{referencia}'.")
+            return self._viviendas[referencia]
+        try:
+            vivienda_id = int(fila.get('vivienda_id') or fila.get('vivienda'))
+        except (TypeError, ValueError):
+            raise FilaInvalida("Falta la vivienda ('vivienda_id' o 'referencia_catastral').")
+        if vivienda_id not in self._ids_viviendas:
+            raise FilaInvalida(f"No existe ninguna vivienda con ID {vivienda_id}.")
+        return vivienda_id
+
+    def _arrendatario(self, fila):
+        vivienda_id = self._vivienda_id(fila)
+        # Mismas reglas que AccesoArrendatarioForm.clean_telefono.
+        telefono = autorizaciones.normalizar_telefono(str(fila.get('telefono') or ''))
+        if not telefono.startswith('+'):
+            raise FilaInvalida("El número de teléfono debe incluir el prefijo internacional (ej. +34).")
+        if len(telefono) > 20:
+            raise FilaInvalida("El número de teléfono es demasiado largo.")
+        return ArrendatarioAutorizado(vivienda_id=vivienda_id, telefono=telefono)
+
+    def _horario(self, fila):
+        vivienda_id = self._vivienda_id(fila)
+        try:
+            fecha = date.fromisoformat(str(fila.get('fecha')).strip())
+            hora_inicio = dtime.fromisoformat(str(fila.get('hora_inicio')).strip())
+            hora_fin = dtime.fromisoformat(str(fila.get('hora_fin')).strip())
+        except ValueError as e:
+            raise FilaInvalida(f"Fecha u hora no válida ({e}). Formatos: AAAA-MM-DD y HH:MM.")
+        if hora_fin <= hora_inicio:
+            raise FilaInvalida("La hora de fin debe ser posterior a la de inicio.")
+        return HorarioVisita(vivienda_id=vivienda_id, fecha=fecha, hora_inicio=hora_inicio, hora_fin=hora_fin)
+
+    def _insertar(self, modelo, lote, viviendas_afectadas):
+        with transaction.atomic():
+            modelo.objects.bulk_create(lote, ignore_conflicts=True)
+            if modelo is ArrendatarioAutorizado:
+                # bulk_create no envía señales: invalidamos la caché de estos teléfonos.
+                autorizaciones.invalidar(*{objeto.telefono for objeto in lote})
+        viviendas_afectadas.update(objeto.vivienda_id for objeto in lote)
+
+    def _progreso(self, leidas, inicio):
+        transcurrido = max(time.monotonic() - inicio, 1e-9)
+        self.stdout.write(f"{leidas} filas procesadas ({leidas / transcurrido:.0f} filas/s)...")
@@ -0,0 +1,90 @@
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from propiedades.notificaciones import EstadisticasEnvio, liberar_bloqueados, procesar_lote
+
+
+class Command(BaseCommand):
+    help = "Envía los correos de la cola de salida usando un conjunto de workers en paralelo."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Número de hilos de envío (por defecto 4).")
+        parser.add_argument('--lote', type=int, default=20, help="Correos que reclama cada worker en cada vuelta (por defecto 20).")
+        parser.add_argument('--intervalo', type=float, default=5.0, help="Segundos de espera cuando la cola está vacía (por defecto 5).")
+        parser.add_argument('--una-vez', action='store_true', help="Vacía la cola una vez y termina, en lugar de quedarse escuchando.")
+        parser.add_argument('--informe-cada', type=float, default=60.0, help="Segundos entre informes de throughput (por defecto 60).")
+
+    def handle(self, *args, **options):
+        estadisticas = EstadisticasEnvio()
+        parar = threading.Event()
+
+        self._liberar()
+
+        def worker():
+            try:
+                while not parar.is_set():
+                    try:
+                        reclamados = procesar_lote(options['lote'], estadisticas)
+                    except Exception:
+                        # Un error inesperado (la base de datos caída, por ejemplo) no debe
+                        # matar el hilo: se registra, se descarta la conexión y se sigue.
+                        # Los correos reclamados vuelven a la cola con `liberar_bloqueados`.
+                        self.stderr.write(f"Error en {threading.current_thread().name}:\n{traceback.format_exc()}")
+                        connection.close()
+                        parar.wait(options['intervalo'])
+                        continue
+                    if reclamados:
+                        continue
+                    if options['una_vez']:
+                        return
+                    parar.wait(options['intervalo'])
+            finally:
+                # Cada hilo tiene su propia conexión a la base de datos.
+                connection.close()
+
+        hilos = [threading.Thread(target=worker, name=f"correos-{i}", daemon=True) for i in range(options['workers'])]
+        for hilo in hilos:
+            hilo.start()
+        self.stdout.write(f"Procesando la cola de correos con {len(hilos)} workers...")
+
+        ultimo_informe = ultima_liberacion = time.monotonic()
+        try:
+            while any(hilo.is_alive() for hilo in hilos):
+                for hilo in hilos:
+                    hilo.join(timeout=1.0)
+                if time.monotonic() - ultimo_informe >= options['informe_cada']:
+                    self._informar(estadisticas)
+                    ultimo_informe = time.monotonic()
+                # Los correos de un worker de otro proceso que haya muerto también vuelven
+                # a la cola sin esperar a que se reinicie este.
+                if time.monotonic() - ultima_liberacion >= settings.CORREO_BLOQUEO_MAX_SEGUNDOS:
+                    try:
+                        self._liberar()
+                    except Exception:
+                        self.stderr.write(f"Error al liberar los correos bloqueados:\n{traceback.format_exc()}")
+                        connection.close()
+                    ultima_liberacion = time.monotonic()
+        except KeyboardInterrupt:
+            self.stdout.write("Deteniendo los workers...")
+            parar.set()
+            for hilo in hilos:
+                hilo.join()
+
+        self._informar(estadisticas)
+
+    def _liberar(self):
+        liberados = liberar_bloqueados()
+        if liberados:
+            self.stdout.write(f"Se han devuelto a la cola {liberados} correos bloqueados por un worker caído.")
+
+    def _informar(self, estadisticas):
+        r = estadisticas.resumen()
+        self.stdout.write(
+            f"Enviados: {r['enviados']} | Reintentos programados: {r['reintentos']} | Fallidos: {r['fallidos']} | "
+            f"Lotes: {r['lotes']} | Conexiones SMTP: {r['conexiones']} | {r['correos_por_segundo']} correos/s en {r['segundos']} s"
+        )
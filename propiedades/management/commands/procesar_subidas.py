@@ -0,0 +1,75 @@
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from propiedades.almacenamiento import almacenamiento_documentos
+from propiedades.subidas import liberar_bloqueadas, limpiar_abandonadas, procesar_pendientes
+
+
+class Command(BaseCommand):
+    help = (
+        "Procesa en segundo plano los documentos subidos por fragmentos: comprueba su tamaño, "
+        "calcula el SHA-256, comprime las imágenes y les quita los metadatos EXIF, los guarda en su "
+        "ubicación definitiva y genera las miniaturas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--intervalo', type=float, default=5.0, help="Segundos de espera cuando no hay subidas (por defecto 5).")
+        parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1,
+                            help="Procesos para comprimir imágenes en paralelo (por defecto, uno por núcleo; 1 = sin procesos auxiliares).")
+        parser.add_argument('--una-vez', action='store_true', help="Procesa las subidas pendientes y termina.")
+
+    def handle(self, *args, **options):
+        ejecutor = ProcessPoolExecutor(options['procesos']) if options['procesos'] > 1 else None
+        self.stdout.write(f"Procesando subidas de documentos con {options['procesos']} procesos...")
+        ultima_limpieza = ultima_liberacion = float('-inf')
+        try:
+            while True:
+                try:
+                    # Las subidas de un worker caído (de este o de otro proceso) vuelven a
+                    # la cola sin esperar a que se reinicie.
+                    if time.monotonic() - ultima_liberacion >= settings.SUBIDA_BLOQUEO_MAX_SEGUNDOS:
+                        liberadas = liberar_bloqueadas()
+                        if liberadas:
+                            self.stdout.write(f"Se han devuelto a la cola {liberadas} subidas bloqueadas por un worker caído.")
+                        ultima_liberacion = time.monotonic()
+
+                    if time.monotonic() - ultima_limpieza >= 3600:
+                        abandonadas = limpiar_abandonadas()
+                        if abandonadas:
+                            self.stdout.write(f"Borradas {abandonadas} subidas abandonadas sin finalizar.")
+                        huerfanos, _ = almacenamiento_documentos().limpiar_contenidos_huerfanos()
+                        if huerfanos:
+                            self.stdout.write(f"Borrados {huerfanos} contenidos de documentos que ya no se usan.")
+                        ultima_limpieza = time.monotonic()
+
+                    procesadas, rechazadas = procesar_pendientes(ejecutor=ejecutor)
+                except Exception as e:
+                    # Un error inesperado (la base de datos caída, por ejemplo) no debe parar
+                    # el worker: se registra, se descarta la conexión y se vuelve a intentar.
+                    self.stderr.write(f"Error al procesar las subidas:\n{traceback.format_exc()}")
+                    connection.close()
+                    if isinstance(e, BrokenProcessPool):
+                        # Un proceso auxiliar ha muerto (falta de memoria, por ejemplo): el
+                        # conjunto ya no admite tareas y hay que crear otro.
+                        ejecutor.shutdown(wait=False)
+                        ejecutor = ProcessPoolExecutor(options['procesos'])
+                    time.sleep(options['intervalo'])
+                    continue
+                if procesadas or rechazadas:
+                    self.stdout.write(f"Subidas procesadas: {procesadas} | rechazadas: {rechazadas}")
+                    continue
+                if options['una_vez']:
+                    return
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write("Deteniendo el procesamiento de subidas...")
+        finally:
+            if ejecutor is not None:
+                ejecutor.shutdown()
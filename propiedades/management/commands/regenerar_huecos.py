@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from propiedades.huecos import regenerar_huecos_vivienda
+from propiedades.models import Vivienda
+
+
+class Command(BaseCommand):
+    help = "Recalcula desde cero la tabla de huecos de visita (HuecoVisita) de las viviendas indicadas o de todas."
+
+    def add_arguments(self, parser):
+        parser.add_argument('vivienda_ids', nargs='*', type=int, help="IDs de las viviendas a recalcular (por defecto, todas).")
+
+    def handle(self, *args, **options):
+        viviendas = Vivienda.objects.all()
+        if options['vivienda_ids']:
+            viviendas = viviendas.filter(id__in=options['vivienda_ids'])
+        total = 0
+        for vivienda in viviendas.iterator():
+            creados = regenerar_huecos_vivienda(vivienda)
+            total += len(creados)
+            self.stdout.write(f"{vivienda.nombre}: {len(creados)} huecos.")
+        self.stdout.write(self.style.SUCCESS(f"Se han generado {total} huecos de visita."))
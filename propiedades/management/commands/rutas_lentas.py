@@ -0,0 +1,67 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from propiedades import metricas
+
+ORDENES = {
+    'p95': lambda fila: fila['p95'],
+    'media': lambda fila: fila['media'],
+    'total': lambda fila: fila['total'],
+    'consultas': lambda fila: fila['consultas'],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Muestra las vistas más lentas según las métricas que han volcado los procesos del servidor "
+        "en METRICAS_DIRECTORIO: peticiones, duración media y p95, consultas y tiempo de base de datos, "
+        "plantillas y correos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10, help="Número de vistas a mostrar (por defecto 10).")
+        parser.add_argument('--orden', choices=list(ORDENES), default='p95',
+                            help="Criterio: p95, media, total (tiempo acumulado) o consultas por petición. Por defecto p95.")
+        parser.add_argument('--limpiar', action='store_true', help="Borra después los volcados (empieza de cero).")
+
+    def handle(self, *args, **options):
+        datos = metricas.instantanea_servidor()
+        filas = []
+        for clave, histogramas in datos.items():
+            peticiones = sum(histogramas['peticion_segundos'][:-1])
+            if not peticiones:
+                continue
+            filas.append({
+                'vista': clave,
+                'peticiones': peticiones,
+                'media': histogramas['peticion_segundos'][-1] / peticiones,
+                'p95': metricas.percentil(histogramas['peticion_segundos'], 'peticion_segundos', 0.95),
+                'total': histogramas['peticion_segundos'][-1],
+                'consultas': histogramas['bd_consultas'][-1] / peticiones,
+                'bd': histogramas['bd_segundos'][-1] / peticiones,
+                'plantillas': histogramas['plantillas_segundos'][-1] / peticiones,
+                'correo': histogramas['correo_segundos'][-1] / peticiones,
+            })
+        if not filas:
+            self.stdout.write(f"No hay métricas en {settings.METRICAS_DIRECTORIO}: ¿está activo MetricasMiddleware?")
+        else:
+            filas.sort(key=ORDENES[options['orden']], reverse=True)
+            self.stdout.write(
+                f"{'Vista':<55} {'Peticiones':>10} {'Media ms':>9} {'p95 ms':>8} {'Total s':>8} "
+                f"{'Consultas':>9} {'BD ms':>7} {'Plant. ms':>9} {'Correo ms':>9}"
+            )
+            for fila in filas[:options['top']]:
+                self.stdout.write(
+                    f"{fila['vista'][:55]:<55} {fila['peticiones']:>10} {fila['media'] * 1000:>9.1f} {fila['p95'] * 1000:>8.0f} "
+                    f"{fila['total']:>8.1f} {fila['consultas']:>9.1f} {fila['bd'] * 1000:>7.1f} {fila['plantillas'] * 1000:>9.1f} "
+                    f"{fila['correo'] * 1000:>9.1f}"
+                )
+            self.stdout.write("p95: límite superior del bucket del histograma en el que cae el percentil 95.")
+
+        if options['limpiar'] and os.path.isdir(settings.METRICAS_DIRECTORIO):
+            for nombre in os.listdir(settings.METRICAS_DIRECTORIO):
+                if nombre.endswith('.json'):
+                    os.remove(os.path.join(settings.METRICAS_DIRECTORIO, nombre))
+            self.stdout.write("Volcados de métricas borrados.")
@@ -0,0 +1,313 @@
+"""
+Métricas de rendimiento por vista.
+
+`MetricasMiddleware` mide cada petición y la acumula, por nombre de URL y método, en
+histogramas en memoria del proceso:
+
+- Duración total de la petición (sin contar el envío de respuestas en streaming).
+- Número de consultas y tiempo de base de datos (`connection.execute_wrapper`).
+- Tiempo de renderizado de las plantillas de páginas (backend `DjangoTemplatesMedidas`).
+- Tiempo dedicado a los correos: renderizarlos y encolarlos (`medir('correo')`).
+
+Cada proceso vuelca sus histogramas cada `METRICAS_VOLCADO_SEGUNDOS` a un fichero JSON de
+`METRICAS_DIRECTORIO`, también cuando no atiende peticiones. Así `/estado/metricas/`
+(formato de texto de Prometheus) y el comando `rutas_lentas` ven los datos de todos los
+procesos del servidor, no solo los del que atiende la petición. Los volcados de procesos
+que ya no existen (o que llevan `VOLCADOS_PERDIDOS` intervalos sin actualizarse) se borran
+al leerlos, para no sumar los datos de servidores anteriores.
+"""
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+# Intervalos de volcado sin actualizar tras los que un volcado se considera de un proceso muerto.
+VOLCADOS_PERDIDOS = 3
+
+# Nombre de la métrica: (límites de los buckets, descripción).
+METRICAS = {
+    'peticion_segundos': (BUCKETS_SEGUNDOS, "Duración de la petición en segundos."),
+    'bd_consultas': (BUCKETS_CONSULTAS, "Consultas a la base de datos por petición."),
+    'bd_segundos': (BUCKETS_SEGUNDOS, "Tiempo de base de datos por petición en segundos."),
+    'plantillas_segundos': (BUCKETS_SEGUNDOS, "Tiempo de renderizado de plantillas por petición en segundos."),
+    'correo_segundos': (BUCKETS_SEGUNDOS, "Tiempo de renderizado y encolado de correos por petición en segundos."),
+}
+
+_medicion_actual = ContextVar('medicion_actual', default=None)
+
+
+class Medicion:
+    """
+    Tiempos acumulados durante una petición.
+    """
+    __slots__ = ('consultas', 'bd', 'plantillas', 'correo', '_abiertas')
+
+    def __init__(self):
+        self.consultas = 0
+        self.bd = self.plantillas = self.correo = 0.0
+        self._abiertas = set()
+
+    def consulta(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas += 1
+            self.bd += time.perf_counter() - inicio
+
+
+@contextmanager
+def medir(campo):
+    """
+    Suma al `campo` ('plantillas' o 'correo') de la petición en curso el tiempo del bloque.
+    Fuera de una petición medida, o dentro de otro bloque del mismo campo, no hace nada.
+    """
+    medicion = _medicion_actual.get()
+    if medicion is None or campo in medicion._abiertas:
+        yield
+        return
+    medicion._abiertas.add(campo)
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(medicion, campo, getattr(medicion, campo) + time.perf_counter() - inicio)
+        medicion._abiertas.discard(campo)
+
+
+class Registro:
+    """
+    Histogramas de un proceso: {'vista metodo': {métrica: [cuentas por bucket..., +Inf, suma]}}.
+    """
+
+    def __init__(self):
+        self._bloqueo = threading.Lock()
+        self._datos = {}
+        self._ultimo_volcado = 0.0
+        self._latido = None
+
+    def registrar(self, vista, metodo, valores):
+        clave = f'{vista} {metodo}'
+        with self._bloqueo:
+            histogramas = self._datos.get(clave)
+            if histogramas is None:
+                histogramas = self._datos[clave] = {nombre: [0] * (len(buckets) + 1) + [0.0] for nombre, (buckets, _) in METRICAS.items()}
+            for nombre, valor in valores.items():
+                histograma = histogramas[nombre]
+                histograma[bisect.bisect_left(METRICAS[nombre][0], valor)] += 1
+                histograma[-1] += valor
+
+    def instantanea(self):
+        with self._bloqueo:
+            return {clave: {nombre: list(valores) for nombre, valores in histogramas.items()} for clave, histogramas in self._datos.items()}
+
+    def volcar_si_toca(self):
+        """
+        Escribe la instantánea del proceso en METRICAS_DIRECTORIO si ha pasado el intervalo.
+        La primera vez arranca además un hilo que la sigue escribiendo aunque el proceso no
+        reciba peticiones, para que su volcado no parezca el de un proceso muerto.
+        """
+        directorio = settings.METRICAS_DIRECTORIO
+        if not directorio:
+            return
+        if self._latido is None:
+            self._latido = threading.Thread(target=self._latir, args=(directorio,), name='metricas-volcado', daemon=True)
+            self._latido.start()
+        ahora = time.monotonic()
+        if ahora - self._ultimo_volcado < settings.METRICAS_VOLCADO_SEGUNDOS:
+            return
+        self._ultimo_volcado = ahora
+        os.makedirs(directorio, exist_ok=True)
+        descriptor, temporal = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+        with os.fdopen(descriptor, 'w') as fichero:
+            json.dump({'pid': os.getpid(), 'actualizado': time.time(), 'datos': self.instantanea()}, fichero)
+        os.replace(temporal, os.path.join(directorio, f'{os.getpid()}.json'))
+
+    def _latir(self, directorio):
+        # Termina si cambia el directorio (override_settings en los comandos bench_*): no
+        # debe escribir los datos de una prueba en el directorio real.
+        while True:
+            time.sleep(settings.METRICAS_VOLCADO_SEGUNDOS)
+            if settings.METRICAS_DIRECTORIO != directorio:
+                break
+            try:
+                self.volcar_si_toca()
+            except OSError as e:
+                print(f"No se pueden volcar las métricas en {directorio}: {e}")
+        self._latido = None
+
+
+registro = Registro()
+
+
+def combinar(instantaneas):
+    """
+    Suma histograma a histograma varias instantáneas de `Registro`.
+    """
+    total = {}
+    for instantanea in instantaneas:
+        for clave, histogramas in instantanea.items():
+            destino = total.setdefault(clave, {})
+            for nombre, valores in histogramas.items():
+                if nombre in destino:
+                    destino[nombre] = [a + b for a, b in zip(destino[nombre], valores)]
+                else:
+                    destino[nombre] = list(valores)
+    return total
+
+
+def _proceso_vivo(pid):
+    if os.name != 'posix':
+        return True  # En Windows os.kill(pid, 0) terminaría el proceso: solo cuenta la antigüedad.
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Existe, pero es de otro usuario.
+    return True
+
+
+def instantanea_servidor():
+    """
+    Histogramas de todos los procesos: los volcados de los demás y los datos en vivo de este.
+    Los volcados de procesos terminados o sin actualizar desde hace VOLCADOS_PERDIDOS
+    intervalos no se suman y se borran.
+    """
+    instantaneas = [registro.instantanea()]
+    directorio = settings.METRICAS_DIRECTORIO
+    if directorio and os.path.isdir(directorio):
+        propio = f'{os.getpid()}.json'
+        limite = time.time() - VOLCADOS_PERDIDOS * settings.METRICAS_VOLCADO_SEGUNDOS
+        for nombre in os.listdir(directorio):
+            if not nombre.endswith('.json') or nombre == propio:
+                continue
+            ruta = os.path.join(directorio, nombre)
+            try:
+                with open(ruta) as fichero:
+                    volcado = json.load(fichero)
+                datos, pid, actualizado = volcado['datos'], volcado['pid'], volcado['actualizado']
+            except (OSError, ValueError, KeyError):
+                continue  # Un volcado a medio escribir o de otra versión.
+            if actualizado < limite or not _proceso_vivo(pid):
+                try:
+                    os.remove(ruta)
+                except OSError:
+                    pass
+                continue
+            instantaneas.append(datos)
+    return combinar(instantaneas)
+
+
+def percentil(histograma, nombre, fraccion):
+    """
+    Límite superior del bucket en el que cae el percentil `fraccion` (p. ej. 0.95).
+    """
+    buckets = METRICAS[nombre][0]
+    cuentas = histograma[:-1]
+    objetivo = fraccion * sum(cuentas)
+    acumulado = 0
+    for indice, cuenta in enumerate(cuentas):
+        acumulado += cuenta
+        if cuenta and acumulado >= objetivo:
+            return buckets[indice] if indice < len(buckets) else float('inf')
+    return 0.0
+
+
+def _etiqueta(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def texto_prometheus(datos, contadores=()):
+    """
+    Histogramas (y contadores: tuplas de nombre, descripción, etiquetas y valor) en el
+    formato de texto de Prometheus.
+    """
+    lineas = []
+    for nombre, (buckets, ayuda) in METRICAS.items():
+        metrica = f'gestion_viviendas_{nombre}'
+        lineas += [f'# HELP {metrica} {ayuda}', f'# TYPE {metrica} histogram']
+        for clave in sorted(datos):
+            vista, metodo = clave.rsplit(' ', 1)
+            etiquetas = f'vista="{_etiqueta(vista)}",metodo="{_etiqueta(metodo)}"'
+            histograma = datos[clave][nombre]
+            acumulado = 0
+            for limite, cuenta in zip((*buckets, '+Inf'), histograma[:-1]):
+                acumulado += cuenta
+                lineas.append(f'{metrica}_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+            lineas.append(f'{metrica}_sum{{{etiquetas}}} {histograma[-1]}')
+            lineas.append(f'{metrica}_count{{{etiquetas}}} {acumulado}')
+    vistos = set()
+    for nombre, ayuda, etiquetas, valor in contadores:
+        metrica = f'gestion_viviendas_{nombre}'
+        if metrica not in vistos:
+            vistos.add(metrica)
+            lineas += [f'# HELP {metrica} {ayuda}', f'# TYPE {metrica} counter']
+        texto = ','.join(f'{clave}="{_etiqueta(v)}"' for clave, v in etiquetas.items())
+        lineas.append(f'{metrica}{{{texto}}} {valor}')
+    return '\n'.join(lineas) + '\n'
+
+
+# Métodos HTTP que se registran por su nombre; los demás (cualquier cadena que envíe un
+# cliente) se agrupan en OTHER para no crear una serie de métricas por cada uno.
+METODOS_HTTP = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'})
+
+
+class MetricasMiddleware:
+    """
+    Debe ir la primera de MIDDLEWARE para contar también las consultas de las demás
+    (sesiones, autenticación).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medicion = Medicion()
+        token = _medicion_actual.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            with ExitStack() as envolturas:
+                for conexion in connections.all():
+                    envolturas.enter_context(conexion.execute_wrapper(medicion.consulta))
+                respuesta = self.get_response(request)
+        finally:
+            _medicion_actual.reset(token)
+        duracion = time.perf_counter() - inicio
+
+        coincidencia = getattr(request, 'resolver_match', None)
+        metodo = request.method if request.method in METODOS_HTTP else 'OTHER'
+        registro.registrar(coincidencia.view_name if coincidencia else 'sin_ruta', metodo, {
+            'peticion_segundos': duracion,
+            'bd_consultas': medicion.consultas,
+            'bd_segundos': medicion.bd,
+            'plantillas_segundos': medicion.plantillas,
+            'correo_segundos': medicion.correo,
+        })
+        registro.volcar_si_toca()
+        return respuesta
+
+
+class _PlantillaMedida(Template):
+    def render(self, context=None, request=None):
+        with medir('plantillas'):
+            return super().render(context, request)
+
+
+class DjangoTemplatesMedidas(DjangoTemplates):
+    """
+    Backend de plantillas de Django que suma el tiempo de renderizado a la petición en curso.
+    """
+
+    def get_template(self, template_name):
+        return _PlantillaMedida(super().get_template(template_name).template, self)
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:47
+
+import django.db.models.deletion
+from datetime import datetime, timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def poblar_huecos(apps, schema_editor):
+    """
+    Genera los huecos de los horarios futuros ya existentes. Usa los modelos históricos,
+    por eso no reutiliza el código de propiedades/huecos.py.
+    """
+    HorarioVisita = apps.get_model('propiedades', 'HorarioVisita')
+    HuecoVisita = apps.get_model('propiedades', 'HuecoVisita')
+    Visita = apps.get_model('propiedades', 'Visita')
+
+    hoy = timezone.localdate()
+    ocupadas = set(Visita.objects.filter(estado='CONFIRMADA').values_list('vivienda_id', 'fecha_hora'))
+    huecos = []
+    for horario in HorarioVisita.objects.filter(fecha__gte=hoy).select_related('vivienda'):
+        duracion = timedelta(minutes=horario.vivienda.duracion_visita_minutos)
+        hora_actual = timezone.make_aware(datetime.combine(horario.fecha, horario.hora_inicio))
+        hora_fin = timezone.make_aware(datetime.combine(horario.fecha, horario.hora_fin))
+        while hora_actual + duracion <= hora_fin:
+            huecos.append(HuecoVisita(
+                vivienda_id=horario.vivienda_id, horario_id=horario.id, fecha_hora=hora_actual,
+                ocupado=(horario.vivienda_id, hora_actual) in ocupadas,
+            ))
+            hora_actual += duracion
+    HuecoVisita.objects.bulk_create(huecos, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('propiedades', '0005_correopendiente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HuecoVisita',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_hora', models.DateTimeField()),
+                ('ocupado', models.BooleanField(default=False, help_text='Hay una visita confirmada en este hueco.')),
+                ('horario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='huecos', to='propiedades.horariovisita')),
+                ('vivienda', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='huecos', to='propiedades.vivienda')),
+            ],
+            options={
+                'verbose_name': 'Hueco de visita',
+                'verbose_name_plural': 'Huecos de visita',
+                'ordering': ['fecha_hora'],
+                'indexes': [models.Index(fields=['vivienda', 'ocupado', 'fecha_hora'], name='hueco_disponible_idx'), models.Index(fields=['vivienda', 'fecha_hora'], name='hueco_vivienda_fecha_idx')],
+                'unique_together': {('horario', 'fecha_hora')},
+            },
+        ),
+        migrations.RunPython(poblar_huecos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('propiedades', '0006_huecovisita'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='visita',
+            index=models.Index(fields=['vivienda', 'estado', 'fecha_hora'], name='visita_viv_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visita',
+            index=models.Index(fields=['telefono', 'estado', 'fecha_hora'], name='visita_tel_estado_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:51
+
+import re
+
+from django.db import migrations, models
+
+
+def normalizar_telefonos(apps, schema_editor):
+    """
+    Normaliza los teléfonos ya guardados igual que el formulario de acceso. Si al
+    normalizar queda un duplicado para la misma vivienda, se conserva solo uno.
+    """
+    ArrendatarioAutorizado = apps.get_model('propiedades', 'ArrendatarioAutorizado')
+    vistos = set(
+        ArrendatarioAutorizado.objects.filter(telefono__regex=r'^[0-9+]*$').values_list('vivienda_id', 'telefono')
+    )
+    for autorizacion in ArrendatarioAutorizado.objects.exclude(telefono__regex=r'^[0-9+]*$'):
+        telefono = re.sub(r'[^\d+]', '', autorizacion.telefono)
+        if (autorizacion.vivienda_id, telefono) in vistos:
+            autorizacion.delete()
+            continue
+        vistos.add((autorizacion.vivienda_id, telefono))
+        autorizacion.telefono = telefono
+        autorizacion.save(update_fields=['telefono'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('propiedades', '0007_indices_visita'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='arrendatarioautorizado',
+            name='telefono',
+            field=models.CharField(db_index=True, help_text='Número de teléfono completo con prefijo internacional (ej. +34666666666)', max_length=20),
+        ),
+        migrations.RunPython(normalizar_telefonos, migrations.RunPython.noop),
+    ]
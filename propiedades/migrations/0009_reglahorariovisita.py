@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('propiedades', '0008_telefono_autorizado_normalizado'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='huecovisita',
+            name='horario',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='huecos', to='propiedades.horariovisita'),
+        ),
+        migrations.CreateModel(
+            name='ReglaHorarioVisita',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dias_semana', models.CharField(help_text='Días de la semana separados por comas: 0=lunes, 1=martes... 6=domingo (ej. 1,3).', max_length=20)),
+                ('hora_inicio', models.TimeField()),
+                ('hora_fin', models.TimeField()),
+                ('fecha_inicio', models.DateField(help_text='Primer día en que se aplica la regla.')),
+                ('fecha_fin', models.DateField(blank=True, help_text='Último día en que se aplica la regla. Vacío: sin fecha de fin.', null=True)),
+                ('fechas_excluidas', models.TextField(blank=True, help_text='Fechas sin visitas (festivos, vacaciones...), en formato AAAA-MM-DD separadas por comas.')),
+                ('vivienda', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reglas_horario', to='propiedades.vivienda')),
+            ],
+            options={
+                'verbose_name': 'Horario de visita recurrente',
+                'verbose_name_plural': 'Horarios de visita recurrentes',
+                'ordering': ['fecha_inicio', 'hora_inicio'],
+            },
+        ),
+        migrations.AddField(
+            model_name='huecovisita',
+            name='regla',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='huecos', to='propiedades.reglahorariovisita'),
+        ),
+        migrations.AddConstraint(
+            model_name='huecovisita',
+            constraint=models.UniqueConstraint(fields=('regla', 'fecha_hora'), name='hueco_regla_fecha_unico'),
+        ),
+    ]
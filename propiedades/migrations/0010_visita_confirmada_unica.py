@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('propiedades', '0009_reglahorariovisita'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='visita',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='visita',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado', 'CONFIRMADA')), fields=('vivienda', 'fecha_hora'), name='visita_confirmada_unica'),
+        ),
+    ]
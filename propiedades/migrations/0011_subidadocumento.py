@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:00
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('propiedades', '0010_visita_confirmada_unica'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubidaDocumento',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('campo', models.CharField(choices=[('dni_anverso', 'DNI / NIE (Cara anverso)'), ('dni_reverso', 'DNI / NIE (Cara reverso)'), ('contrato_trabajo', 'Contrato de trabajo'), ('ultima_nomina', 'Última nómina'), ('penultima_nomina', 'Penúltima nómina'), ('antepenultima_nomina', 'Antepenúltima nómina'), ('renta_anual', 'Última declaración de la renta')], max_length=30)),
+                ('nombre_original', models.CharField(max_length=255)),
+                ('tamano', models.PositiveBigIntegerField(help_text='Tamaño declarado por el navegador, en bytes.')),
+                ('recibidos', models.PositiveBigIntegerField(default=0)),
+                ('estado', models.CharField(choices=[('SUBIENDO', 'Subiendo'), ('RECIBIDA', 'Recibida, pendiente de procesar'), ('PROCESANDO', 'Procesando'), ('PROCESADA', 'Procesada'), ('RECHAZADA', 'Rechazada')], default='SUBIENDO', max_length=20)),
+                ('fichero', models.FileField(blank=True, max_length=255, upload_to='')),
+                ('sha256', models.CharField(blank=True, max_length=64)),
+                ('miniatura', models.FileField(blank=True, max_length=255, upload_to='documentacion/miniaturas/')),
+                ('error', models.TextField(blank=True)),
+                ('bloqueado_en', models.DateTimeField(blank=True, null=True)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+                ('inquilino', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='subidas', to='propiedades.inquilinodocumentacion')),
+                ('solicitud', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subidas', to='propiedades.solicituddedocumentacion')),
+            ],
+            options={
+                'verbose_name': 'Subida de documento',
+                'verbose_name_plural': 'Subidas de documentos',
+                'indexes': [models.Index(fields=['estado', 'actualizado_en'], name='subida_estado_idx')],
+            },
+        ),
+    ]
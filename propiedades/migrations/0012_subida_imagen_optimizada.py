@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('propiedades', '0011_subidadocumento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subidadocumento',
+            name='original',
+            field=models.FileField(blank=True, help_text='Imagen original sin comprimir (solo si IMAGEN_CONSERVAR_ORIGINAL está activo).', max_length=255, upload_to='documentacion/originales/'),
+        ),
+        migrations.AddField(
+            model_name='subidadocumento',
+            name='tamano_final',
+            field=models.PositiveBigIntegerField(blank=True, help_text='Tamaño del documento guardado, en bytes.', null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('propiedades', '0012_subida_imagen_optimizada'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subidadocumento',
+            name='intentos',
+            field=models.PositiveIntegerField(default=0, help_text='Veces que un worker ha reclamado la subida para procesarla.'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:37
+
+import propiedades.almacenamiento
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('propiedades', '0013_subida_intentos'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='inquilinodocumentacion',
+            name='antepenultima_nomina',
+            field=models.FileField(blank=True, null=True, storage=propiedades.almacenamiento.almacenamiento_documentos, upload_to='documentacion/nominas/'),
+        ),
+        migrations.AlterField(
+            model_name='inquilinodocumentacion',
+            name='contrato_trabajo',
+            field=models.FileField(blank=True, null=True, storage=propiedades.almacenamiento.almacenamiento_documentos, upload_to='documentacion/contrato_trabajo/'),
+        ),
+        migrations.AlterField(
+            model_name='inquilinodocumentacion',
+            name='dni_anverso',
+            field=models.FileField(storage=propiedades.almacenamiento.almacenamiento_documentos, upload_to='documentacion/dni_anverso/'),
+        ),
+        migrations.AlterField(
+            model_name='inquilinodocumentacion',
+            name='dni_reverso',
+            field=models.FileField(storage=propiedades.almacenamiento.almacenamiento_documentos, upload_to='documentacion/dni_reverso/'),
+        ),
+        migrations.AlterField(
+            model_name='inquilinodocumentacion',
+            name='penultima_nomina',
+            field=models.FileField(blank=True, null=True, storage=propiedades.almacenamiento.almacenamiento_documentos, upload_to='documentacion/nominas/'),
+        ),
+        migrations.AlterField(
+            model_name='inquilinodocumentacion',
+            name='renta_anual',
+            field=models.FileField(blank=True, help_text='Para autónomos', null=True, storage=propiedades.almacenamiento.almacenamiento_documentos, upload_to='documentacion/renta/'),
+        ),
+        migrations.AlterField(
+            model_name='inquilinodocumentacion',
+            name='ultima_nomina',
+            field=models.FileField(blank=True, null=True, storage=propiedades.almacenamiento.almacenamiento_documentos, upload_to='documentacion/nominas/'),
+        ),
+        migrations.AlterField(
+            model_name='subidadocumento',
+            name='fichero',
+            field=models.FileField(blank=True, max_length=255, storage=propiedades.almacenamiento.almacenamiento_documentos, upload_to=''),
+        ),
+        migrations.AlterField(
+            model_name='subidadocumento',
+            name='miniatura',
+            field=models.FileField(blank=True, max_length=255, storage=propiedades.almacenamiento.almacenamiento_documentos, upload_to='documentacion/miniaturas/'),
+        ),
+        migrations.AlterField(
+            model_name='subidadocumento',
+            name='original',
+            field=models.FileField(blank=True, help_text='Imagen original sin comprimir (solo si IMAGEN_CONSERVAR_ORIGINAL está activo).', max_length=255, storage=propiedades.almacenamiento.almacenamiento_documentos, upload_to='documentacion/originales/'),
+        ),
+    ]
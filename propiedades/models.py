@@ -1,9 +1,11 @@
 import uuid
+from datetime import date, timedelta
+from django.core.exceptions import ValidationError
 from django.db import models
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
 from django.conf import settings
-from django.urls import reverse
+from django.utils import timezone
+
+from .almacenamiento import almacenamiento_documentos
 
 class Administrador(models.Model):
     """
@@ -59,13 +61,110 @@ class HorarioVisita(models.Model):
     def __str__(self):
         return f"{self.vivienda.nombre} - {self.fecha.strftime('%d/%m/%Y')} de {self.hora_inicio.strftime('%H:%M')} a {self.hora_fin.strftime('%H:%M')}"
 
+class ReglaHorarioVisita(models.Model):
+    """
+    Horario de visita recurrente de una vivienda (por ejemplo, "martes y jueves de 17:00
+    a 19:00"). No se guarda una fila por fecha: las franjas se generan bajo demanda con
+    `franjas()` solo para el periodo que se consulta.
+    """
+    DIAS_SEMANA = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+
+    vivienda = models.ForeignKey(Vivienda, related_name='reglas_horario', on_delete=models.CASCADE)
+    dias_semana = models.CharField(max_length=20, help_text="Días de la semana separados por comas: 0=lunes, 1=martes... 6=domingo (ej. 1,3).")
+    hora_inicio = models.TimeField()
+    hora_fin = models.TimeField()
+    fecha_inicio = models.DateField(help_text="Primer día en que se aplica la regla.")
+    fecha_fin = models.DateField(blank=True, null=True, help_text="Último día en que se aplica la regla. Vacío: sin fecha de fin.")
+    fechas_excluidas = models.TextField(blank=True, help_text="Fechas sin visitas (festivos, vacaciones...), en formato AAAA-MM-DD separadas por comas.")
+
+    class Meta:
+        ordering = ['fecha_inicio', 'hora_inicio']
+        verbose_name = "Horario de visita recurrente"
+        verbose_name_plural = "Horarios de visita recurrentes"
+
+    def __str__(self):
+        dias = ', '.join(self.DIAS_SEMANA[dia] for dia in sorted(self.get_dias_semana()))
+        return f"{self.vivienda.nombre} - {dias} de {self.hora_inicio.strftime('%H:%M')} a {self.hora_fin.strftime('%H:%M')}"
+
+    def get_dias_semana(self):
+        return {int(dia) for dia in self.dias_semana.replace(' ', '').split(',') if dia}
+
+    def get_fechas_excluidas(self):
+        return {date.fromisoformat(fecha) for fecha in self.fechas_excluidas.replace('\n', ',').replace(' ', '').split(',') if fecha}
+
+    def clean(self):
+        errores = {}
+        try:
+            dias = self.get_dias_semana()
+            if not dias or not dias <= set(range(7)):
+                raise ValueError
+        except ValueError:
+            errores['dias_semana'] = "Indica uno o más días entre 0 (lunes) y 6 (domingo), separados por comas."
+        try:
+            self.get_fechas_excluidas()
+        except ValueError:
+            errores['fechas_excluidas'] = "Las fechas deben tener el formato AAAA-MM-DD."
+        if self.hora_inicio and self.hora_fin and self.hora_fin <= self.hora_inicio:
+            errores['hora_fin'] = "La hora de fin debe ser posterior a la de inicio."
+        if self.fecha_inicio and self.fecha_fin and self.fecha_fin < self.fecha_inicio:
+            errores['fecha_fin'] = "La fecha de fin no puede ser anterior a la de inicio."
+        if errores:
+            raise ValidationError(errores)
+
+    def franjas(self, desde, hasta):
+        """
+        Genera, en orden, las franjas (fecha, hora_inicio, hora_fin) de la regla entre
+        `desde` y `hasta` (ambas incluidas), sin materializar nada fuera de ese rango.
+        """
+        dias = self.get_dias_semana()
+        excluidas = self.get_fechas_excluidas()
+        fecha = max(desde, self.fecha_inicio)
+        ultima = min(hasta, self.fecha_fin) if self.fecha_fin else hasta
+        while fecha <= ultima:
+            if fecha.weekday() in dias and fecha not in excluidas:
+                yield fecha, self.hora_inicio, self.hora_fin
+            fecha += timedelta(days=1)
+
+
+class HuecoVisita(models.Model):
+    """
+    Hueco de visita precalculado a partir de un HorarioVisita o de una ReglaHorarioVisita
+    y de la duración de visita de la vivienda. Se mantiene actualizado mediante señales
+    (ver `propiedades/signals.py`), de modo que consultar la disponibilidad es una única
+    consulta indexada.
+    """
+    vivienda = models.ForeignKey(Vivienda, related_name='huecos', on_delete=models.CASCADE)
+    # Origen del hueco: un horario puntual o una regla recurrente.
+    horario = models.ForeignKey(HorarioVisita, related_name='huecos', on_delete=models.CASCADE, blank=True, null=True)
+    regla = models.ForeignKey(ReglaHorarioVisita, related_name='huecos', on_delete=models.CASCADE, blank=True, null=True)
+    fecha_hora = models.DateTimeField()
+    ocupado = models.BooleanField(default=False, help_text="Hay una visita confirmada en este hueco.")
+
+    class Meta:
+        unique_together = ('horario', 'fecha_hora')
+        constraints = [
+            models.UniqueConstraint(fields=['regla', 'fecha_hora'], name='hueco_regla_fecha_unico'),
+        ]
+        ordering = ['fecha_hora']
+        indexes = [
+            # La consulta de disponibilidad: huecos libres de una vivienda a partir de ahora.
+            models.Index(fields=['vivienda', 'ocupado', 'fecha_hora'], name='hueco_disponible_idx'),
+            models.Index(fields=['vivienda', 'fecha_hora'], name='hueco_vivienda_fecha_idx'),
+        ]
+        verbose_name = "Hueco de visita"
+        verbose_name_plural = "Huecos de visita"
+
+    def __str__(self):
+        return f"{self.vivienda.nombre} - {timezone.localtime(self.fecha_hora).strftime('%d/%m/%Y %H:%M')}"
+
 class ArrendatarioAutorizado(models.Model):
     """
     Representa a un arrendatario cuyo teléfono ha sido autorizado por un administrador
     para solicitar una visita a una vivienda específica.
     """
     vivienda = models.ForeignKey(Vivienda, related_name='arrendatarios_autorizados', on_delete=models.CASCADE)
-    telefono = models.CharField(max_length=20, help_text="Número de teléfono completo con prefijo internacional (ej. +34666666666)")
+    # Se guarda normalizado (ver save) e indexado: el acceso del arrendatario busca solo por teléfono.
+    telefono = models.CharField(max_length=20, db_index=True, help_text="Número de teléfono completo con prefijo internacional (ej. +34666666666)")
 
     class Meta:
         # Evita que el mismo número de teléfono se añada varias veces a la misma vivienda.
@@ -76,6 +175,13 @@ class ArrendatarioAutorizado(models.Model):
     def __str__(self):
         return f"{self.telefono} autorizado para {self.vivienda.nombre}"
 
+    def save(self, *args, **kwargs):
+        # Normalizamos igual que el formulario de acceso para que la búsqueda exacta funcione
+        # aunque el administrador escriba espacios o guiones.
+        from .autorizaciones import normalizar_telefono
+        self.telefono = normalizar_telefono(self.telefono)
+        super().save(*args, **kwargs)
+
 class Visita(models.Model):
     """
     Almacena la información de una solicitud de visita de un arrendatario.
@@ -116,9 +222,20 @@ class Visita(models.Model):
     actualizado_en = models.DateTimeField(auto_now=True)
 
     class Meta:
-        # Evita que se agende más de una visita para la misma vivienda a la misma hora.
-        unique_together = ('vivienda', 'fecha_hora')
+        constraints = [
+            # Evita que se agende más de una visita confirmada para la misma vivienda a la misma hora.
+            # Las canceladas no cuentan, así que un hueco cancelado puede volver a reservarse.
+            models.UniqueConstraint(
+                fields=['vivienda', 'fecha_hora'], condition=models.Q(estado='CONFIRMADA'), name='visita_confirmada_unica',
+            ),
+        ]
         ordering = ['fecha_hora']
+        indexes = [
+            # Visitas confirmadas de una vivienda en un rango de fechas (cálculo de huecos).
+            models.Index(fields=['vivienda', 'estado', 'fecha_hora'], name='visita_viv_estado_fecha_idx'),
+            # Visitas activas de un teléfono (seleccionar_vivienda_view), ya ordenadas por fecha.
+            models.Index(fields=['telefono', 'estado', 'fecha_hora'], name='visita_tel_estado_fecha_idx'),
+        ]
         verbose_name = "Visita"
         verbose_name_plural = "Visitas"
 
@@ -150,33 +267,6 @@ class SolicitudDeDocumentacion(models.Model):
         verbose_name = "Solicitud de documentación"
         verbose_name_plural = "Solicitudes de documentación"
 
-    def save(self, *args, **kwargs):
-        # Guardamos el objeto solo si es la primera vez para obtener un ID.
-        is_new = self.pk is None
-        super().save(*args, **kwargs)
-
-        # Si es un objeto nuevo y está pendiente, enviamos el email.
-        if is_new and self.estado == 'PENDIENTE':
-            visita = self.visita
-            asunto = f"Siguientes pasos para el alquiler de {visita.vivienda.nombre}"
-            # NOTA: No podemos usar request.build_absolute_uri aquí.
-            # Necesitaremos construir la URL base de otra manera en un futuro para producción.
-            # Por ahora, para desarrollo, funcionará asumiendo http://127.0.0.1:8000
-            enlace_subida = f"http://127.0.0.1:8000{reverse('propiedades:subir_documentos', args=[self.token_acceso])}"
-
-            contexto_email = {'visita': visita, 'enlace_subida': enlace_subida, 'aseguradora': visita.vivienda.nombre_aseguradora_impagos}
-
-            cuerpo_mensaje = render_to_string('propiedades/emails/instrucciones_documentacion.txt', contexto_email)
-            html_cuerpo_mensaje = render_to_string('propiedades/emails/instrucciones_documentacion.html', contexto_email)
-
-            try:
-                msg = EmailMultiAlternatives(asunto, cuerpo_mensaje, settings.DEFAULT_FROM_EMAIL, [visita.email])
-                msg.attach_alternative(html_cuerpo_mensaje, "text/html")
-                msg.send()
-                print(f"Correo de solicitud de documentación enviado a {visita.email} (desde el modelo).")
-            except Exception as e:
-                print(f"ERROR al enviar correo de solicitud de documentación: {e}")
-
 
 class InquilinoDocumentacion(models.Model):
     """
@@ -190,14 +280,118 @@ class InquilinoDocumentacion(models.Model):
     dni_nif_nie = models.CharField(max_length=20)
 
     # Documentos
-    dni_anverso = models.FileField(upload_to='documentacion/dni_anverso/')
-    dni_reverso = models.FileField(upload_to='documentacion/dni_reverso/')
-    contrato_trabajo = models.FileField(upload_to='documentacion/contrato_trabajo/', blank=True, null=True)
-    ultima_nomina = models.FileField(upload_to='documentacion/nominas/', blank=True, null=True)
-    penultima_nomina = models.FileField(upload_to='documentacion/nominas/', blank=True, null=True)
-    antepenultima_nomina = models.FileField(upload_to='documentacion/nominas/', blank=True, null=True)
-    renta_anual = models.FileField(upload_to='documentacion/renta/', blank=True, null=True, help_text="Para autónomos")
+    dni_anverso = models.FileField(upload_to='documentacion/dni_anverso/', storage=almacenamiento_documentos)
+    dni_reverso = models.FileField(upload_to='documentacion/dni_reverso/', storage=almacenamiento_documentos)
+    contrato_trabajo = models.FileField(upload_to='documentacion/contrato_trabajo/', storage=almacenamiento_documentos, blank=True, null=True)
+    ultima_nomina = models.FileField(upload_to='documentacion/nominas/', storage=almacenamiento_documentos, blank=True, null=True)
+    penultima_nomina = models.FileField(upload_to='documentacion/nominas/', storage=almacenamiento_documentos, blank=True, null=True)
+    antepenultima_nomina = models.FileField(upload_to='documentacion/nominas/', storage=almacenamiento_documentos, blank=True, null=True)
+    renta_anual = models.FileField(upload_to='documentacion/renta/', storage=almacenamiento_documentos, blank=True, null=True, help_text="Para autónomos")
     iban = models.CharField(max_length=34)
 
     def __str__(self):
         return f"Documentación de {self.nombre_completo} para solicitud {self.solicitud.id}"
+
+
+class SubidaDocumento(models.Model):
+    """
+    Subida reanudable, por fragmentos, de un documento de inquilino. Los fragmentos se
+    escriben directamente en un fichero parcial de MEDIA_ROOT; al finalizar, el comando
+    `procesar_subidas` calcula el hash, comprueba el tamaño, genera la miniatura y
+    asigna el fichero al campo correspondiente de InquilinoDocumentacion.
+    """
+    ESTADO_CHOICES = [
+        ('SUBIENDO', 'Subiendo'),
+        ('RECIBIDA', 'Recibida, pendiente de procesar'),
+        ('PROCESANDO', 'Procesando'),
+        ('PROCESADA', 'Procesada'),
+        ('RECHAZADA', 'Rechazada'),
+    ]
+    # Campos de InquilinoDocumentacion que admiten subidas por fragmentos.
+    CAMPO_CHOICES = [
+        ('dni_anverso', 'DNI / NIE (Cara anverso)'),
+        ('dni_reverso', 'DNI / NIE (Cara reverso)'),
+        ('contrato_trabajo', 'Contrato de trabajo'),
+        ('ultima_nomina', 'Última nómina'),
+        ('penultima_nomina', 'Penúltima nómina'),
+        ('antepenultima_nomina', 'Antepenúltima nómina'),
+        ('renta_anual', 'Última declaración de la renta'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    solicitud = models.ForeignKey(SolicitudDeDocumentacion, on_delete=models.CASCADE, related_name="subidas")
+    inquilino = models.ForeignKey(InquilinoDocumentacion, on_delete=models.SET_NULL, null=True, blank=True, related_name="subidas")
+    campo = models.CharField(max_length=30, choices=CAMPO_CHOICES)
+    nombre_original = models.CharField(max_length=255)
+    tamano = models.PositiveBigIntegerField(help_text="Tamaño declarado por el navegador, en bytes.")
+    recibidos = models.PositiveBigIntegerField(default=0)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='SUBIENDO')
+
+    # Resultado del procesamiento
+    fichero = models.FileField(max_length=255, blank=True, storage=almacenamiento_documentos)
+    sha256 = models.CharField(max_length=64, blank=True)
+    miniatura = models.FileField(upload_to='documentacion/miniaturas/', max_length=255, blank=True, storage=almacenamiento_documentos)
+    original = models.FileField(upload_to='documentacion/originales/', max_length=255, blank=True, storage=almacenamiento_documentos,
+                                help_text="Imagen original sin comprimir (solo si IMAGEN_CONSERVAR_ORIGINAL está activo).")
+    tamano_final = models.PositiveBigIntegerField(null=True, blank=True, help_text="Tamaño del documento guardado, en bytes.")
+    error = models.TextField(blank=True)
+    intentos = models.PositiveIntegerField(default=0, help_text="Veces que un worker ha reclamado la subida para procesarla.")
+
+    bloqueado_en = models.DateTimeField(null=True, blank=True)
+    creado_en = models.DateTimeField(auto_now_add=True)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Subida de documento"
+        verbose_name_plural = "Subidas de documentos"
+        indexes = [
+            models.Index(fields=['estado', 'actualizado_en'], name='subida_estado_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_campo_display()}: {self.nombre_original} ({self.get_estado_display()})"
+
+
+class CorreoPendiente(models.Model):
+    """
+    Cola de salida (outbox) de correos electrónicos. Las vistas solo encolan una fila
+    y el comando `procesar_correos` se encarga del envío real, con reintentos.
+    """
+    ESTADO_CHOICES = [
+        ('PENDIENTE', 'Pendiente de envío'),
+        ('ENVIANDO', 'Enviando'),
+        ('ENVIADO', 'Enviado'),
+        ('FALLIDO', 'Fallido (sin más reintentos)'),
+    ]
+
+    # Contenido del mensaje
+    asunto = models.CharField(max_length=255)
+    cuerpo = models.TextField()
+    cuerpo_html = models.TextField(blank=True)
+    remitente = models.CharField(max_length=255)
+    destinatarios = models.JSONField(default=list)
+
+    # Control de la cola
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='PENDIENTE')
+    intentos = models.PositiveIntegerField(default=0)
+    proximo_intento = models.DateTimeField(default=timezone.now)
+    lote = models.UUIDField(blank=True, null=True, editable=False, help_text="Identificador del worker que ha reclamado el correo.")
+    bloqueado_en = models.DateTimeField(blank=True, null=True)
+    ultimo_error = models.TextField(blank=True)
+
+    # Metadatos
+    creado_en = models.DateTimeField(auto_now_add=True)
+    enviado_en = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['creado_en']
+        indexes = [
+            # La consulta del worker: correos pendientes cuyo próximo intento ya ha llegado.
+            models.Index(fields=['estado', 'proximo_intento'], name='correo_estado_proximo_idx'),
+            models.Index(fields=['lote'], name='correo_lote_idx'),
+        ]
+        verbose_name = "Correo pendiente"
+        verbose_name_plural = "Correos pendientes"
+
+    def __str__(self):
+        return f"{self.asunto} -> {', '.join(self.destinatarios)} ({self.get_estado_display()})"
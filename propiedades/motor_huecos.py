@@ -0,0 +1,88 @@
+"""
+Motor de generación de huecos de visita por lotes.
+
+Todas las fechas se manejan como minutos enteros desde la época Unix (UTC). Cada franja
+de un HorarioVisita se convierte a minutos una sola vez, en sus dos extremos, y los
+huecos se obtienen con `range()` en un `array('q')`, sin crear un datetime por hueco.
+`huecos.py` guarda el resultado en HuecoVisita y solo se formatean como texto los
+huecos que finalmente se muestran.
+
+Como los extremos de la franja se resuelven con la zona horaria local y los huecos
+avanzan en minutos reales, los cambios de hora de Europe/Madrid no generan huecos en
+horas inexistentes (último domingo de marzo) ni pierden la hora repetida (último
+domingo de octubre).
+"""
+from array import array
+from datetime import date, datetime, time, timezone as dt_timezone
+
+from django.utils import timezone
+
+_ORDINAL_EPOCA = date(1970, 1, 1).toordinal()
+
+
+def minuto_local(fecha, hora, zona=None):
+    """
+    Minutos desde la época de una fecha y hora de pared en la zona horaria local.
+    """
+    zona = zona or timezone.get_current_timezone()
+    return int(datetime.combine(fecha, hora, tzinfo=zona).timestamp()) // 60
+
+
+class ConversorMinutos:
+    """
+    Versión con caché de `minuto_local` para convertir muchas franjas seguidas.
+
+    Calcula una vez por día el minuto de época de su medianoche. Si ese día no hay cambio
+    de hora, cada conversión es solo una suma de enteros; los dos días al año con cambio
+    de hora se resuelven con la zona horaria, hora a hora.
+    """
+    def __init__(self, zona=None):
+        self.zona = zona or timezone.get_current_timezone()
+        self._medianoches = {}
+
+    def __call__(self, fecha, hora):
+        try:
+            medianoche = self._medianoches[fecha]
+        except KeyError:
+            desfase_inicio = self.zona.utcoffset(datetime.combine(fecha, time.min))
+            desfase_fin = self.zona.utcoffset(datetime.combine(fecha, time.max))
+            medianoche = None
+            if desfase_inicio == desfase_fin:
+                medianoche = (fecha.toordinal() - _ORDINAL_EPOCA) * 1440 - int(desfase_inicio.total_seconds()) // 60
+            self._medianoches[fecha] = medianoche
+        if medianoche is None:
+            return minuto_local(fecha, hora, self.zona)
+        return medianoche + hora.hour * 60 + hora.minute
+
+
+def datetime_desde_minuto(minuto, zona=dt_timezone.utc):
+    return datetime.fromtimestamp(minuto * 60, tz=zona)
+
+
+def expandir_franjas(franjas, duracion):
+    """
+    Expande franjas `(inicio, fin)` en minutos de época en los inicios de los huecos de
+    `duracion` minutos que caben en ellas. Devuelve un array ordenado y sin duplicados.
+    """
+    huecos = array('q')
+    ordenado = True
+    ultimo = None
+    for inicio, fin in franjas:
+        if ultimo is not None and inicio <= ultimo:
+            ordenado = False
+        tramo = range(inicio, fin - duracion + 1, duracion)
+        if tramo:
+            huecos.extend(tramo)
+            ultimo = tramo[-1]
+    if not ordenado:
+        # Franjas desordenadas o solapadas: caso poco habitual, ordenamos y deduplicamos.
+        huecos = array('q', sorted(set(huecos)))
+    return huecos
+
+
+def formatear_hueco(fecha_hora, zona=None):
+    """
+    Convierte un hueco en el par (valor, texto) que usa el formulario de visita.
+    """
+    hora_local = timezone.localtime(fecha_hora, zona)
+    return hora_local.isoformat(), hora_local.strftime('%d de %B de %Y a las %H:%M')
@@ -0,0 +1,302 @@
+"""
+Cola de salida de correos electrónicos.
+
+Las vistas y los modelos no envían correos directamente: llaman a `encolar_correo`,
+que solo inserta una fila en `CorreoPendiente`. El comando `procesar_correos`
+ejecuta un conjunto de workers que reclaman lotes de la cola, los envían y
+gestionan los reintentos con espera exponencial.
+
+Los lotes se envían con `enviar_lote`, que reutiliza una única conexión SMTP
+autenticada para varios mensajes en lugar de abrir una por correo.
+"""
+import smtplib
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import F
+from django.utils import timezone
+
+from .metricas import medir
+from .models import CorreoPendiente
+
+
+def _nuevo_correo(asunto, cuerpo, destinatarios, cuerpo_html='', remitente=None):
+    return CorreoPendiente(
+        asunto=asunto[:255],
+        cuerpo=cuerpo,
+        cuerpo_html=cuerpo_html or '',
+        remitente=remitente or settings.DEFAULT_FROM_EMAIL,
+        destinatarios=list(destinatarios),
+    )
+
+
+def encolar_correo(asunto, cuerpo, destinatarios, cuerpo_html='', remitente=None):
+    """
+    Añade un correo a la cola de salida. No hace ninguna conexión SMTP.
+    """
+    with medir('correo'):
+        correo = _nuevo_correo(asunto, cuerpo, destinatarios, cuerpo_html, remitente)
+        correo.save()
+    return correo
+
+
+def encolar_correos(mensajes):
+    """
+    Encola varios correos con una única inserción. Cada elemento de `mensajes` es un
+    diccionario con las claves que acepta `encolar_correo`.
+    """
+    with medir('correo'):
+        correos = [_nuevo_correo(**mensaje) for mensaje in mensajes]
+        return CorreoPendiente.objects.bulk_create(correos)
+
+
+def construir_mensaje(correo, connection=None):
+    """
+    Convierte una fila de la cola en un EmailMultiAlternatives listo para enviar.
+    """
+    msg = EmailMultiAlternatives(correo.asunto, correo.cuerpo, correo.remitente, correo.destinatarios, connection=connection)
+    if correo.cuerpo_html:
+        msg.attach_alternative(correo.cuerpo_html, "text/html")
+    return msg
+
+
+def liberar_bloqueados(antiguedad=None):
+    """
+    Devuelve a la cola los correos que un worker reclamó y nunca terminó de enviar
+    (por ejemplo, porque el proceso murió a mitad del envío).
+    """
+    if antiguedad is None:
+        antiguedad = timedelta(seconds=settings.CORREO_BLOQUEO_MAX_SEGUNDOS)
+    limite = timezone.now() - antiguedad
+    return CorreoPendiente.objects.filter(estado='ENVIANDO', bloqueado_en__lt=limite).update(
+        estado='PENDIENTE', lote=None, bloqueado_en=None
+    )
+
+
+def reclamar_lote(tamano):
+    """
+    Reclama hasta `tamano` correos pendientes para este worker.
+
+    La reclamación es una actualización condicional (solo filas que siguen en PENDIENTE)
+    marcada con un identificador de lote propio, de modo que dos workers nunca se
+    quedan con el mismo correo aunque lean la misma página de la cola.
+    """
+    ahora = timezone.now()
+    candidatos = list(
+        CorreoPendiente.objects.filter(estado='PENDIENTE', proximo_intento__lte=ahora)
+        .order_by('proximo_intento', 'id')
+        .values_list('id', flat=True)[:tamano]
+    )
+    if not candidatos:
+        return []
+    lote = uuid.uuid4()
+    CorreoPendiente.objects.filter(id__in=candidatos, estado='PENDIENTE').update(
+        estado='ENVIANDO', lote=lote, bloqueado_en=ahora
+    )
+    return list(CorreoPendiente.objects.filter(lote=lote).order_by('id'))
+
+
+def calcular_espera(intentos):
+    """
+    Espera exponencial antes del siguiente intento: base, 2·base, 4·base... con tope.
+    """
+    espera = settings.CORREO_REINTENTO_BASE_SEGUNDOS * (2 ** max(intentos - 1, 0))
+    return timedelta(seconds=min(espera, settings.CORREO_REINTENTO_MAX_SEGUNDOS))
+
+
+def marcar_enviados(correos):
+    if not correos:
+        return
+    CorreoPendiente.objects.filter(pk__in=[correo.pk for correo in correos]).update(
+        estado='ENVIADO', intentos=F('intentos') + 1, enviado_en=timezone.now(),
+        lote=None, bloqueado_en=None, ultimo_error='',
+    )
+
+
+def marcar_fallo(correo, error):
+    """
+    Registra un intento fallido. Si se han agotado los intentos, el correo pasa a
+    FALLIDO (cola de mensajes muertos) y solo se reenviará desde el panel de administración.
+    Devuelve True si el correo se volverá a intentar.
+    """
+    intentos = correo.intentos + 1
+    reintentar = intentos < settings.CORREO_MAX_INTENTOS
+    CorreoPendiente.objects.filter(pk=correo.pk).update(
+        estado='PENDIENTE' if reintentar else 'FALLIDO',
+        intentos=intentos,
+        proximo_intento=timezone.now() + calcular_espera(intentos),
+        lote=None, bloqueado_en=None, ultimo_error=str(error)[:2000],
+    )
+    return reintentar
+
+
+def _es_error_de_conexion(error):
+    """
+    Distingue los fallos de la conexión (merece la pena reconectar) de los fallos
+    propios de un mensaje, como un destinatario rechazado.
+    """
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class InformeLote:
+    """
+    Resultado y tiempos de un envío con `enviar_lote`.
+    """
+    def __init__(self, total):
+        self.total = total
+        self.enviados = 0
+        self.fallidos = 0
+        self.conexiones = 0
+        self.reconexiones = 0
+        self.segundos_conexion = 0.0
+        self.segundos = 0.0
+
+    @property
+    def mensajes_por_segundo(self):
+        return round(self.enviados / self.segundos, 2) if self.segundos else 0.0
+
+    def __str__(self):
+        return (
+            f"{self.enviados}/{self.total} mensajes enviados ({self.fallidos} fallidos) en {self.segundos:.2f} s "
+            f"con {self.conexiones} conexiones ({self.reconexiones} reconexiones, {self.segundos_conexion:.2f} s abriendo conexiones); "
+            f"{self.mensajes_por_segundo} mensajes/s"
+        )
+
+
+def enviar_lote(mensajes, max_por_conexion=None, connection=None):
+    """
+    Envía una lista de EmailMessage reutilizando una sola conexión autenticada.
+
+    La conexión se renueva cada `max_por_conexion` mensajes (muchos servidores SMTP
+    limitan los mensajes por sesión) y también cuando se cae: en ese caso se reconecta
+    y se reintenta el mensaje una vez. Devuelve el informe del lote y una lista con el
+    error de cada mensaje (None si se envió correctamente), en el mismo orden.
+    """
+    if max_por_conexion is None:
+        max_por_conexion = settings.CORREO_MAX_MENSAJES_POR_CONEXION
+    connection = connection or get_connection()
+    informe = InformeLote(len(mensajes))
+    errores = [None] * len(mensajes)
+    abierta = False
+    en_esta_conexion = 0
+    inicio = time.monotonic()
+
+    def _cerrar():
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    try:
+        for i, mensaje in enumerate(mensajes):
+            for intento in range(2):
+                try:
+                    if abierta and en_esta_conexion >= max_por_conexion:
+                        _cerrar()
+                        abierta = False
+                    if not abierta:
+                        inicio_conexion = time.monotonic()
+                        connection.open()
+                        informe.segundos_conexion += time.monotonic() - inicio_conexion
+                        informe.conexiones += 1
+                        abierta = True
+                        en_esta_conexion = 0
+                    connection.send_messages([mensaje])
+                    en_esta_conexion += 1
+                    errores[i] = None
+                    break
+                except Exception as e:
+                    errores[i] = e
+                    if not _es_error_de_conexion(e):
+                        break
+                    # La conexión ya no es utilizable: la descartamos y, si es el primer
+                    # intento, volvemos a probar con una conexión nueva.
+                    _cerrar()
+                    abierta = False
+                    if intento == 0:
+                        informe.reconexiones += 1
+    finally:
+        if abierta:
+            _cerrar()
+
+    informe.enviados = sum(1 for error in errores if error is None)
+    informe.fallidos = informe.total - informe.enviados
+    informe.segundos = time.monotonic() - inicio
+    return informe, errores
+
+
+class EstadisticasEnvio:
+    """
+    Contadores de throughput compartidos por todos los workers de un proceso.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.inicio = time.monotonic()
+        self.enviados = 0
+        self.reintentos = 0
+        self.fallidos = 0
+        self.lotes = 0
+        self.conexiones = 0
+
+    def registrar(self, enviados=0, reintentos=0, fallidos=0, conexiones=0):
+        with self._lock:
+            self.enviados += enviados
+            self.reintentos += reintentos
+            self.fallidos += fallidos
+            self.conexiones += conexiones
+            self.lotes += 1
+
+    def resumen(self):
+        with self._lock:
+            transcurrido = max(time.monotonic() - self.inicio, 1e-9)
+            return {
+                'enviados': self.enviados,
+                'reintentos': self.reintentos,
+                'fallidos': self.fallidos,
+                'lotes': self.lotes,
+                'conexiones': self.conexiones,
+                'segundos': round(transcurrido, 2),
+                'correos_por_segundo': round(self.enviados / transcurrido, 2),
+            }
+
+
+def procesar_lote(tamano, estadisticas=None):
+    """
+    Reclama un lote de la cola y lo envía por una única conexión. Devuelve el número de
+    correos reclamados, de modo que el worker sabe si la cola está vacía.
+    """
+    correos = reclamar_lote(tamano)
+    if not correos:
+        return 0
+
+    resultado = {'enviados': 0, 'reintentos': 0, 'fallidos': 0}
+    try:
+        connection = get_connection()
+    except Exception as e:
+        # Backend de correo mal configurado: todo el lote cuenta como un intento fallido.
+        informe, errores = InformeLote(len(correos)), [e] * len(correos)
+    else:
+        informe, errores = enviar_lote([construir_mensaje(correo, connection) for correo in correos], connection=connection)
+
+    enviados = [correo for correo, error in zip(correos, errores) if error is None]
+    marcar_enviados(enviados)
+    resultado['enviados'] = len(enviados)
+    for correo, error in zip(correos, errores):
+        if error is None:
+            continue
+        if marcar_fallo(correo, error):
+            resultado['reintentos'] += 1
+            print(f"ERROR al enviar correo {correo.pk} (intento {correo.intentos + 1}), se reintentará: {error}")
+        else:
+            resultado['fallidos'] += 1
+            print(f"ERROR definitivo al enviar correo {correo.pk}, movido a fallidos: {error}")
+
+    if estadisticas is not None:
+        estadisticas.registrar(conexiones=informe.conexiones, **resultado)
+    return len(correos)
@@ -0,0 +1,77 @@
+"""
+Servicio de reserva de visitas sin condiciones de carrera.
+
+La reserva se hace en una transacción que bloquea la fila del hueco
+(`select_for_update`) y se apoya en la restricción única parcial de Visita, que solo
+impide dos visitas CONFIRMADAS a la misma hora. Si dos arrendatarios eligen el mismo
+hueco a la vez, el segundo recibe `HuecoNoDisponible` en lugar de un error 500.
+"""
+import random
+import time
+
+from django.db import IntegrityError, OperationalError, transaction
+
+from .models import HuecoVisita
+
+# Reintentos ante bloqueos transitorios de la base de datos ("database is locked",
+# interbloqueos o fallos de serialización), con una espera corta y aleatoria.
+REINTENTOS_BLOQUEO = 5
+ESPERA_BASE_SEGUNDOS = 0.05
+
+
+class HuecoNoDisponible(Exception):
+    """
+    El hueco elegido ya no está libre: otra persona acaba de reservarlo.
+    """
+
+
+def _reservar(visita, vivienda, fecha_hora, es_modificacion):
+    with transaction.atomic():
+        # Bloqueamos las filas del hueco: las reservas simultáneas del mismo hueco esperan
+        # aquí a que termine la primera y después ven el hueco ya ocupado.
+        huecos = list(HuecoVisita.objects.select_for_update().filter(vivienda=vivienda, fecha_hora=fecha_hora).order_by('pk'))
+        if not huecos or any(hueco.ocupado for hueco in huecos):
+            raise HuecoNoDisponible()
+
+        if es_modificacion:
+            # Cambiar de hora cuenta como cancelar la cita anterior.
+            visita.veces_cancelada += 1
+        visita.vivienda = vivienda
+        visita.fecha_hora = fecha_hora
+        visita.estado = 'CONFIRMADA'
+        try:
+            # Punto de guardado propio: si la restricción única salta, la transacción
+            # exterior sigue siendo utilizable y se deshace limpiamente.
+            with transaction.atomic():
+                visita.save()
+        except IntegrityError:
+            raise HuecoNoDisponible()
+    return visita
+
+
+def reservar_visita(visita, vivienda, fecha_hora, es_modificacion=False):
+    """
+    Confirma `visita` en el hueco que empieza en `fecha_hora` de forma atómica.
+
+    `visita` puede ser nueva o, si `es_modificacion`, una visita ya confirmada que se
+    mueve a otra hora (la hora anterior queda libre al guardarla). Lanza
+    `HuecoNoDisponible` si el hueco ya está ocupado o no existe; en ese caso, y ante
+    cualquier otro error, la visita en memoria vuelve a su estado anterior.
+    """
+    original = (visita.pk, visita._state.adding, visita.vivienda_id, visita.fecha_hora, visita.estado, visita.veces_cancelada)
+
+    def _restaurar():
+        visita.pk, visita._state.adding, visita.vivienda_id, visita.fecha_hora, visita.estado, visita.veces_cancelada = original
+
+    for intento in range(REINTENTOS_BLOQUEO):
+        try:
+            return _reservar(visita, vivienda, fecha_hora, es_modificacion)
+        except OperationalError:
+            _restaurar()
+            if intento == REINTENTOS_BLOQUEO - 1:
+                raise
+            # La transacción se ha deshecho entera: esperamos un poco y reintentamos.
+            time.sleep(ESPERA_BASE_SEGUNDOS * (2 ** intento) * random.uniform(0.5, 1.5))
+        except Exception:
+            _restaurar()
+            raise
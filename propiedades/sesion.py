@@ -0,0 +1,59 @@
+"""
+Datos del flujo del arrendatario guardados en la sesión.
+
+Las claves son cortas porque con `SESSION_MODO=cookies` toda la sesión viaja firmada en
+la cookie en cada petición. Las funciones solo modifican la sesión si el valor cambia:
+así el middleware de sesiones no la vuelve a escribir cuando el arrendatario repite un
+paso, y nunca hace falta llamar a `session.save()` a mano.
+
+Las sesiones creadas antes de acortar las claves se leen con sus claves anteriores y se
+pasan a las nuevas la primera vez, así que nadie tiene que volver a identificarse.
+"""
+CLAVE_TELEFONO = 'tel'
+CLAVE_VIVIENDAS = 'viv'
+CLAVE_MODIFICAR = 'mod'
+
+# Claves anteriores de cada dato. Pueden quitarse cuando hayan caducado las sesiones
+# creadas con ellas (SESSION_COOKIE_AGE).
+CLAVES_ANTERIORES = {
+    CLAVE_TELEFONO: 'telefono_autorizado',
+    CLAVE_VIVIENDAS: 'viviendas_autorizadas_ids',
+    CLAVE_MODIFICAR: 'modificar_visita_id',
+}
+
+
+def _leer(session, clave, defecto=None):
+    if clave not in session and CLAVES_ANTERIORES[clave] in session:
+        session[clave] = session.pop(CLAVES_ANTERIORES[clave])
+    return session.get(clave, defecto)
+
+
+def _asignar(session, clave, valor):
+    if _leer(session, clave) != valor:
+        session[clave] = valor
+
+
+def guardar_acceso(session, telefono, viviendas_ids):
+    _asignar(session, CLAVE_TELEFONO, telefono)
+    _asignar(session, CLAVE_VIVIENDAS, sorted(viviendas_ids))
+
+
+def telefono_autorizado(session):
+    return _leer(session, CLAVE_TELEFONO)
+
+
+def viviendas_autorizadas_ids(session):
+    return _leer(session, CLAVE_VIVIENDAS, [])
+
+
+def visita_a_modificar_id(session):
+    return _leer(session, CLAVE_MODIFICAR)
+
+
+def empezar_modificacion(session, visita_id):
+    _asignar(session, CLAVE_MODIFICAR, visita_id)
+
+
+def terminar_modificacion(session):
+    session.pop(CLAVE_MODIFICAR, None)
+    session.pop(CLAVES_ANTERIORES[CLAVE_MODIFICAR], None)
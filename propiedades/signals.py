@@ -0,0 +1,80 @@
+"""
+Señales que mantienen sincronizados el índice de huecos de visita (HuecoVisita) y la
+caché de autorizaciones por teléfono. Se conectan en `PropiedadesConfig.ready()`.
+"""
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import autorizaciones, huecos
+from .models import ArrendatarioAutorizado, HorarioVisita, ReglaHorarioVisita, Visita, Vivienda
+
+
+@receiver(post_save, sender=HorarioVisita)
+def horario_guardado(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    huecos.regenerar_huecos_horario(instance)
+
+
+@receiver(post_save, sender=ReglaHorarioVisita)
+def regla_guardada(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    huecos.regenerar_huecos_regla(instance)
+
+
+@receiver(post_delete, sender=HorarioVisita)
+@receiver(post_delete, sender=ReglaHorarioVisita)
+def franjas_borradas(sender, instance, **kwargs):
+    # Sus huecos desaparecen con ellos (on_delete=CASCADE); solo cambia la versión.
+    huecos.huecos_modificados(instance.vivienda_id)
+
+
+@receiver(post_init, sender=Visita)
+def visita_cargada(sender, instance, **kwargs):
+    # Guardamos los valores originales sin provocar consultas si algún campo está diferido.
+    instance._hueco_original = (instance.__dict__.get('vivienda_id'), instance.__dict__.get('fecha_hora'))
+
+
+@receiver(post_save, sender=Visita)
+def visita_guardada(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    huecos.actualizar_ocupacion(instance.vivienda_id, instance.fecha_hora)
+    vivienda_id, fecha_hora = getattr(instance, '_hueco_original', (None, None))
+    if fecha_hora is not None and (vivienda_id, fecha_hora) != (instance.vivienda_id, instance.fecha_hora):
+        # La visita se ha movido: el hueco anterior puede haber quedado libre.
+        huecos.actualizar_ocupacion(vivienda_id, fecha_hora)
+    instance._hueco_original = (instance.vivienda_id, instance.fecha_hora)
+
+
+@receiver(post_delete, sender=Visita)
+def visita_borrada(sender, instance, **kwargs):
+    huecos.actualizar_ocupacion(instance.vivienda_id, instance.fecha_hora)
+
+
+@receiver(post_init, sender=Vivienda)
+def vivienda_cargada(sender, instance, **kwargs):
+    instance._duracion_original = instance.__dict__.get('duracion_visita_minutos')
+
+
+@receiver(post_save, sender=Vivienda)
+def vivienda_guardada(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    if instance._duracion_original is not None and instance._duracion_original != instance.duracion_visita_minutos:
+        huecos.regenerar_huecos_vivienda(instance)
+    instance._duracion_original = instance.duracion_visita_minutos
+
+
+@receiver(post_init, sender=ArrendatarioAutorizado)
+def autorizacion_cargada(sender, instance, **kwargs):
+    instance._telefono_original = instance.__dict__.get('telefono')
+
+
+@receiver(post_save, sender=ArrendatarioAutorizado)
+@receiver(post_delete, sender=ArrendatarioAutorizado)
+def autorizacion_modificada(sender, instance, **kwargs):
+    # Si se ha cambiado el número, el teléfono anterior también tiene la caché obsoleta.
+    autorizaciones.invalidar(instance.telefono, instance._telefono_original)
+    instance._telefono_original = instance.telefono
@@ -0,0 +1,77 @@
+"""
+Creación de solicitudes de documentación y envío de sus correos por lotes.
+
+Las solicitudes se insertan con una sola consulta y los correos se preparan cuando
+la transacción se confirma (`transaction.on_commit`): si la creación se deshace no
+se avisa a nadie. La plantilla se renderiza una vez por vivienda (`correos.molde`) y
+cada candidato solo rellena su nombre y su enlace; los correos se encolan con una
+única inserción y el worker de la cola los envía reutilizando la misma conexión SMTP.
+"""
+from django.db import transaction
+from django.urls import reverse
+
+from . import correos
+from .models import SolicitudDeDocumentacion
+from .notificaciones import encolar_correos
+
+PLANTILLA = 'instrucciones_documentacion'
+
+
+def _enlace_subida(solicitud):
+    # NOTA: No podemos usar request.build_absolute_uri aquí.
+    # Necesitaremos construir la URL base de otra manera en un futuro para producción.
+    # Por ahora, para desarrollo, funcionará asumiendo http://127.0.0.1:8000
+    return f"http://127.0.0.1:8000{reverse('propiedades:subir_documentos', args=[solicitud.token_acceso])}"
+
+
+def notificar_solicitudes(solicitudes):
+    """
+    Encola el correo con las instrucciones de cada solicitud pendiente. Las solicitudes
+    deben traer cargadas su visita y la vivienda de la visita.
+    """
+    plantilla = correos.plantilla(PLANTILLA)
+    moldes = {}
+    mensajes = []
+    for solicitud in solicitudes:
+        if solicitud.estado != 'PENDIENTE':
+            continue
+        visita = solicitud.visita
+        vivienda = visita.vivienda
+        if vivienda.id not in moldes:
+            moldes[vivienda.id] = plantilla.molde({
+                'visita': {'nombre': correos.marcador('nombre'), 'vivienda': vivienda},
+                'enlace_subida': correos.marcador('enlace_subida'),
+                'aseguradora': vivienda.nombre_aseguradora_impagos,
+            }, ['nombre', 'enlace_subida'])
+        cuerpo, cuerpo_html = moldes[vivienda.id].renderizar({'nombre': visita.nombre, 'enlace_subida': _enlace_subida(solicitud)})
+        mensajes.append({
+            'asunto': f"Siguientes pasos para el alquiler de {vivienda.nombre}",
+            'cuerpo': cuerpo,
+            'cuerpo_html': cuerpo_html,
+            'destinatarios': [visita.email],
+        })
+    encolar_correos(mensajes)
+    print(f"{len(mensajes)} correos de solicitud de documentación encolados.")
+    return len(mensajes)
+
+
+def crear_solicitudes(visitas):
+    """
+    Crea una solicitud de documentación para cada visita que aún no tenga una y
+    programa sus correos para cuando se confirme la transacción. Devuelve las
+    solicitudes creadas.
+    """
+    visitas = list(visitas.filter(solicitud_de_documentacion__isnull=True).select_related('vivienda'))
+    if not visitas:
+        return []
+    with transaction.atomic():
+        nuevas = [SolicitudDeDocumentacion(visita=visita) for visita in visitas]
+        # Si otra petición ha creado a la vez la solicitud de alguna visita, la
+        # restricción única la descarta; después nos quedamos solo con las nuestras.
+        SolicitudDeDocumentacion.objects.bulk_create(nuevas, ignore_conflicts=True)
+        # Con ignore_conflicts los objetos no reciben su ID, así que los leemos de nuevo.
+        creadas = list(
+            SolicitudDeDocumentacion.objects.filter(token_acceso__in=[s.token_acceso for s in nuevas]).select_related('visita__vivienda')
+        )
+        transaction.on_commit(lambda: notificar_solicitudes(creadas))
+    return creadas
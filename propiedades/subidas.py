@@ -0,0 +1,321 @@
+"""
+Subida de documentos por fragmentos, reanudable, y su procesamiento fuera de la petición.
+
+El navegador crea una subida (`iniciar_subida`) y envía el fichero en fragmentos de
+`DOCUMENTO_TAMANO_FRAGMENTO` bytes. `FragmentoUploadHandler` escribe cada fragmento
+directamente en el fichero parcial, en su posición, sin pasar por memoria ni por un
+fichero temporal. Si la conexión se corta, el navegador consulta los bytes recibidos
+y continúa desde ahí. Finalizar solo cambia el estado: el hash, las comprobaciones de
+tamaño, la compresión de imágenes y la miniatura los hace el comando
+`procesar_subidas` (ver `imagenes.py`).
+"""
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.db.models import F
+from django.utils import timezone
+
+from . import imagenes
+from .models import InquilinoDocumentacion, SubidaDocumento
+
+
+
+def ruta_parcial(subida):
+    """
+    Ruta del fichero donde se van acumulando los fragmentos de una subida.
+    """
+    return os.path.join(settings.MEDIA_ROOT, 'documentacion', 'parciales', str(subida.pk))
+
+
+def iniciar_subida(solicitud, campo, nombre_original, tamano):
+    """
+    Registra una subida nueva y crea su fichero parcial vacío.
+    """
+    subida = SubidaDocumento.objects.create(
+        solicitud=solicitud, campo=campo, nombre_original=os.path.basename(nombre_original)[:255], tamano=tamano,
+    )
+    ruta = ruta_parcial(subida)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    open(ruta, 'wb').close()
+    return subida
+
+
+class FragmentoUploadHandler(FileUploadHandler):
+    """
+    Manejador de subida que escribe el fichero 'fragmento' de la petición en el fichero
+    parcial de la subida, a partir del byte `desde`. Corta la subida si el fragmento
+    se sale del tamaño declarado.
+    """
+
+    def __init__(self, request, subida, desde):
+        super().__init__(request)
+        self.subida = subida
+        self.desde = desde
+        self.destino = None
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        if field_name != 'fragmento':
+            raise StopUpload(connection_reset=True)
+        self.destino = open(ruta_parcial(self.subida), 'r+b')
+        self.destino.seek(self.desde)
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.desde + start + len(raw_data) > self.subida.tamano:
+            self._cerrar()
+            raise StopUpload(connection_reset=True)
+        self.destino.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        self._cerrar()
+        # El contenido ya está en disco: solo devolvemos el nombre y el tamaño.
+        return UploadedFile(name=self.file_name, content_type=self.content_type, size=file_size)
+
+    def upload_interrupted(self):
+        self._cerrar()
+
+    def upload_complete(self):
+        self._cerrar()
+
+    def _cerrar(self):
+        if self.destino is not None:
+            self.destino.close()
+            self.destino = None
+
+
+def registrar_fragmento(subida, desde, tamano_fragmento):
+    """
+    Anota los bytes recibidos solo si nadie ha escrito entretanto en la subida.
+    Devuelve False si el fragmento no llegaba en el orden esperado.
+    """
+    return SubidaDocumento.objects.filter(pk=subida.pk, estado='SUBIENDO', recibidos=desde).update(
+        recibidos=desde + tamano_fragmento, actualizado_en=timezone.now(),
+    ) == 1
+
+
+def finalizar_subida(subida):
+    """
+    Marca la subida como completa para que la procese un worker. No lee el fichero.
+    """
+    return SubidaDocumento.objects.filter(pk=subida.pk, estado='SUBIENDO', recibidos=subida.tamano).update(
+        estado='RECIBIDA', actualizado_en=timezone.now(),
+    ) == 1
+
+
+def asignar_procesadas(inquilino_ids):
+    """
+    Copia los ficheros de las subidas ya procesadas a los campos de sus inquilinos.
+    """
+    campos_por_inquilino = {}
+    for inquilino_id, campo, nombre in SubidaDocumento.objects.filter(
+        inquilino_id__in=inquilino_ids, estado='PROCESADA'
+    ).values_list('inquilino_id', 'campo', 'fichero'):
+        campos_por_inquilino.setdefault(inquilino_id, {})[campo] = nombre
+    for inquilino_id, campos in campos_por_inquilino.items():
+        InquilinoDocumentacion.objects.filter(pk=inquilino_id).update(**campos)
+
+
+def vincular_subidas(inquilino, subidas):
+    """
+    Asocia a `inquilino` las subidas de su formulario ({campo: subida}) y le asigna
+    las que el worker ya haya terminado de procesar.
+    """
+    if not subidas:
+        return
+    SubidaDocumento.objects.filter(pk__in=[subida.pk for subida in subidas.values()]).update(inquilino=inquilino)
+    asignar_procesadas([inquilino.pk])
+
+
+def reclamar_subidas(tamano):
+    """
+    Reclama hasta `tamano` subidas recibidas para procesarlas.
+    """
+    reclamadas = []
+    for subida in SubidaDocumento.objects.filter(estado='RECIBIDA').order_by('actualizado_en')[:tamano]:
+        ahora = timezone.now()
+        if SubidaDocumento.objects.filter(pk=subida.pk, estado='RECIBIDA').update(
+            estado='PROCESANDO', bloqueado_en=ahora, intentos=F('intentos') + 1,
+        ):
+            subida.estado, subida.bloqueado_en, subida.intentos = 'PROCESANDO', ahora, subida.intentos + 1
+            reclamadas.append(subida)
+    return reclamadas
+
+
+def liberar_bloqueadas(antiguedad=None):
+    """
+    Devuelve a 'Recibida' las subidas que un worker dejó a medias, o las rechaza si ya
+    se han intentado SUBIDA_MAX_INTENTOS veces (un fichero que tumba al worker no debe
+    reclamarse para siempre).
+    """
+    if antiguedad is None:
+        antiguedad = timedelta(seconds=settings.SUBIDA_BLOQUEO_MAX_SEGUNDOS)
+    bloqueadas = SubidaDocumento.objects.filter(estado='PROCESANDO', bloqueado_en__lt=timezone.now() - antiguedad)
+    for subida in bloqueadas.filter(intentos__gte=settings.SUBIDA_MAX_INTENTOS):
+        _rechazar(subida, f"No se ha podido procesar tras {subida.intentos} intentos.")
+    return bloqueadas.update(estado='RECIBIDA', bloqueado_en=None, actualizado_en=timezone.now())
+
+
+def limpiar_abandonadas():
+    """
+    Borra las subidas que nunca se finalizaron y sus ficheros parciales.
+    """
+    limite = timezone.now() - timedelta(hours=settings.SUBIDA_CADUCIDAD_HORAS)
+    abandonadas = list(SubidaDocumento.objects.filter(estado='SUBIENDO', actualizado_en__lt=limite))
+    for subida in abandonadas:
+        _borrar_parcial(subida)
+    SubidaDocumento.objects.filter(pk__in=[subida.pk for subida in abandonadas]).delete()
+    return len(abandonadas)
+
+
+def _borrar_parcial(subida):
+    try:
+        os.remove(ruta_parcial(subida))
+    except FileNotFoundError:
+        pass
+
+
+def _rechazar(subida, motivo):
+    _borrar_parcial(subida)
+    SubidaDocumento.objects.filter(pk=subida.pk).update(estado='RECHAZADA', error=motivo, bloqueado_en=None)
+    print(f"Subida {subida.pk} rechazada: {motivo}")
+    return False
+
+
+def _comprobar_tamano(subida):
+    """
+    Devuelve el motivo por el que hay que rechazar la subida, o None si es correcta.
+    """
+    try:
+        tamano_real = os.path.getsize(ruta_parcial(subida))
+    except FileNotFoundError:
+        return "No se encuentra el fichero recibido."
+    if tamano_real == 0:
+        return "El fichero está vacío."
+    if tamano_real != subida.tamano:
+        return f"Se esperaban {subida.tamano} bytes y se han recibido {tamano_real}."
+    if tamano_real > settings.DOCUMENTO_MAX_BYTES:
+        return f"El fichero supera el tamaño máximo de {settings.DOCUMENTO_MAX_BYTES} bytes."
+    return None
+
+
+def _argumentos_analisis(subida):
+    # Solo tipos simples: el análisis puede ejecutarse en otro proceso sin Django.
+    return (ruta_parcial(subida), settings.IMAGEN_MAX_LADO, settings.IMAGEN_LADO_MINIATURA, settings.IMAGEN_CALIDAD_JPEG)
+
+
+def _guardar_resultado(subida, resultado):
+    """
+    Guarda el documento (comprimido si es una imagen), la miniatura y, si se ha
+    configurado, el original; después lo asigna a su inquilino.
+    """
+    ruta = ruta_parcial(subida)
+    campo = InquilinoDocumentacion._meta.get_field(subida.campo)
+    nombre_original = ''
+    if resultado['imagen'] is None:
+        with open(ruta, 'rb') as fichero:
+            nombre = campo.storage.save(campo.generate_filename(None, subida.nombre_original), File(fichero))
+    else:
+        nombre = campo.storage.save(
+            campo.generate_filename(None, imagenes.nombre_jpeg(subida.nombre_original)), ContentFile(resultado['imagen'])
+        )
+        if settings.IMAGEN_CONSERVAR_ORIGINAL:
+            campo_original = SubidaDocumento._meta.get_field('original')
+            with open(ruta, 'rb') as fichero:
+                nombre_original = campo_original.storage.save(campo_original.generate_filename(None, subida.nombre_original), File(fichero))
+
+    nombre_miniatura = ''
+    if resultado['miniatura'] is not None:
+        campo_miniatura = SubidaDocumento._meta.get_field('miniatura')
+        nombre_miniatura = campo_miniatura.storage.save(
+            campo_miniatura.generate_filename(None, f"{subida.pk}.jpg"), ContentFile(resultado['miniatura'])
+        )
+
+    _borrar_parcial(subida)
+    SubidaDocumento.objects.filter(pk=subida.pk).update(
+        estado='PROCESADA', fichero=nombre, original=nombre_original, sha256=resultado['sha256'],
+        miniatura=nombre_miniatura, tamano_final=campo.storage.size(nombre), error='', bloqueado_en=None,
+    )
+    # Si el formulario ya se envió, el documento pasa ahora al inquilino; si no, lo
+    # asignará la vista al guardarlo.
+    inquilino_id = SubidaDocumento.objects.filter(pk=subida.pk).values_list('inquilino_id', flat=True).first()
+    if inquilino_id:
+        asignar_procesadas([inquilino_id])
+
+
+def procesar_subida(subida):
+    """
+    Comprueba el fichero recibido, calcula su SHA-256, comprime las imágenes, lo guarda
+    en su ubicación definitiva y genera la miniatura. Devuelve True si la subida queda
+    procesada.
+    """
+    motivo = _comprobar_tamano(subida)
+    if motivo:
+        return _rechazar(subida, motivo)
+    try:
+        resultado = imagenes.analizar_documento(*_argumentos_analisis(subida))
+    except imagenes.DocumentoNoValido as e:
+        return _rechazar(subida, str(e))
+    _guardar_resultado(subida, resultado)
+    return True
+
+
+def procesar_pendientes(maximo=None, ejecutor=None, lote=None):
+    """
+    Procesa subidas recibidas hasta vaciar la cola (o hasta `maximo`). Devuelve
+    (procesadas, rechazadas).
+
+    Con un `ejecutor` (ProcessPoolExecutor), el análisis y la compresión de cada lote
+    se reparten entre sus procesos; el proceso principal solo guarda los resultados.
+    """
+    if lote is None:
+        lote = getattr(ejecutor, '_max_workers', 1) * 2
+    procesadas = rechazadas = 0
+    while maximo is None or procesadas + rechazadas < maximo:
+        reclamadas = reclamar_subidas(lote if maximo is None else min(lote, maximo - procesadas - rechazadas))
+        if not reclamadas:
+            break
+        validas = []
+        for subida in reclamadas:
+            motivo = _comprobar_tamano(subida)
+            if motivo:
+                _rechazar(subida, motivo)
+                rechazadas += 1
+            else:
+                validas.append(subida)
+        if ejecutor is not None:
+            pendientes = [(subida, ejecutor.submit(imagenes.analizar_documento, *_argumentos_analisis(subida))) for subida in validas]
+        else:
+            pendientes = [(subida, None) for subida in validas]
+
+        hubo_error = False
+        for subida, futuro in pendientes:
+            try:
+                resultado = futuro.result() if futuro is not None else imagenes.analizar_documento(*_argumentos_analisis(subida))
+                _guardar_resultado(subida, resultado)
+            except imagenes.DocumentoNoValido as e:
+                _rechazar(subida, str(e))
+                rechazadas += 1
+            except Exception as e:
+                print(f"Error al procesar la subida {subida.pk}: {e}")
+                if subida.intentos >= settings.SUBIDA_MAX_INTENTOS:
+                    _rechazar(subida, f"No se ha podido procesar tras {subida.intentos} intentos: {e}")
+                    rechazadas += 1
+                else:
+                    # Error inesperado (disco, almacenamiento...): se reintentará más tarde, detrás
+                    # de las demás subidas pendientes (la cola se ordena por `actualizado_en`).
+                    SubidaDocumento.objects.filter(pk=subida.pk).update(
+                        estado='RECIBIDA', bloqueado_en=None, error=str(e), actualizado_en=timezone.now(),
+                    )
+                hubo_error = True
+            else:
+                procesadas += 1
+        if hubo_error:
+            # No volvemos a reclamar enseguida la misma subida: el worker esperará.
+            break
+    return procesadas, rechazadas
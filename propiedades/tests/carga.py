@@ -0,0 +1,260 @@
+"""
+Utilidades compartidas por los tests y los comandos de pruebas de carga (`bench_*`).
+Viven junto a los tests para que el código de la aplicación no importe nada de
+`django.test`.
+
+- `base_de_datos_temporal`: crea y destruye la base de datos de pruebas de Django.
+- `generar_cartera`: llena esa base de datos con una cartera sintética y reproducible
+  (viviendas, horarios, teléfonos autorizados y visitas pasadas y futuras).
+- `generar_listados` y `listado_admin`: filas para los listados del administrador y su
+  renderizado, para comprobar que sus consultas no crecen con el número de filas.
+- `Embudo`: recorre el flujo completo del arrendatario con el cliente de pruebas de Django
+  (acceso, selección, reserva, gestión o cancelación y subida de documentos) y anota la
+  latencia y las consultas de cada petición.
+"""
+import os
+import random
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import time as dtime, timedelta
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.template.response import SimpleTemplateResponse
+from django.test import Client, RequestFactory
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from .. import huecos
+from ..models import (
+    Administrador, ArrendatarioAutorizado, HorarioVisita, HuecoVisita, SolicitudDeDocumentacion, Visita, Vivienda,
+)
+from ..solicitudes import crear_solicitudes
+
+HORAS_HORARIO = ((dtime(10), dtime(13)), (dtime(17), dtime(20)))
+DATOS_VISITA = {
+    'nombre': "Prueba", 'apellidos': "Carga", 'sueldo_mensual': '2000', 'numero_inquilinos': 1,
+    'numero_menores': 0, 'puesto_trabajo': "Pruebas",
+}
+
+
+@contextmanager
+def base_de_datos_temporal(en_fichero=False):
+    """
+    Crea la base de datos de pruebas, la usa como la predeterminada mientras dura el bloque
+    y la destruye al salir. Con SQLite y `en_fichero`, la crea en un fichero temporal en
+    vez de en memoria, para medir los bloqueos entre hilos como en producción.
+    """
+    setup_test_environment()
+    ajustes = connection.settings_dict
+    fichero_temporal = None
+    if en_fichero and connection.vendor == 'sqlite' and not ajustes['TEST'].get('NAME'):
+        fichero_temporal = tempfile.NamedTemporaryFile(suffix='.sqlite3', delete=False).name
+        ajustes['TEST']['NAME'] = fichero_temporal
+    nombre_original = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(nombre_original, verbosity=0)
+        teardown_test_environment()
+        if fichero_temporal:
+            ajustes['TEST']['NAME'] = None
+            for sufijo in ('', '-wal', '-shm'):
+                if os.path.exists(fichero_temporal + sufijo):
+                    os.remove(fichero_temporal + sufijo)
+
+
+@dataclass
+class Cartera:
+    viviendas: list
+    # Teléfono -> IDs de las viviendas a las que tiene acceso.
+    autorizaciones: dict = field(default_factory=dict)
+
+
+def generar_cartera(viviendas=20, telefonos=200, dias=14, visitas_historicas=5000, semilla=42):
+    """
+    Crea una cartera sintética: `viviendas` con dos franjas de visitas cada día durante
+    `dias` días, `telefonos` autorizados para entre una y tres viviendas cada uno, y
+    `visitas_historicas` visitas realizadas o canceladas en el pasado. Además, un 10 % de
+    los huecos futuros quedan ya reservados. Con la misma `semilla` genera siempre lo mismo.
+    """
+    aleatorio = random.Random(semilla)
+    administrador = Administrador.objects.create(nombre="Administración de prueba", email="admin-carga@example.com", telefono="+34900000000")
+    lista = Vivienda.objects.bulk_create([
+        Vivienda(
+            nombre=f"Vivienda {i}", direccion_completa=f"Calle de la Carga {i}", referencia_catastral=f"CARGA-{i}",
+            precio_mensualidad=aleatorio.randrange(600, 1500), duracion_visita_minutos=aleatorio.choice((15, 20, 30)),
+        )
+        for i in range(viviendas)
+    ])
+    Vivienda.administradores.through.objects.bulk_create([
+        Vivienda.administradores.through(vivienda_id=vivienda.id, administrador_id=administrador.id) for vivienda in lista
+    ])
+
+    # bulk_create no envía señales: los huecos se materializan después, vivienda a vivienda.
+    hoy = timezone.localdate()
+    HorarioVisita.objects.bulk_create([
+        HorarioVisita(vivienda=vivienda, fecha=hoy + timedelta(days=dia), hora_inicio=inicio, hora_fin=fin)
+        for vivienda in lista for dia in range(1, dias + 1) for inicio, fin in HORAS_HORARIO
+    ])
+    for vivienda in lista:
+        huecos.regenerar_huecos_vivienda(vivienda)
+
+    cartera = Cartera(lista)
+    autorizaciones = []
+    for i in range(telefonos):
+        telefono = f"+3461{i:07d}"
+        ids = sorted(vivienda.id for vivienda in aleatorio.sample(lista, min(len(lista), aleatorio.randint(1, 3))))
+        cartera.autorizaciones[telefono] = ids
+        autorizaciones += [ArrendatarioAutorizado(vivienda_id=vivienda_id, telefono=telefono) for vivienda_id in ids]
+    ArrendatarioAutorizado.objects.bulk_create(autorizaciones)
+
+    visitas = []
+    ahora = timezone.now()
+    for i in range(visitas_historicas):
+        visitas.append(Visita(
+            vivienda=aleatorio.choice(lista), email=f"historica{i}@example.com", telefono=f"+3462{i:07d}",
+            fecha_hora=ahora - timedelta(days=aleatorio.randint(1, 365), minutes=30 * aleatorio.randrange(48)),
+            estado=aleatorio.choice(('REALIZADA', 'REALIZADA', 'CANCELADA')), **DATOS_VISITA,
+        ))
+    futuros = list(HuecoVisita.objects.values_list('vivienda_id', 'fecha_hora'))
+    for i, (vivienda_id, fecha_hora) in enumerate(aleatorio.sample(futuros, len(futuros) // 10)):
+        visitas.append(Visita(
+            vivienda_id=vivienda_id, email=f"reservada{i}@example.com", telefono=f"+3463{i:07d}", fecha_hora=fecha_hora, **DATOS_VISITA,
+        ))
+    Visita.objects.bulk_create(visitas, batch_size=1000)
+    confirmada = Visita.objects.filter(vivienda_id=OuterRef('vivienda_id'), fecha_hora=OuterRef('fecha_hora'), estado='CONFIRMADA')
+    HuecoVisita.objects.filter(Exists(confirmada)).update(ocupado=True)
+    return cartera
+
+
+def generar_listados(filas):
+    """
+    Crea `filas` viviendas más, cada una con un horario, una visita y la solicitud de
+    documentación de esa visita: una fila más en cada listado del administrador, todas
+    de viviendas distintas. No envía señales ni genera huecos.
+    """
+    inicio = Vivienda.objects.count()
+    lista = Vivienda.objects.bulk_create([
+        Vivienda(nombre=f"Vivienda {i}", direccion_completa=f"Calle del Listado {i}", referencia_catastral=f"LISTADO-{i}", precio_mensualidad=900)
+        for i in range(inicio, inicio + filas)
+    ])
+    manana = timezone.localdate() + timedelta(days=1)
+    HorarioVisita.objects.bulk_create([
+        HorarioVisita(vivienda=vivienda, fecha=manana, hora_inicio=dtime(10), hora_fin=dtime(12)) for vivienda in lista
+    ])
+    visitas = Visita.objects.bulk_create([
+        Visita(vivienda=vivienda, email=f"listado{vivienda.id}@example.com", telefono="+34600000000",
+               fecha_hora=timezone.now() + timedelta(days=1), **DATOS_VISITA)
+        for vivienda in lista
+    ])
+    SolicitudDeDocumentacion.objects.bulk_create([SolicitudDeDocumentacion(visita=visita) for visita in visitas])
+
+
+def listado_admin(modelo, parametros=None):
+    """
+    Renderiza el listado del administrador de `modelo` como lo vería un superusuario.
+    Con parámetros inválidos (una página que no existe) devuelve la redirección.
+    """
+    peticion = RequestFactory().get('/admin/', parametros or {})
+    peticion.user = get_user_model()(is_active=True, is_staff=True, is_superuser=True)
+    respuesta = admin.site._registry[modelo].changelist_view(peticion)
+    return respuesta.render() if isinstance(respuesta, SimpleTemplateResponse) else respuesta
+
+
+def _documento(nombre):
+    return SimpleUploadedFile(nombre, b'%PDF-1.4\n% documento de prueba de carga\n', content_type='application/pdf')
+
+
+class Embudo:
+    """
+    Recorrido de un arrendatario por todo el flujo. Cada petición se anota en `medidas`
+    como (paso, segundos, segundos de CPU del hilo, consultas, código de estado). El
+    tiempo de CPU no incluye las esperas al GIL ni a los bloqueos de la base de datos, así
+    que apenas depende de cuántos hilos haya a la vez.
+    """
+
+    def __init__(self, cartera, telefono, ip, aleatorio, cancelan=0.3):
+        self.cartera = cartera
+        self.telefono = telefono
+        self.aleatorio = aleatorio
+        self.cancelan = cancelan
+        self.cliente = Client(raise_request_exception=False, REMOTE_ADDR=ip)
+        self.medidas = []
+        self.huecos_ocupados = 0
+
+    def _consulta(self, execute, sql, params, many, context):
+        self._consultas += 1
+        return execute(sql, params, many, context)
+
+    def _peticion(self, paso, metodo, ruta, datos=None, esperado=200):
+        self._consultas = 0
+        with connection.execute_wrapper(self._consulta):
+            inicio, inicio_cpu = time.perf_counter(), time.thread_time()
+            respuesta = getattr(self.cliente, metodo)(ruta, datos)
+            transcurrido, cpu = time.perf_counter() - inicio, time.thread_time() - inicio_cpu
+        self.medidas.append((paso, transcurrido, cpu, self._consultas, respuesta.status_code))
+        if esperado is not None and respuesta.status_code != esperado:
+            raise RuntimeError(f"{paso}: HTTP {respuesta.status_code} en {ruta} (se esperaba {esperado}).")
+        return respuesta
+
+    def _hueco_libre(self, vivienda_id):
+        # Fuera de la medición: la prueba elige uno de los primeros huecos libres, como haría
+        # alguien con el desplegable, y así varios arrendatarios compiten por los mismos.
+        libres = list(HuecoVisita.objects.filter(
+            vivienda_id=vivienda_id, ocupado=False, fecha_hora__gt=timezone.now(),
+        ).order_by('fecha_hora').values_list('fecha_hora', flat=True)[:20])
+        return timezone.localtime(self.aleatorio.choice(libres)).isoformat() if libres else None
+
+    def _reservar(self, paso, vivienda_id, numero):
+        agendar = f'/vivienda/{vivienda_id}/agendar-visita/'
+        self._peticion(f'{paso} GET', 'get', agendar)
+        datos = {**DATOS_VISITA, 'email': f"carga{numero}@example.com"}
+        for _ in range(5):
+            hueco = self._hueco_libre(vivienda_id)
+            if hueco is None:
+                break
+            respuesta = self._peticion(f'{paso} POST', 'post', agendar, {**datos, 'horario_disponible': hueco}, esperado=None)
+            if respuesta.status_code == 302:
+                return respuesta.url
+            if respuesta.status_code != 200:
+                raise RuntimeError(f"{paso} POST: HTTP {respuesta.status_code} en {agendar}.")
+            # 200: otra persona ha reservado el hueco antes; se prueba con otro.
+            self.huecos_ocupados += 1
+        raise RuntimeError(f"{paso} POST: no se ha podido reservar ningún hueco en {agendar}.")
+
+    def recorrer(self, numero):
+        self._peticion('acceso GET', 'get', '/acceso-arrendatario/')
+        self._peticion('acceso POST', 'post', '/acceso-arrendatario/', {'telefono': self.telefono}, esperado=302)
+        self._peticion('seleccionar GET', 'get', '/seleccionar-vivienda/')
+
+        vivienda_id = self.aleatorio.choice(self.cartera.autorizaciones[self.telefono])
+        confirmacion = self._reservar('agendar', vivienda_id, numero)
+        self._peticion('confirmacion GET', 'get', confirmacion)
+        token = confirmacion.rstrip('/').rsplit('/', 1)[1]
+        gestionar = f'/visita/gestionar/{token}/'
+        self._peticion('gestionar GET', 'get', gestionar)
+
+        if self.aleatorio.random() < self.cancelan:
+            self._peticion('gestionar POST', 'post', gestionar, {'cancelar': '1'}, esperado=302)
+            self._peticion('cancelar POST', 'post', f'/visita/cancelar/{token}/')
+            return
+
+        # Modificación de la hora, y después la administración le pide la documentación.
+        self._peticion('gestionar POST', 'post', gestionar, {'modificar': '1'}, esperado=302)
+        self._reservar('modificar', vivienda_id, numero)
+        solicitud, = crear_solicitudes(Visita.objects.filter(cancelacion_token=token))
+        subir = f'/solicitud-documentacion/{solicitud.token_acceso}/'
+        self._peticion('subir_documentos GET', 'get', subir)
+        self._peticion('subir_documentos POST', 'post', subir, {
+            'form-TOTAL_FORMS': '1', 'form-INITIAL_FORMS': '0',
+            'form-0-nombre_completo': "Prueba Carga", 'form-0-dni_nif_nie': "00000000T", 'form-0-iban': "ES0000000000000000000000",
+            'form-0-dni_anverso': _documento('dni_anverso.pdf'), 'form-0-dni_reverso': _documento('dni_reverso.pdf'),
+        })
+        if not SolicitudDeDocumentacion.objects.filter(pk=solicitud.pk, estado='COMPLETADA').exists():
+            raise RuntimeError("subir_documentos POST: la solicitud no ha quedado completada.")
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class EjecutorPruebas(DiscoverRunner):
+    """
+    Ejecutor de `manage.py test` que desactiva el volcado de métricas: las peticiones
+    de las pruebas no deben escribir en el directorio real ni arrancar el hilo de volcado.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._metricas_directorio = settings.METRICAS_DIRECTORIO
+        settings.METRICAS_DIRECTORIO = None
+
+    def teardown_test_environment(self, **kwargs):
+        settings.METRICAS_DIRECTORIO = self._metricas_directorio
+        super().teardown_test_environment(**kwargs)
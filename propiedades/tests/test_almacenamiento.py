@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+
+from ..almacenamiento import DIRECTORIO_CONTENIDO, AlmacenamientoDeduplicado
+
+
+class AlmacenamientoDeduplicadoTests(SimpleTestCase):
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp(prefix='almacenamiento_')
+        self.addCleanup(shutil.rmtree, self.directorio)
+        self.almacenamiento = AlmacenamientoDeduplicado(location=self.directorio)
+
+    def _contenidos(self):
+        return [
+            os.path.join(directorio, nombre)
+            for directorio, _, ficheros in os.walk(os.path.join(self.directorio, DIRECTORIO_CONTENIDO)) for nombre in ficheros
+        ]
+
+    def _limpiar_huerfanos(self):
+        # Sin la espera de seguridad para los contenidos recién escritos.
+        with mock.patch('propiedades.almacenamiento.ANTIGUEDAD_MINIMA_HUERFANOS', -60):
+            return self.almacenamiento.limpiar_contenidos_huerfanos()
+
+    def test_un_duplicado_no_ocupa_mas_disco(self):
+        primero = self.almacenamiento.save('documentacion/nominas/nomina.pdf', ContentFile(b'%PDF nomina'))
+        segundo = self.almacenamiento.save('documentacion/nominas/nomina.pdf', ContentFile(b'%PDF nomina'))
+        self.assertNotEqual(primero, segundo)
+        (contenido,) = self._contenidos()
+        self.assertTrue(os.path.samefile(self.almacenamiento.path(primero), contenido))
+        self.assertTrue(os.path.samefile(self.almacenamiento.path(segundo), contenido))
+        self.assertEqual(os.stat(contenido).st_nlink, 3)
+        # Con otro contenido, otro fichero.
+        self.almacenamiento.save('documentacion/nominas/otra.pdf', ContentFile(b'%PDF otra'))
+        self.assertEqual(len(self._contenidos()), 2)
+
+    def test_borrar_una_copia_no_toca_las_demas(self):
+        primero = self.almacenamiento.save('documentacion/dni/dni.jpg', ContentFile(b'imagen'))
+        segundo = self.almacenamiento.save('documentacion/dni/dni.jpg', ContentFile(b'imagen'))
+        self.almacenamiento.delete(primero)
+        self.assertFalse(self.almacenamiento.exists(primero))
+        with self.almacenamiento.open(segundo) as fichero:
+            self.assertEqual(fichero.read(), b'imagen')
+        self.assertEqual(self._limpiar_huerfanos(), (0, 0))
+        self.assertEqual(len(self._contenidos()), 1)
+
+    def test_borrar_la_ultima_copia_deja_el_contenido_para_la_limpieza(self):
+        nombre = self.almacenamiento.save('documentacion/renta/renta.pdf', ContentFile(b'%PDF renta'))
+        with mock.patch('propiedades.almacenamiento.sha256_de_fichero') as sha256:
+            self.almacenamiento.delete(nombre)
+        # Borrar no vuelve a leer el fichero para calcular su hash.
+        sha256.assert_not_called()
+        (contenido,) = self._contenidos()
+        self.assertEqual(os.stat(contenido).st_nlink, 1)
+        # Los contenidos recién modificados se respetan.
+        self.assertEqual(self.almacenamiento.limpiar_contenidos_huerfanos(), (0, 0))
+        self.assertEqual(self._limpiar_huerfanos(), (1, len(b'%PDF renta')))
+        self.assertEqual(self._contenidos(), [])
+        # El mismo contenido puede volver a guardarse después.
+        self.almacenamiento.save('documentacion/renta/renta.pdf', ContentFile(b'%PDF renta'))
+        self.assertEqual(len(self._contenidos()), 1)
@@ -0,0 +1,98 @@
+import re
+
+from django.db import connection, transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from .. import busqueda, huecos
+from ..models import ArrendatarioAutorizado, HorarioVisita, Visita
+from ..views import _get_horarios_disponibles
+from .carga import generar_cartera
+
+
+def _consultas_criticas():
+    """
+    Consultas de los caminos más frecuentes, con valores de ejemplo. Ninguna debe
+    recorrer una tabla entera.
+    """
+    ahora = timezone.now()
+    return [
+        ("Autorizaciones de un teléfono (acceso_arrendatario_view, en caso de fallo de caché)",
+         ArrendatarioAutorizado.objects.filter(telefono='+34600000000').values_list('vivienda_id', flat=True)),
+        ("Visitas activas de un teléfono (seleccionar_vivienda_view)",
+         Visita.objects.filter(telefono='+34600000000', vivienda_id__in=[1, 2], estado='CONFIRMADA').values('vivienda_id', 'cancelacion_token')),
+        ("Visitas confirmadas de una vivienda en un rango (cálculo de huecos)",
+         Visita.objects.filter(vivienda_id=1, estado='CONFIRMADA', fecha_hora__gte=ahora, fecha_hora__lte=ahora).values_list('fecha_hora', flat=True)),
+        ("Ocupación de un hueco (señales de Visita)",
+         Visita.objects.filter(vivienda_id=1, fecha_hora=ahora, estado='CONFIRMADA')),
+        ("Horarios de varias viviendas desde una fecha (motor de huecos)",
+         HorarioVisita.objects.filter(vivienda_id__in=[1, 2], fecha__gte=ahora.date()).values_list('vivienda_id', 'fecha', 'hora_inicio', 'hora_fin')),
+        ("Huecos libres de una vivienda (agendar_visita_view)",
+         huecos.huecos_disponibles(1)),
+        ("Próximo hueco libre de varias viviendas (seleccionar_vivienda_view)",
+         busqueda.consulta_proximos([1, 2], ahora, ahora)),
+        ("Primeros huecos libres de varias viviendas (seleccionar_vivienda_view)",
+         busqueda.consulta_candidatos([1, 2], ahora, ahora, 5)),
+    ]
+
+
+def _explain(queryset):
+    # No se usa QuerySet.explain(): genera SQL inválido cuando se filtra por una función
+    # de ventana (como en busqueda.consulta_candidatos).
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+        return "\n".join(" ".join(str(columna) for columna in fila) for fila in cursor.fetchall())
+
+
+def _explicar(queryset):
+    if connection.vendor != 'postgresql':
+        return _explain(queryset)
+    # Con tablas pequeñas PostgreSQL prefiere siempre un Seq Scan; desactivándolo solo
+    # aparece si no existe ningún índice utilizable.
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        return _explain(queryset)
+
+
+def _recorridos_completos(plan):
+    if connection.vendor == 'postgresql':
+        return re.findall(r'Seq Scan on (\w+)', plan)
+    # SQLite: "SCAN tabla" sin "USING ... INDEX" es un recorrido completo. Los SCAN de
+    # subconsultas y co-rutinas (como "qualify" al filtrar por una función de ventana)
+    # recorren resultados intermedios, no tablas.
+    tablas = set(connection.introspection.table_names())
+    return [tabla for tabla, resto in re.findall(r'\bSCAN (\w+)(.*)', plan) if tabla in tablas and 'INDEX' not in resto]
+
+
+class IndicesTests(TestCase):
+    """
+    Las consultas críticas usan índices: si alguna pasa a recorrer la tabla completa,
+    el test falla y muestra el plan de EXPLAIN.
+    """
+
+    def test_consultas_criticas_usan_indices(self):
+        for nombre, queryset in _consultas_criticas():
+            with self.subTest(nombre):
+                plan = _explicar(queryset)
+                self.assertEqual(_recorridos_completos(plan), [], f"Recorre la tabla completa:\n{plan}")
+
+
+class ConsultasReservaTests(TestCase):
+    """
+    El camino de reserva hace un número fijo de consultas, tenga las viviendas que tenga.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cartera = generar_cartera(viviendas=50, telefonos=0, visitas_historicas=0)
+
+    def test_huecos_de_una_vivienda(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(_get_horarios_disponibles(self.cartera.viviendas[0]))
+
+    def test_primeros_huecos_de_muchas_viviendas(self):
+        with self.assertNumQueries(2):
+            primeros, proximos = busqueda.primeros_huecos([vivienda.id for vivienda in self.cartera.viviendas])
+        self.assertEqual(len(proximos), 50)
@@ -0,0 +1,55 @@
+from datetime import datetime, time as dtime, timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..disponibilidad import _siguiente_corte
+from ..models import HorarioVisita, Visita, Vivienda
+from ..reservas import reservar_visita
+from .carga import DATOS_VISITA
+
+
+class HuecosViviendaApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # El corte de tiempo fijo: que no cambie el ETag si la prueba cruza un intervalo.
+        parche = mock.patch('propiedades.disponibilidad._siguiente_corte', return_value=_siguiente_corte())
+        parche.start()
+        self.addCleanup(parche.stop)
+        self.vivienda = Vivienda.objects.create(
+            nombre="Vivienda", direccion_completa="Calle de la API 1", referencia_catastral="API-1", precio_mensualidad=900,
+        )
+        HorarioVisita.objects.create(vivienda=self.vivienda, fecha=timezone.localdate() + timedelta(days=1), hora_inicio=dtime(10), hora_fin=dtime(11))
+        self.url = reverse('propiedades:huecos_vivienda', args=[self.vivienda.id])
+
+    def test_if_none_match_responde_304_sin_consultar_la_base_de_datos(self):
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.status_code, 200)
+        etag, cuerpo = respuesta['ETag'], respuesta.content
+        self.assertEqual(len(respuesta.json()['huecos']), 2)
+        with self.assertNumQueries(0):
+            respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(respuesta['ETag'], etag)
+        # Sin If-None-Match, el cuerpo de esa versión sale de la caché.
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).content, cuerpo)
+
+    def test_una_reserva_invalida_el_etag(self):
+        respuesta = self.client.get(self.url)
+        etag, huecos = respuesta['ETag'], respuesta.json()['huecos']
+        with self.captureOnCommitCallbacks(execute=True):
+            visita = Visita(vivienda=self.vivienda, email="inquilino@example.com", telefono="+34600000001", **DATOS_VISITA)
+            reservar_visita(visita, self.vivienda, datetime.fromisoformat(huecos[0]))
+        respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+        self.assertEqual(respuesta.json()['huecos'], huecos[1:])
+        # Y la nueva versión vuelve a responder 304.
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 304)
+
+    def test_rango_no_valido(self):
+        self.assertEqual(self.client.get(self.url, {'desde': 'mañana'}).status_code, 400)
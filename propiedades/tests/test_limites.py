@@ -0,0 +1,67 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..limites import VENTANA_SEGUNDOS, estadisticas_limites, intento_excedido
+
+# Comienzo de una ventana de una hora cualquiera.
+HORA = 500_000 * VENTANA_SEGUNDOS
+
+
+@override_settings(ACCESO_RAFAGA=5, ACCESO_FICHAS_POR_MINUTO=6, ACCESO_LIMITE_HORA_IP=60, ACCESO_LIMITE_HORA_TELEFONO=10)
+class LimitarAccesosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('propiedades:acceso_arrendatario')
+
+    def _intentar(self, telefono='600000000', ip='10.0.0.1'):
+        return self.client.post(self.url, {'telefono': telefono}, REMOTE_ADDR=ip)
+
+    def test_agotada_la_rafaga_responde_429_con_retry_after(self):
+        for i in range(5):
+            self.assertEqual(self._intentar(telefono=f'60000000{i}').status_code, 200)
+        respuesta = self._intentar(telefono='600000009')
+        self.assertEqual(respuesta.status_code, 429)
+        # Una ficha se repone cada 60 / ACCESO_FICHAS_POR_MINUTO = 10 segundos.
+        self.assertEqual(respuesta['Retry-After'], '11')
+        self.assertEqual(estadisticas_limites(), {'permitidos': 5, 'rechazados_ip': 1, 'rechazados_telefono': 0})
+
+    def test_el_mismo_telefono_desde_varias_ips(self):
+        for i in range(5):
+            self.assertEqual(self._intentar(ip=f'10.0.0.{i}').status_code, 200)
+        self.assertEqual(self._intentar(ip='10.0.0.9').status_code, 429)
+        self.assertEqual(estadisticas_limites()['rechazados_telefono'], 1)
+
+    def test_los_get_no_cuentan(self):
+        for _ in range(10):
+            self.assertEqual(self.client.get(self.url, REMOTE_ADDR='10.0.0.1').status_code, 200)
+        self.assertEqual(self._intentar().status_code, 200)
+
+
+@override_settings(ACCESO_RAFAGA=3, ACCESO_FICHAS_POR_MINUTO=60)
+class CuboDeFichasTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_las_fichas_se_reponen_con_el_tiempo(self):
+        self.assertEqual([intento_excedido('ip', 'a', 100, ahora=HORA) for _ in range(4)], [False, False, False, True])
+        # Una ficha por segundo: al segundo siguiente hay una y solo una.
+        self.assertFalse(intento_excedido('ip', 'a', 100, ahora=HORA + 1))
+        self.assertTrue(intento_excedido('ip', 'a', 100, ahora=HORA + 1))
+        # Con el cubo lleno otra vez vuelve a admitirse la ráfaga completa.
+        self.assertEqual([intento_excedido('ip', 'a', 100, ahora=HORA + 10) for _ in range(4)], [False, False, False, True])
+
+
+@override_settings(ACCESO_RAFAGA=1000, ACCESO_FICHAS_POR_MINUTO=60)
+class VentanaDeslizanteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_el_limite_por_hora_y_el_cambio_de_ventana(self):
+        self.assertEqual([intento_excedido('telefono', 'b', 5, ahora=HORA) for _ in range(6)], [False] * 5 + [True])
+        # Al empezar la hora siguiente todavía pesan los 6 intentos de la anterior.
+        self.assertTrue(intento_excedido('telefono', 'b', 5, ahora=HORA + VENTANA_SEGUNDOS))
+        # Al 90 % de la hora siguiente solo cuenta el 10 % de la anterior: 2 + 0,6.
+        self.assertFalse(intento_excedido('telefono', 'b', 5, ahora=HORA + 1.9 * VENTANA_SEGUNDOS))
+        # Sin intentos en la hora anterior, el contador vuelve a empezar de cero.
+        self.assertEqual([intento_excedido('telefono', 'b', 5, ahora=HORA + 3 * VENTANA_SEGUNDOS) for _ in range(6)], [False] * 5 + [True])
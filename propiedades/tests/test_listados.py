@@ -0,0 +1,66 @@
+from django.core.paginator import EmptyPage
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from ..listados import PaginadorEstimado
+from ..models import HorarioVisita, SolicitudDeDocumentacion, Visita
+from .carga import generar_listados, listado_admin
+
+
+class ListadosAdminTests(TestCase):
+    """
+    Los listados del administrador hacen las mismas consultas con una fila que con una
+    página llena (si no, cargan alguna relación fila a fila) y no más de las previstas.
+    """
+    CONSULTAS_MAXIMAS = {Visita: 4, HorarioVisita: 4, SolicitudDeDocumentacion: 3}
+
+    def _consultas(self, modelo):
+        with CaptureQueriesContext(connection) as consultas:
+            listado_admin(modelo)
+        return len(consultas)
+
+    def test_consultas_no_crecen_con_las_filas(self):
+        generar_listados(1)
+        con_una = {modelo: self._consultas(modelo) for modelo in self.CONSULTAS_MAXIMAS}
+        generar_listados(24)
+        for modelo, maximo in self.CONSULTAS_MAXIMAS.items():
+            with self.subTest(modelo=modelo.__name__):
+                con_pagina = self._consultas(modelo)
+                self.assertEqual(con_pagina, con_una[modelo])
+                self.assertLessEqual(con_pagina, maximo)
+
+
+class PaginadorEstimadoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generar_listados(230)
+
+    @override_settings(ADMIN_CONTEO_MAXIMO=10)
+    def test_paginas_posteriores_al_total_estimado(self):
+        paginador = PaginadorEstimado(HorarioVisita.objects.order_by('pk'), 100)
+        self.assertTrue(paginador.estimado)
+        self.assertEqual(paginador.num_pages, 2)
+        pagina = paginador.page(3)
+        self.assertEqual(len(pagina.object_list), 30)
+        self.assertFalse(pagina.has_next())
+        with self.assertRaises(EmptyPage):
+            paginador.page(4)
+
+    @override_settings(ADMIN_CONTEO_MAXIMO=10)
+    def test_listado_con_limite_menor_que_la_pagina(self):
+        # 25 visitas por página y límite de 10: el listado sigue paginando hasta el final.
+        respuesta = listado_admin(Visita, {'p': 10})
+        lista = respuesta.context_data['cl']
+        self.assertTrue(lista.multi_page)
+        self.assertFalse(lista.can_show_all)
+        self.assertEqual(len(lista.result_list), 5)
+        self.assertIn("total aproximado", respuesta.rendered_content)
+        self.assertEqual(listado_admin(Visita, {'p': 11}).status_code, 302)
+
+    def test_total_exacto_por_debajo_del_limite(self):
+        paginador = PaginadorEstimado(HorarioVisita.objects.order_by('pk'), 100)
+        self.assertFalse(paginador.estimado)
+        self.assertEqual((paginador.count, paginador.num_pages), (230, 3))
+        with self.assertRaises(EmptyPage):
+            paginador.page(4)
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.test import SimpleTestCase
+from django.urls import reverse
+
+from ..metricas import registro
+
+
+class MetricasMiddlewareTests(SimpleTestCase):
+    def _claves(self):
+        return set(registro.instantanea())
+
+    def test_los_metodos_no_estandar_se_agrupan_en_other(self):
+        url = reverse('propiedades:acceso_arrendatario')
+        self.client.generic('PROPFIND', url)
+        self.client.generic('X-INVENTADO', url)
+        claves = self._claves()
+        self.assertIn('propiedades:acceso_arrendatario OTHER', claves)
+        self.assertFalse({'propiedades:acceso_arrendatario PROPFIND', 'propiedades:acceso_arrendatario X-INVENTADO'} & claves)
+
+    def test_las_pruebas_no_vuelcan_metricas(self):
+        self.client.get(reverse('propiedades:acceso_arrendatario'))
+        self.assertIsNone(settings.METRICAS_DIRECTORIO)
+        self.assertIsNone(registro._latido)
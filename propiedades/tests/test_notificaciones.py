@@ -0,0 +1,93 @@
+import io
+import smtplib
+from contextlib import redirect_stdout
+
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .. import correos
+from ..models import CorreoPendiente
+from ..notificaciones import EstadisticasEnvio, encolar_correos, procesar_lote
+
+
+class BackendContado(EmailBackend):
+    """
+    Backend en memoria que anota cada conexión que se abre.
+    """
+    aperturas = []
+
+    def open(self):
+        BackendContado.aperturas.append(self)
+        return True
+
+
+class BackendCaido(EmailBackend):
+    """
+    Backend de correo cuyo servidor SMTP corta la conexión en cada envío.
+    """
+
+    def send_messages(self, messages):
+        raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+
+
+def _encolar(n):
+    return encolar_correos([
+        {'asunto': f"Correo {i}", 'cuerpo': "Hola", 'destinatarios': [f"inquilino{i}@example.com"]} for i in range(n)
+    ])
+
+
+@override_settings(EMAIL_BACKEND='propiedades.tests.test_notificaciones.BackendContado')
+class ProcesarLoteTests(TestCase):
+    def setUp(self):
+        BackendContado.aperturas.clear()
+
+    def test_envia_el_lote_por_una_sola_conexion(self):
+        _encolar(3)
+        estadisticas = EstadisticasEnvio()
+        self.assertEqual(procesar_lote(10, estadisticas), 3)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(len(BackendContado.aperturas), 1)
+        self.assertEqual(estadisticas.conexiones, 1)
+        self.assertFalse(CorreoPendiente.objects.exclude(estado='ENVIADO').exists())
+
+    @override_settings(CORREO_MAX_MENSAJES_POR_CONEXION=2)
+    def test_renueva_la_conexion_cada_max_mensajes(self):
+        _encolar(5)
+        procesar_lote(10)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(len(BackendContado.aperturas), 3)
+
+    @override_settings(EMAIL_BACKEND='propiedades.tests.test_notificaciones.BackendCaido')
+    def test_vuelve_a_encolar_si_falla_el_smtp(self):
+        _encolar(2)
+        antes = timezone.now()
+        estadisticas = EstadisticasEnvio()
+        with redirect_stdout(io.StringIO()):
+            procesar_lote(10, estadisticas)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(estadisticas.reintentos, 2)
+        for correo in CorreoPendiente.objects.all():
+            self.assertEqual((correo.estado, correo.intentos, correo.lote, correo.bloqueado_en), ('PENDIENTE', 1, None, None))
+            self.assertGreater(correo.proximo_intento, antes)
+            self.assertIn("Connection unexpectedly closed", correo.ultimo_error)
+        # Hasta que llega su próximo intento no se vuelven a reclamar.
+        self.assertEqual(procesar_lote(10), 0)
+
+    @override_settings(EMAIL_BACKEND='propiedades.tests.test_notificaciones.BackendCaido', CORREO_MAX_INTENTOS=1)
+    def test_agotados_los_intentos_pasa_a_fallido(self):
+        _encolar(1)
+        with redirect_stdout(io.StringIO()):
+            procesar_lote(10)
+        self.assertEqual(CorreoPendiente.objects.get().estado, 'FALLIDO')
+
+
+class PlantillasCorreoTests(TestCase):
+    def test_guarda_las_plantillas_compiladas(self):
+        self.assertIs(correos.plantilla('confirmacion_visita'), correos.plantilla('confirmacion_visita'))
+
+    @override_settings(DEBUG=True)
+    def test_en_debug_las_vuelve_a_leer(self):
+        self.assertIsNot(correos.plantilla('confirmacion_visita'), correos.plantilla('confirmacion_visita'))
+        self.assertEqual(correos.precargar(), 0)
@@ -0,0 +1,109 @@
+import threading
+from datetime import time as dtime, timedelta
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from ..models import HorarioVisita, HuecoVisita, Visita, Vivienda
+from ..reservas import HuecoNoDisponible, reservar_visita
+from .carga import DATOS_VISITA
+
+
+def _vivienda_con_huecos():
+    vivienda = Vivienda.objects.create(
+        nombre="Vivienda", direccion_completa="Calle de las Reservas 1", referencia_catastral="RESERVAS-1", precio_mensualidad=900,
+    )
+    HorarioVisita.objects.create(vivienda=vivienda, fecha=timezone.localdate() + timedelta(days=1), hora_inicio=dtime(10), hora_fin=dtime(12))
+    primero, segundo = HuecoVisita.objects.filter(vivienda=vivienda).order_by('fecha_hora').values_list('fecha_hora', flat=True)[:2]
+    return vivienda, primero, segundo
+
+
+def _visita(vivienda, n):
+    return Visita(vivienda=vivienda, email=f"inquilino{n}@example.com", telefono=f"+3460000000{n}", **DATOS_VISITA)
+
+
+def _ocupado(vivienda, fecha_hora):
+    return HuecoVisita.objects.get(vivienda=vivienda, fecha_hora=fecha_hora).ocupado
+
+
+class ReservarVisitaTests(TestCase):
+    def setUp(self):
+        self.vivienda, self.hueco, self.otro_hueco = _vivienda_con_huecos()
+
+    def test_el_segundo_en_reservar_el_mismo_hueco_recibe_hueco_no_disponible(self):
+        reservar_visita(_visita(self.vivienda, 1), self.vivienda, self.hueco)
+        segunda = _visita(self.vivienda, 2)
+        with self.assertRaises(HuecoNoDisponible):
+            reservar_visita(segunda, self.vivienda, self.hueco)
+        self.assertIsNone(segunda.pk)
+        self.assertEqual(Visita.objects.filter(estado='CONFIRMADA').count(), 1)
+        self.assertTrue(_ocupado(self.vivienda, self.hueco))
+
+    def test_la_restriccion_unica_se_convierte_en_hueco_no_disponible(self):
+        # Un hueco marcado como libre por error (o leído antes de que otra reserva lo
+        # ocupe) no permite una segunda visita confirmada: salta `visita_confirmada_unica`.
+        reservar_visita(_visita(self.vivienda, 1), self.vivienda, self.hueco)
+        HuecoVisita.objects.filter(vivienda=self.vivienda, fecha_hora=self.hueco).update(ocupado=False)
+        segunda = _visita(self.vivienda, 2)
+        with self.assertRaises(HuecoNoDisponible):
+            reservar_visita(segunda, self.vivienda, self.hueco)
+        self.assertIsNone(segunda.pk)
+        self.assertTrue(segunda._state.adding)
+        self.assertEqual(Visita.objects.filter(estado='CONFIRMADA').count(), 1)
+
+    def test_un_hueco_que_no_existe_no_se_puede_reservar(self):
+        with self.assertRaises(HuecoNoDisponible):
+            reservar_visita(_visita(self.vivienda, 1), self.vivienda, self.hueco + timedelta(minutes=1))
+        self.assertFalse(Visita.objects.exists())
+
+    def test_modificar_la_visita_libera_el_hueco_anterior(self):
+        visita = reservar_visita(_visita(self.vivienda, 1), self.vivienda, self.hueco)
+        reservar_visita(visita, self.vivienda, self.otro_hueco, es_modificacion=True)
+        visita.refresh_from_db()
+        self.assertEqual((visita.fecha_hora, visita.veces_cancelada), (self.otro_hueco, 1))
+        self.assertFalse(_ocupado(self.vivienda, self.hueco))
+        self.assertTrue(_ocupado(self.vivienda, self.otro_hueco))
+        # El hueco liberado puede volver a reservarse.
+        reservar_visita(_visita(self.vivienda, 2), self.vivienda, self.hueco)
+
+    def test_modificar_a_un_hueco_ocupado_deja_la_visita_como_estaba(self):
+        visita = reservar_visita(_visita(self.vivienda, 1), self.vivienda, self.hueco)
+        reservar_visita(_visita(self.vivienda, 2), self.vivienda, self.otro_hueco)
+        with self.assertRaises(HuecoNoDisponible):
+            reservar_visita(visita, self.vivienda, self.otro_hueco, es_modificacion=True)
+        self.assertEqual((visita.fecha_hora, visita.veces_cancelada), (self.hueco, 0))
+        visita.refresh_from_db()
+        self.assertEqual(visita.fecha_hora, self.hueco)
+        self.assertTrue(_ocupado(self.vivienda, self.hueco))
+
+
+class ReservasSimultaneasTests(TransactionTestCase):
+    """
+    Varias reservas del mismo hueco a la vez, cada una en su hilo y con su conexión: el
+    bloqueo de la fila del hueco (en SQLite, el de la base de datos, con reintentos)
+    deja pasar solo a la primera.
+    """
+
+    def test_solo_una_reserva_simultanea_confirma_el_hueco(self):
+        vivienda, hueco, _ = _vivienda_con_huecos()
+        barrera = threading.Barrier(4)
+        resultados = []
+
+        def reservar(n):
+            try:
+                barrera.wait()
+                reservar_visita(_visita(vivienda, n), vivienda, hueco)
+                resultados.append('reservada')
+            except HuecoNoDisponible:
+                resultados.append('ocupado')
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=reservar, args=(n,)) for n in range(4)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(sorted(resultados), ['ocupado', 'ocupado', 'ocupado', 'reservada'])
+        self.assertEqual(Visita.objects.filter(vivienda=vivienda, fecha_hora=hueco, estado='CONFIRMADA').count(), 1)
@@ -0,0 +1,32 @@
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from django.test import SimpleTestCase
+
+from .. import sesion
+
+
+def _sesion(**datos):
+    session = SessionStore()
+    session.update(datos)
+    session.modified = False
+    return session
+
+
+class SesionArrendatarioTests(SimpleTestCase):
+    def test_las_sesiones_con_claves_anteriores_siguen_valiendo(self):
+        session = _sesion(telefono_autorizado='+34600000000', viviendas_autorizadas_ids=[3, 1], modificar_visita_id=7)
+        self.assertEqual(sesion.telefono_autorizado(session), '+34600000000')
+        self.assertEqual(sesion.viviendas_autorizadas_ids(session), [3, 1])
+        self.assertEqual(sesion.visita_a_modificar_id(session), 7)
+        # Se pasan a las claves nuevas una sola vez y la sesión se guarda así.
+        self.assertTrue(session.modified)
+        self.assertEqual(dict(session.items()), {'tel': '+34600000000', 'viv': [3, 1], 'mod': 7})
+
+    def test_terminar_modificacion_con_clave_anterior(self):
+        session = _sesion(modificar_visita_id=7)
+        sesion.terminar_modificacion(session)
+        self.assertIsNone(sesion.visita_a_modificar_id(session))
+
+    def test_sin_cambios_no_se_modifica_la_sesion(self):
+        session = _sesion(tel='+34600000000', viv=[1, 3])
+        sesion.guardar_acceso(session, '+34600000000', [3, 1])
+        self.assertFalse(session.modified)
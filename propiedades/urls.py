@@ -6,9 +6,17 @@ app_name = 'propiedades'
 urlpatterns = [
     path('acceso-arrendatario/', views.acceso_arrendatario_view, name='acceso_arrendatario'),
     path('vivienda/<int:vivienda_id>/agendar-visita/', views.agendar_visita_view, name='agendar_visita'),
+    path('vivienda/<int:vivienda_id>/huecos.json', views.huecos_vivienda_view, name='huecos_vivienda'),
     path('visita/confirmacion/<uuid:token>/', views.confirmacion_visita_view, name='confirmacion_visita'),
     path('visita/cancelar/<uuid:token>/', views.cancelar_visita_view, name='cancelar_visita'),
     path('visita/gestionar/<uuid:token>/', views.gestionar_visita_view, name='gestionar_visita'),
     path('seleccionar-vivienda/', views.seleccionar_vivienda_view, name='seleccionar_vivienda'),
     path('solicitud-documentacion/<uuid:token>/', views.subir_documentos_view, name='subir_documentos'),
+    path('solicitud-documentacion/<uuid:token>/subidas/', views.iniciar_subida_view, name='iniciar_subida'),
+    path('solicitud-documentacion/<uuid:token>/subidas/<uuid:subida_id>/', views.estado_subida_view, name='estado_subida'),
+    path('solicitud-documentacion/<uuid:token>/subidas/<uuid:subida_id>/fragmento/', views.fragmento_subida_view, name='fragmento_subida'),
+    path('solicitud-documentacion/<uuid:token>/subidas/<uuid:subida_id>/finalizar/', views.finalizar_subida_view, name='finalizar_subida'),
+    path('documentos/<path:nombre>', views.documento_protegido_view, name='documento_protegido'),
+    path('estado/cache/', views.estadisticas_cache_view, name='estadisticas_cache'),
+    path('estado/metricas/', views.metricas_view, name='metricas'),
 ]
\ No newline at end of file
@@ -1,53 +1,71 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
-from django.http import HttpResponse, HttpResponseForbidden
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.utils.crypto import constant_time_compare
+from django.contrib.admin.views.decorators import staff_member_required
 from django.conf import settings
-from django.utils import timezone
-from datetime import datetime, timedelta
+from django.db import transaction
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import require_GET, require_POST
+from datetime import datetime
+import uuid
 
-from .forms import AccesoArrendatarioForm, AgendarVisitaForm, InquilinoDocumentacionFormSet
-from .models import ArrendatarioAutorizado, Vivienda, Visita, HorarioVisita, SolicitudDeDocumentacion, InquilinoDocumentacion
+from .forms import AccesoArrendatarioForm, AgendarVisitaForm, InquilinoDocumentacionFormSet, SubidaDocumentoForm
+from .models import Vivienda, Visita, SolicitudDeDocumentacion, InquilinoDocumentacion, SubidaDocumento
+from .notificaciones import encolar_correo
+from .autorizaciones import estadisticas_cache, viviendas_autorizadas
+from .limites import estadisticas_limites, limitar_accesos
+from . import metricas
+from . import huecos
+from .reservas import HuecoNoDisponible, reservar_visita
+from .motor_huecos import formatear_hueco
+from . import busqueda, correos, descargas, disponibilidad, sesion, subidas
 
 # --- Vistas del Flujo del Arrendatario (Proceso 1) ---
 
+@limitar_accesos
 def acceso_arrendatario_view(request):
     if request.method == 'POST':
         form = AccesoArrendatarioForm(request.POST)
         if form.is_valid():
             telefono = form.cleaned_data['telefono']
-            autorizaciones = ArrendatarioAutorizado.objects.filter(telefono=telefono)
-            viviendas_ids = list(autorizaciones.values_list('vivienda_id', flat=True))
+            viviendas_ids = viviendas_autorizadas(telefono)
             if not viviendas_ids:
                 form.add_error('telefono', 'Este número de teléfono no está autorizado para visitar ninguna vivienda.')
             else:
-                request.session['telefono_autorizado'] = telefono
-                request.session['viviendas_autorizadas_ids'] = viviendas_ids
-                request.session.save()
+                # El middleware de sesiones la guarda al responder, solo si ha cambiado.
+                sesion.guardar_acceso(request.session, telefono, viviendas_ids)
                 return redirect(reverse('propiedades:seleccionar_vivienda'))
     else:
         form = AccesoArrendatarioForm()
     return render(request, 'propiedades/acceso_arrendatario.html', {'form': form})
 
 def seleccionar_vivienda_view(request):
-    telefono = request.session.get('telefono_autorizado')
-    viviendas_ids = request.session.get('viviendas_autorizadas_ids', [])
+    telefono = sesion.telefono_autorizado(request.session)
+    viviendas_ids = sesion.viviendas_autorizadas_ids(request.session)
     if not telefono or not viviendas_ids:
         return redirect(reverse('propiedades:acceso_arrendatario'))
-    viviendas_autorizadas = Vivienda.objects.filter(id__in=viviendas_ids)
+    viviendas_autorizadas = {vivienda.id: vivienda for vivienda in Vivienda.objects.filter(id__in=viviendas_ids)}
     visitas_activas = Visita.objects.filter(telefono=telefono, vivienda_id__in=viviendas_ids, estado='CONFIRMADA').values('vivienda_id', 'cancelacion_token')
     mapa_visitas = {item['vivienda_id']: item['cancelacion_token'] for item in visitas_activas}
+    # Los primeros huecos libres entre todas las viviendas sin visita, con dos consultas en total.
+    primeros, proximos = busqueda.primeros_huecos(vivienda_id for vivienda_id in viviendas_autorizadas if vivienda_id not in mapa_visitas)
     viviendas_con_estado = []
-    for vivienda in viviendas_autorizadas:
+    for vivienda in viviendas_autorizadas.values():
         token = mapa_visitas.get(vivienda.id)
-        viviendas_con_estado.append({'vivienda': vivienda, 'visita_token': token})
-    return render(request, 'propiedades/seleccionar_vivienda.html', {'viviendas_con_estado': viviendas_con_estado})
+        viviendas_con_estado.append({'vivienda': vivienda, 'visita_token': token, 'proximo_hueco': proximos.get(vivienda.id)})
+    primeros_huecos = [
+        {'vivienda': viviendas_autorizadas[vivienda_id], 'fecha_hora': fecha_hora, 'valor': formatear_hueco(fecha_hora)[0]}
+        for fecha_hora, vivienda_id in primeros
+    ]
+    return render(request, 'propiedades/seleccionar_vivienda.html', {'viviendas_con_estado': viviendas_con_estado, 'primeros_huecos': primeros_huecos})
 
 def agendar_visita_view(request, vivienda_id):
     vivienda = get_object_or_404(Vivienda, pk=vivienda_id)
-    viviendas_autorizadas_ids = request.session.get('viviendas_autorizadas_ids', [])
-    modificar_visita_id = request.session.get('modificar_visita_id')
+    viviendas_autorizadas_ids = sesion.viviendas_autorizadas_ids(request.session)
+    modificar_visita_id = sesion.visita_a_modificar_id(request.session)
     if vivienda_id not in viviendas_autorizadas_ids:
         if not modificar_visita_id or get_object_or_404(Visita, id=modificar_visita_id).vivienda.id != vivienda_id:
              return HttpResponseForbidden("No tienes permiso para solicitar una visita para esta vivienda.")
@@ -59,31 +77,29 @@ def agendar_visita_view(request, vivienda_id):
         form = AgendarVisitaForm(request.POST, instance=visita_a_modificar)
         form.fields['horario_disponible'].choices = horarios_disponibles
         if form.is_valid():
-            if visita_a_modificar:
-                visita_a_modificar.estado = 'CANCELADA'
-                visita_a_modificar.veces_cancelada += 1
-                visita_a_modificar.save()
-                del request.session['modificar_visita_id']
+            # Al modificar, el formulario edita la propia visita: se mueve a la nueva hora.
             visita = form.save(commit=False)
-            visita.vivienda = vivienda
-            visita.telefono = visita_a_modificar.telefono if visita_a_modificar else request.session.get('telefono_autorizado')
-            visita.fecha_hora = datetime.fromisoformat(form.cleaned_data['horario_disponible'])
-            visita.estado = 'CONFIRMADA'
-            visita.save()
+            visita.telefono = visita_a_modificar.telefono if visita_a_modificar else sesion.telefono_autorizado(request.session)
+            fecha_hora = datetime.fromisoformat(form.cleaned_data['horario_disponible'])
+            try:
+                reservar_visita(visita, vivienda, fecha_hora, es_modificacion=bool(visita_a_modificar))
+            except HuecoNoDisponible:
+                # Alguien ha reservado el hueco entre que se cargó el formulario y ahora:
+                # mostramos los huecos actualizados para que elija otro.
+                form.fields['horario_disponible'].choices = _get_horarios_disponibles(vivienda)
+                form.add_error('horario_disponible', "Lo sentimos, otra persona acaba de reservar ese horario. Por favor, elige otro.")
+                return render(request, 'propiedades/agendar_visita.html', {'form': form, 'vivienda': vivienda})
+            if visita_a_modificar:
+                sesion.terminar_modificacion(request.session)
             asunto = f"Confirmación de tu visita para {vivienda.nombre}"
             contexto_email = {'visita': visita, 'vivienda': vivienda, 'enlace_cancelacion': request.build_absolute_uri(reverse('propiedades:gestionar_visita', args=[visita.cancelacion_token]))}
-            cuerpo_mensaje = render_to_string('propiedades/emails/confirmacion_visita.txt', contexto_email)
-            html_cuerpo_mensaje = render_to_string('propiedades/emails/confirmacion_visita.html', contexto_email)
-            try:
-                msg = EmailMultiAlternatives(asunto, cuerpo_mensaje, settings.DEFAULT_FROM_EMAIL, [visita.email])
-                msg.attach_alternative(html_cuerpo_mensaje, "text/html")
-                msg.send()
-                print(f"Correo de confirmación (modificación) enviado con éxito a {visita.email}.")
-            except Exception as e:
-                print(f"ERROR al enviar correo de confirmación (modificación): {e}")
+            cuerpo_mensaje, html_cuerpo_mensaje = correos.renderizar('confirmacion_visita', contexto_email)
+            encolar_correo(asunto, cuerpo_mensaje, [visita.email], cuerpo_html=html_cuerpo_mensaje)
+            print(f"Correo de confirmación encolado para {visita.email}.")
             return redirect(reverse('propiedades:confirmacion_visita', args=[visita.cancelacion_token]))
     else:
-        form = AgendarVisitaForm(instance=visita_a_modificar)
+        # Desde los primeros huecos de seleccionar_vivienda_view llega ya elegido (?hueco=).
+        form = AgendarVisitaForm(instance=visita_a_modificar, initial={'horario_disponible': request.GET.get('hueco')})
         if not horarios_disponibles:
             form.fields['horario_disponible'].widget.attrs['disabled'] = True
             form.fields['horario_disponible'].help_text = "No hay horarios disponibles para esta vivienda en este momento."
@@ -92,40 +108,36 @@ def agendar_visita_view(request, vivienda_id):
     return render(request, 'propiedades/agendar_visita.html', {'form': form, 'vivienda': vivienda})
 
 def _get_horarios_disponibles(vivienda):
-    duracion_visita = timedelta(minutes=vivienda.duracion_visita_minutos)
-    hoy = timezone.now().date()
-
-    # Horarios definidos por el administrador a partir de hoy.
-    horarios_definidos = HorarioVisita.objects.filter(vivienda=vivienda, fecha__gte=hoy).order_by('fecha', 'hora_inicio')
-
-    # Visitas ya confirmadas para esta vivienda. No es necesario filtrar por tiempo aquí,
-    # ya que la consulta de HorarioVisita ya nos limita a los días relevantes.
-    visitas_confirmadas = Visita.objects.filter(vivienda=vivienda, estado='CONFIRMADA')
+    # Los huecos se precalculan en la tabla HuecoVisita (ver huecos.py), así que aquí
+    # solo queda una consulta indexada y formatear, en la zona horaria local, los huecos
+    # que se van a mostrar en el desplegable.
+    return [formatear_hueco(fecha_hora) for fecha_hora in huecos.huecos_disponibles(vivienda)]
 
-    # Para una comparación fiable, convertimos las fechas de las visitas a la zona horaria local
-    # ANTES de pasarlas a formato ISO. Esto asegura que '2025-10-17T10:30:00+02:00' (local)
-    # coincida con lo que se genera en el bucle, en lugar de compararlo con la versión UTC de la BD.
-    zona_horaria_local = timezone.get_current_timezone()
-    fechas_ocupadas_iso = {v.fecha_hora.astimezone(zona_horaria_local).isoformat() for v in visitas_confirmadas}
-
-    huecos_disponibles = []
-    for horario in horarios_definidos:
-        # Nos aseguramos de que el datetime sea "consciente" de la zona horaria definida en settings.py.
-        hora_inicio_aware = timezone.make_aware(datetime.combine(horario.fecha, horario.hora_inicio))
-        hora_fin_aware = timezone.make_aware(datetime.combine(horario.fecha, horario.hora_fin))
-
-        hora_actual = hora_inicio_aware
-        while hora_actual + duracion_visita <= hora_fin_aware:
-            # Comparamos la cadena ISO del hueco actual con el conjunto de cadenas ISO ocupadas.
-            if hora_actual.isoformat() not in fechas_ocupadas_iso:
-                valor = hora_actual.isoformat()
-                # Formateamos el texto para mostrarlo al usuario en un formato amigable.
-                texto = hora_actual.strftime('%d de %B de %Y a las %H:%M')
-                huecos_disponibles.append((valor, texto))
-
-            hora_actual += duracion_visita
-
-    return huecos_disponibles
+@require_GET
+def huecos_vivienda_view(request, vivienda_id):
+    """
+    Huecos libres de una vivienda en formato JSON (ver disponibilidad.py). Las consultas
+    repetidas con If-None-Match reciben un 304 sin tocar la base de datos.
+    """
+    try:
+        desde, hasta = disponibilidad.rango_fechas(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    etag, ultima_modificacion = disponibilidad.validadores(vivienda_id, desde, hasta)
+    respuesta = get_conditional_response(request, etag=etag, last_modified=int(ultima_modificacion))
+    if respuesta is not None:
+        disponibilidad.contar_no_modificada()
+    else:
+        try:
+            cuerpo = disponibilidad.cuerpo_respuesta(vivienda_id, desde, hasta, etag)
+        except Vivienda.DoesNotExist:
+            raise Http404("La vivienda no existe.")
+        respuesta = HttpResponse(cuerpo, content_type='application/json')
+    respuesta['ETag'] = etag
+    respuesta['Last-Modified'] = http_date(ultima_modificacion)
+    # Los proxies y navegadores pueden guardarla, pero deben revalidarla con el ETag.
+    patch_cache_control(respuesta, public=True, max_age=settings.HUECOS_API_MAX_AGE)
+    return respuesta
 
 def confirmacion_visita_view(request, token):
     visita = get_object_or_404(Visita, cancelacion_token=token)
@@ -141,17 +153,11 @@ def cancelar_visita_view(request, token):
             visita.save()
             asunto = f"[Cancelación] Visita para {visita.vivienda.nombre} el {visita.fecha_hora.strftime('%d/%m')}"
             contexto_email = {'visita': visita}
-            cuerpo_mensaje = render_to_string('propiedades/emails/notificacion_cancelacion_admin.txt', contexto_email)
             emails_admin = [admin.email for admin in visita.vivienda.administradores.all()]
             if emails_admin:
-                html_cuerpo_mensaje = render_to_string('propiedades/emails/notificacion_cancelacion_admin.html', contexto_email)
-                try:
-                    msg = EmailMultiAlternatives(asunto, cuerpo_mensaje, settings.DEFAULT_FROM_EMAIL, emails_admin)
-                    msg.attach_alternative(html_cuerpo_mensaje, "text/html")
-                    msg.send()
-                    print(f"Correo de cancelación enviado con éxito a los administradores: {', '.join(emails_admin)}.")
-                except Exception as e:
-                    print(f"ERROR al enviar correo de cancelación a admin: {e}")
+                cuerpo_mensaje, html_cuerpo_mensaje = correos.renderizar('notificacion_cancelacion_admin', contexto_email)
+                encolar_correo(asunto, cuerpo_mensaje, emails_admin, cuerpo_html=html_cuerpo_mensaje)
+                print(f"Correo de cancelación encolado para los administradores: {', '.join(emails_admin)}.")
             mensaje = "Tu visita ha sido cancelada con éxito."
         return render(request, 'propiedades/cancelar_visita.html', {'mensaje': mensaje})
     return render(request, 'propiedades/cancelar_visita.html', {'visita': visita})
@@ -162,8 +168,7 @@ def gestionar_visita_view(request, token):
         if 'cancelar' in request.POST:
             return redirect(reverse('propiedades:cancelar_visita', args=[visita.cancelacion_token]))
         elif 'modificar' in request.POST:
-            request.session['modificar_visita_id'] = visita.id
-            request.session.save()
+            sesion.empezar_modificacion(request.session, visita.id)
             return redirect(reverse('propiedades:agendar_visita', args=[visita.vivienda.id]))
     return render(request, 'propiedades/gestionar_visita.html', {'visita': visita})
 
@@ -174,17 +179,25 @@ def subir_documentos_view(request, token):
     if solicitud.estado != 'PENDIENTE':
         return render(request, 'propiedades/subida_documentos_completada.html', {'solicitud': solicitud})
     if request.method == 'POST':
-        formset = InquilinoDocumentacionFormSet(request.POST, request.FILES, queryset=solicitud.inquilino_documentacion.none())
+        formset = InquilinoDocumentacionFormSet(
+            request.POST, request.FILES, queryset=solicitud.inquilino_documentacion.none(), form_kwargs={'solicitud': solicitud}
+        )
         if formset.is_valid():
             # Solo guardar formularios que han sido rellenados
-            instancias_guardadas = 0
-            for form in formset:
-                # has_changed() detecta si el usuario ha introducido datos.
-                if form.has_changed():
-                    instance = form.save(commit=False)
-                    instance.solicitud = solicitud
-                    instance.save()
-                    instancias_guardadas += 1
+            # (has_changed() detecta si el usuario ha introducido datos).
+            formularios = [form for form in formset if form.has_changed()]
+            instancias = []
+            for form in formularios:
+                instance = form.save(commit=False)
+                instance.solicitud = solicitud
+                instancias.append(instance)
+            with transaction.atomic():
+                # Una sola inserción para todos los inquilinos; los documentos subidos por
+                # fragmentos se asocian después a cada uno.
+                InquilinoDocumentacion.objects.bulk_create(instancias)
+                for form, instance in zip(formularios, instancias):
+                    subidas.vincular_subidas(instance, form.subidas)
+            instancias_guardadas = len(instancias)
 
             # Solo marcar como completada y notificar si se subió al menos un documento.
             if instancias_guardadas > 0:
@@ -198,21 +211,136 @@ def subir_documentos_view(request, token):
                 )
                 contexto_admin = {'solicitud': solicitud, 'enlace_admin': enlace_admin}
 
-                cuerpo_admin = render_to_string('propiedades/emails/notificacion_documentos_recibidos.txt', contexto_admin)
-                html_cuerpo_admin = render_to_string('propiedades/emails/notificacion_documentos_recibidos.html', contexto_admin)
-
                 emails_admin = [admin.email for admin in solicitud.visita.vivienda.administradores.all()]
                 if emails_admin:
-                    try:
-                        msg = EmailMultiAlternatives(asunto_admin, cuerpo_admin, settings.DEFAULT_FROM_EMAIL, emails_admin)
-                        msg.attach_alternative(html_cuerpo_admin, "text/html")
-                        msg.send()
-                        print(f"Correo de notificación de documentos recibidos enviado a los administradores.")
-                    except Exception as e:
-                        print(f"ERROR al enviar correo de notificación a admin: {e}")
+                    cuerpo_admin, html_cuerpo_admin = correos.renderizar('notificacion_documentos_recibidos', contexto_admin)
+                    encolar_correo(asunto_admin, cuerpo_admin, emails_admin, cuerpo_html=html_cuerpo_admin)
+                    print(f"Correo de notificación de documentos recibidos encolado para los administradores.")
 
             return render(request, 'propiedades/subida_documentos_completada.html', {'solicitud': solicitud})
     else:
         formset = InquilinoDocumentacionFormSet(queryset=solicitud.inquilino_documentacion.none())
 
-    return render(request, 'propiedades/subir_documentos.html', {'solicitud': solicitud, 'formset': formset})
\ No newline at end of file
+    return render(request, 'propiedades/subir_documentos.html', {
+        'solicitud': solicitud,
+        'formset': formset,
+        'tamano_fragmento': settings.DOCUMENTO_TAMANO_FRAGMENTO,
+    })
+
+# --- Subida de documentos por fragmentos (llamadas desde el navegador) ---
+
+def _estado_subida(subida):
+    return {'id': str(subida.pk), 'campo': subida.campo, 'tamano': subida.tamano, 'recibidos': subida.recibidos, 'estado': subida.estado}
+
+@require_POST
+def iniciar_subida_view(request, token):
+    solicitud = get_object_or_404(SolicitudDeDocumentacion, token_acceso=token, estado='PENDIENTE')
+    form = SubidaDocumentoForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errores': form.errors}, status=400)
+    subida = subidas.iniciar_subida(solicitud, form.cleaned_data['campo'], form.cleaned_data['nombre'], form.cleaned_data['tamano'])
+    return JsonResponse(_estado_subida(subida), status=201)
+
+@require_GET
+def estado_subida_view(request, token, subida_id):
+    """
+    Bytes recibidos hasta ahora: el navegador continúa desde aquí tras un corte.
+    """
+    subida = get_object_or_404(SubidaDocumento, pk=subida_id, solicitud__token_acceso=token)
+    return JsonResponse(_estado_subida(subida))
+
+@csrf_exempt
+@require_POST
+def fragmento_subida_view(request, token, subida_id):
+    subida = get_object_or_404(SubidaDocumento, pk=subida_id, solicitud__token_acceso=token, estado='SUBIENDO')
+    try:
+        desde = int(request.GET.get('desde', ''))
+    except ValueError:
+        return JsonResponse({'error': "Falta el parámetro 'desde'."}, status=400)
+    if desde != subida.recibidos:
+        return JsonResponse(_estado_subida(subida), status=409)
+    # Los manejadores solo pueden cambiarse antes de leer el cuerpo de la petición, por
+    # eso la vista está exenta de CSRF y la comprobación se hace después, en _guardar_fragmento.
+    request.upload_handlers = [subidas.FragmentoUploadHandler(request, subida, desde)]
+    return _guardar_fragmento(request, subida, desde)
+
+@csrf_protect
+def _guardar_fragmento(request, subida, desde):
+    fragmento = request.FILES.get('fragmento')
+    if fragmento is None:
+        return JsonResponse({'error': "El fragmento no es válido o supera el tamaño del documento."}, status=400)
+    if not subidas.registrar_fragmento(subida, desde, fragmento.size):
+        subida.refresh_from_db()
+        return JsonResponse(_estado_subida(subida), status=409)
+    subida.recibidos = desde + fragmento.size
+    return JsonResponse(_estado_subida(subida))
+
+@require_POST
+def finalizar_subida_view(request, token, subida_id):
+    subida = get_object_or_404(SubidaDocumento, pk=subida_id, solicitud__token_acceso=token)
+    if not subidas.finalizar_subida(subida):
+        return JsonResponse(_estado_subida(subida), status=409)
+    # El hash, las comprobaciones y la miniatura los hace el comando procesar_subidas.
+    subida.estado = 'RECIBIDA'
+    return JsonResponse(_estado_subida(subida), status=202)
+
+# --- Descarga protegida de documentos ---
+
+def documento_protegido_view(request, nombre):
+    """
+    Sirve un documento de inquilino al personal con permiso para ver las solicitudes
+    o a quien tenga el enlace de la solicitud (`?token=`).
+    """
+    if not nombre.startswith('documentacion/'):
+        raise Http404("El documento no existe.")
+    usuario = request.user
+    permitido = usuario.is_active and usuario.is_staff and usuario.has_perm('propiedades.view_solicituddedocumentacion')
+    if not permitido:
+        try:
+            token = uuid.UUID(request.GET.get('token', ''))
+        except ValueError:
+            return HttpResponseForbidden("No tienes permiso para ver este documento.")
+        if not descargas.documento_de_solicitud(nombre, token):
+            return HttpResponseForbidden("No tienes permiso para ver este documento.")
+    return descargas.respuesta_fichero(request, nombre)
+
+# --- Vistas de estado (solo para el personal) ---
+
+@staff_member_required
+def estadisticas_cache_view(request):
+    """
+    Aciertos y fallos de la caché de autorizaciones por teléfono, para dimensionarla,
+    contadores del límite de intentos del acceso por teléfono y respuestas de la API de
+    disponibilidad según se hayan servido (304, desde la caché o calculadas).
+    """
+    return JsonResponse({
+        'autorizaciones': estadisticas_cache(),
+        'limites_acceso': estadisticas_limites(),
+        'disponibilidad': disponibilidad.estadisticas_disponibilidad(),
+    })
+
+@require_GET
+def metricas_view(request):
+    """
+    Métricas de rendimiento por vista y contadores de las cachés, en el formato de texto
+    de Prometheus. Para el personal o con el token METRICAS_TOKEN.
+    """
+    autorizacion = request.headers.get('Authorization', '')
+    con_token = settings.METRICAS_TOKEN and constant_time_compare(autorizacion, f'Bearer {settings.METRICAS_TOKEN}')
+    if not con_token and not (request.user.is_active and request.user.is_staff):
+        return HttpResponseForbidden("No tienes permiso para ver las métricas.")
+    autorizaciones = estadisticas_cache()
+    limites = estadisticas_limites()
+    api = disponibilidad.estadisticas_disponibilidad()
+    contadores = [
+        ('autorizaciones_cache_total', "Consultas a la caché de autorizaciones por teléfono.", {'resultado': 'acierto'}, autorizaciones['aciertos']),
+        ('autorizaciones_cache_total', "Consultas a la caché de autorizaciones por teléfono.", {'resultado': 'fallo'}, autorizaciones['fallos']),
+        ('accesos_total', "Intentos de acceso por teléfono según el límite de intentos.", {'resultado': 'permitido'}, limites['permitidos']),
+        ('accesos_total', "Intentos de acceso por teléfono según el límite de intentos.", {'resultado': 'rechazado_ip'}, limites['rechazados_ip']),
+        ('accesos_total', "Intentos de acceso por teléfono según el límite de intentos.", {'resultado': 'rechazado_telefono'}, limites['rechazados_telefono']),
+        ('disponibilidad_respuestas_total', "Respuestas de la API de disponibilidad de huecos.", {'resultado': 'no_modificada'}, api['no_modificadas']),
+        ('disponibilidad_respuestas_total', "Respuestas de la API de disponibilidad de huecos.", {'resultado': 'cacheada'}, api['cacheadas']),
+        ('disponibilidad_respuestas_total', "Respuestas de la API de disponibilidad de huecos.", {'resultado': 'calculada'}, api['calculadas']),
+    ]
+    texto = metricas.texto_prometheus(metricas.instantanea_servidor(), contadores)
+    return HttpResponse(texto, content_type='text/plain; version=0.0.4; charset=utf-8')